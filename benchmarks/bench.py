@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+"""
+usage: bench.py [-h] [-d {eiger1m,eiger4m,eiger9m,eiger16m}] [-f FRAMES]
+                [-r REPEAT] [-n NPROC] [-k FILTER] [--lib LIB] [--json JSON]
+                [--compare COMPARE] [--tolerance TOLERANCE]
+
+benchmark pydozor on synthetic Eiger frames, against a stub libdozor
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -d DETECTOR, --detector DETECTOR
+                        detector frame size
+  -f FRAMES, --frames FRAMES
+                        number of synthetic frames
+  -r REPEAT, --repeat REPEAT
+                        number of timed repeats of each benchmark
+  -n NPROC, --nproc NPROC
+                        worker processes of the offline benchmark
+  -k FILTER, --filter FILTER
+                        only run benchmarks whose name contains FILTER
+  --lib LIB             libdozor to benchmark, by default the stub is built
+  --json JSON           write results to a JSON file
+  --compare COMPARE     compare with results of an earlier --json run
+  --tolerance TOLERANCE
+                        relative slowdown reported as a regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from collections.abc import Callable
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, NamedTuple
+
+from data import DETECTORS, synthetic_frames, synthetic_mask, write_eiger
+
+BENCH_DIR = Path(__file__).resolve().parent
+STUB_SOURCE = BENCH_DIR / "stub" / "libdozor_stub.c"
+
+# Struct sizes reported by the stub, in order
+_STUB_STRUCTS = (
+    "struct DETECTOR",
+    "struct DATACOL",
+    "struct LOCAL",
+    "struct DATACOL_PICKLE",
+    "struct Reflection",
+)
+
+
+class Context(NamedTuple):
+    """Benchmark Inputs"""
+
+    workdir: Path
+    config_file: Path
+    frames: Any
+    mask: Any
+    master_file: Path
+    nproc: int
+
+
+class Benchmark(NamedTuple):
+    """Benchmark Definition
+
+    `setup` returns the callable to time, and the number of items, e.g.
+    frames, it processes per call, results are reported per item.
+    """
+
+    name: str
+    setup: Callable[[Context], tuple[Callable[[], Any], int]]
+
+
+def build_stub(output_dir: Path) -> Path:
+    """Compile the stub libdozor with the C compiler from `$CC`."""
+    _output = output_dir / "libdozor_stub.so"
+    subprocess.run(
+        [
+            os.environ.get("CC", "cc"),
+            "-O2",
+            "-shared",
+            "-fPIC",
+            "-o",
+            str(_output),
+            str(STUB_SOURCE),
+        ],
+        check=True,
+    )
+    return _output
+
+
+def check_stub(lib: Path) -> None:
+    """Check the stub structs match the cdef of pydozor."""
+    from cffi import FFI
+
+    from pydozor._compat.dozor import ffi
+
+    _ffi = FFI()
+    _ffi.cdef("void stub_struct_sizes(int*);")
+    _sizes = _ffi.new(f"int[{len(_STUB_STRUCTS)}]")
+    _ffi.dlopen(str(lib)).stub_struct_sizes(_sizes)
+    for _struct, _size in zip(_STUB_STRUCTS, _sizes, strict=True):
+        if ffi.sizeof(_struct) != _size:
+            raise RuntimeError(
+                f"Stub `{_struct}` is {_size} bytes, cdef {ffi.sizeof(_struct)}, "
+                f"update {STUB_SOURCE.name}."
+            )
+
+
+def write_config(path: Path, shape: tuple[int, int]) -> Path:
+    """Write Dozor config for frames of shape."""
+    from pydozor import DozorConfig, create_config_file
+
+    return create_config_file(
+        DozorConfig(
+            spot_size=3,
+            spot_level=6,
+            ix_min=0,
+            ix_max=0,
+            iy_min=0,
+            iy_max=0,
+            detector="eiger",
+            nx=shape[1],
+            ny=shape[0],
+            pixel=0.075,
+            fraction_polarization=0.99,
+            pixel_min=0,
+            pixel_max=64000,
+            exposure=0.01,
+            detector_distance=200.0,
+            wavelength=1.0,
+            org_x=shape[1] // 2,
+            org_y=shape[0] // 2,
+            oscillation_range=0.1,
+            image_step=0.1,
+            starting_angle=0.0,
+        ),
+        path=path,
+    )
+
+
+def _dozor_init(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import Dozor
+
+    return (lambda: Dozor(context.config_file)), 1
+
+
+def _dozor_clone(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import Dozor
+
+    _engine = Dozor(context.config_file)
+    return _engine.clone, 1
+
+
+def _do_image(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import Dozor
+    from pydozor.wrapper import _convert_to_uint16
+
+    _engine = Dozor(context.config_file, reuse_buffers=True)
+    _frame = _convert_to_uint16(context.frames[0], _engine.pixel_max)
+    return (lambda: _engine.do_image(_frame)), 1
+
+
+def _do_image_fields(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import Dozor
+    from pydozor.wrapper import _convert_to_uint16
+
+    _engine = Dozor(context.config_file, reuse_buffers=True)
+    _frame = _convert_to_uint16(context.frames[0], _engine.pixel_max)
+    _fields = ("NofR", "score3", "dlim09")
+    return (lambda: _engine.do_image(_frame, fields=_fields)), 1
+
+
+def _do_images(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import Dozor
+    from pydozor.wrapper import _convert_to_uint16
+
+    _engine = Dozor(context.config_file, reuse_buffers=True)
+    _stack = _convert_to_uint16(context.frames, _engine.pixel_max)
+    return (lambda: _engine.do_images(_stack)), len(_stack)
+
+
+def _to_dict(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor._compat.dozor import Datacol, DatacolPickle
+
+    _datacol, _data = Datacol(), DatacolPickle()
+    return (lambda: (Datacol.to_dict(_datacol), DatacolPickle.to_dict(_data))), 1
+
+
+def _convert(context: Context) -> tuple[Callable[[], Any], int]:
+    from numpy import empty, uint16
+
+    from pydozor.wrapper import _convert_to_uint16
+
+    _frame = context.frames[0]
+    _out = empty(_frame.shape, dtype=uint16)
+    return (lambda: _convert_to_uint16(_frame, 64000, out=_out)), 1
+
+
+def _convert_masked(context: Context) -> tuple[Callable[[], Any], int]:
+    from numpy import empty, uint16
+
+    from pydozor import PixelMask
+    from pydozor.wrapper import _convert_to_uint16
+
+    _frame = context.frames[0]
+    _mask = PixelMask.from_eiger(context.mask)
+    _out = empty(_frame.shape, dtype=uint16)
+    return (lambda: _convert_to_uint16(_frame, 64000, mask=_mask, out=_out)), 1
+
+
+def _mask_apply(context: Context) -> tuple[Callable[[], Any], int]:
+    from numpy import uint16
+
+    from pydozor import PixelMask
+
+    _mask = PixelMask.from_eiger(context.mask)
+    _frame = context.frames[0].astype(uint16)
+    return (lambda: _mask.apply(_frame)), 1
+
+
+def _mask_compile(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import PixelMask
+
+    return (lambda: PixelMask(context.mask != 0)), 1
+
+
+def _reader(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor.reader import EigerReader
+
+    def _run() -> None:
+        with EigerReader(context.master_file) as _reader:
+            for _ in _reader.iter_chunks():
+                pass
+
+    return _run, len(context.frames)
+
+
+def _offline(context: Context) -> tuple[Callable[[], Any], int]:
+    from pydozor import PixelMask
+    from pydozor.offline import run_offline
+
+    _mask = PixelMask.from_eiger(context.mask)
+    _output = context.workdir / "offline"
+    _output.mkdir(exist_ok=True)
+    return (
+        lambda: run_offline(
+            context.master_file,
+            context.config_file,
+            _output,
+            nproc=context.nproc,
+            mask=_mask,
+        )
+    ), len(context.frames)
+
+
+BENCHMARKS: tuple[Benchmark, ...] = (
+    Benchmark("dozor_init", _dozor_init),
+    Benchmark("dozor_clone", _dozor_clone),
+    Benchmark("do_image", _do_image),
+    Benchmark("do_image_fields", _do_image_fields),
+    Benchmark("do_images", _do_images),
+    Benchmark("to_dict", _to_dict),
+    Benchmark("convert_to_uint16", _convert),
+    Benchmark("convert_to_uint16_masked", _convert_masked),
+    Benchmark("mask_apply", _mask_apply),
+    Benchmark("mask_compile", _mask_compile),
+    Benchmark("reader", _reader),
+    Benchmark("offline", _offline),
+)
+
+
+def measure(func: Callable[[], Any], repeat: int) -> list[float]:
+    """Time calls of `func`, after a warm up call, batching fast calls."""
+    func()
+    _start = perf_counter()
+    func()
+    _single = perf_counter() - _start
+    # Batch calls faster than 10 ms so timer resolution does not matter
+    _number = max(1, min(10000, int(0.01 / max(_single, 1e-9))))
+    _times = []
+    for _ in range(repeat):
+        _start = perf_counter()
+        for _ in range(_number):
+            func()
+        _times.append((perf_counter() - _start) / _number)
+    return _times
+
+
+def parseArgs():
+    """
+    parse user input and return arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="benchmark pydozor on synthetic Eiger frames, against a stub "
+        "libdozor"
+    )
+    parser.add_argument(
+        "-d",
+        "--detector",
+        help="detector frame size",
+        choices=tuple(DETECTORS),
+        default="eiger4m",
+    )
+    parser.add_argument(
+        "-f", "--frames", help="number of synthetic frames", type=int, default=20
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        help="number of timed repeats of each benchmark",
+        type=int,
+        default=5,
+    )
+    parser.add_argument(
+        "-n",
+        "--nproc",
+        help="worker processes of the offline benchmark",
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "-k",
+        "--filter",
+        help="only run benchmarks whose name contains FILTER",
+        default="",
+    )
+    parser.add_argument(
+        "--lib", help="libdozor to benchmark, by default the stub is built"
+    )
+    parser.add_argument("--json", help="write results to a JSON file")
+    parser.add_argument(
+        "--compare", help="compare with results of an earlier --json run"
+    )
+    parser.add_argument(
+        "--tolerance",
+        help="relative slowdown reported as a regression",
+        type=float,
+        default=0.2,
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parseArgs()
+    _shape = DETECTORS[args.detector]
+    with TemporaryDirectory(prefix="pydozor-bench-") as _tmp:
+        _workdir = Path(_tmp)
+        _lib = Path(args.lib) if args.lib else build_stub(_workdir)
+        # Must be set before pydozor is imported
+        os.environ["LIB_DOZOR_PATH"] = str(_lib)
+        # API mode bindings are linked against the library they were built with
+        os.environ["PYDOZOR_BACKEND"] = "abi"
+        sys.path.insert(0, str(BENCH_DIR.parent))
+        if not args.lib:
+            check_stub(_lib)
+
+        _context = Context(
+            _workdir,
+            write_config(_workdir / "dozor.dat", _shape),
+            synthetic_frames(_shape, args.frames),
+            synthetic_mask(_shape),
+            write_eiger(_workdir / "data", _shape, args.frames),
+            args.nproc,
+        )
+
+        _results: dict[str, dict[str, float]] = {}
+        print(f"{'benchmark':<28}{'median':>12}{'min':>12}  per")
+        for _benchmark in BENCHMARKS:
+            if args.filter not in _benchmark.name:
+                continue
+            _func, _items = _benchmark.setup(_context)
+            _times = [_time / _items for _time in measure(_func, args.repeat)]
+            _results[_benchmark.name] = {
+                "median": median(_times),
+                "min": min(_times),
+            }
+            print(
+                f"{_benchmark.name:<28}{median(_times) * 1e3:>10.4f}ms"
+                f"{min(_times) * 1e3:>10.4f}ms  {'frame' if _items > 1 else 'call'}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as _file:
+            json.dump(
+                {
+                    "detector": args.detector,
+                    "frames": args.frames,
+                    "lib": "stub" if not args.lib else args.lib,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": _results,
+                },
+                _file,
+                indent=2,
+            )
+
+    _regressions = 0
+    if args.compare:
+        with open(args.compare) as _file:
+            _baseline = json.load(_file)["results"]
+        for _name, _result in _results.items():
+            if _name not in _baseline:
+                continue
+            _ratio = _result["median"] / _baseline[_name]["median"]
+            if _ratio > 1 + args.tolerance:
+                _regressions += 1
+                print(f"REGRESSION {_name}: {_ratio:.2f}x baseline median")
+    return 1 if _regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Synthetic Eiger datasets for benchmarks."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import h5py
+from bitshuffle.h5 import H5_COMPRESS_LZ4, H5FILTER
+from numpy import random as np_random, uint32, zeros as np_zeros
+
+__all__ = ("DETECTORS", "synthetic_frames", "synthetic_mask", "write_eiger")
+
+# Frame shapes of Eiger detectors, as `(ny, nx)`
+DETECTORS: dict[str, tuple[int, int]] = {
+    "eiger1m": (1065, 1030),
+    "eiger4m": (2167, 2070),
+    "eiger9m": (3269, 3110),
+    "eiger16m": (4371, 4150),
+}
+
+# Eiger gap value, and count cutoff of synthetic data
+_GAP = 2**32 - 1
+_CUTOFF = 64000
+
+
+def synthetic_frames(shape: tuple[int, int], count: int, seed: int = 0):
+    """Generate frames with a Poisson background, Bragg-like peaks and gaps.
+
+    Parameters
+    ----------
+    shape : tuple[int, int]
+        Frame shape, as `(ny, nx)`.
+    count : int
+        Number of frames.
+    seed : int, optional
+        Random seed, by default 0.
+
+    Returns
+    -------
+    NDArray[uint32]
+        Frames, as a `(count, ny, nx)` array.
+    """
+    _rng = np_random.default_rng(seed)
+    _frames = _rng.poisson(0.5, (count, *shape)).astype(uint32)
+    for _frame in _frames:
+        _y = _rng.integers(0, shape[0], 200)
+        _x = _rng.integers(0, shape[1], 200)
+        _frame[_y, _x] = _rng.integers(100, 2 * _CUTOFF, 200)
+    # Module gaps, as written by the detector
+    _frames[:, slice(0, shape[0], 551)] = _GAP
+    _frames[:, :, slice(0, shape[1], 1040)] = _GAP
+    return _frames
+
+
+def synthetic_mask(shape: tuple[int, int], bad: float = 0.05, seed: int = 0):
+    """Generate an Eiger style pixel mask, nonzero pixels are bad.
+
+    Parameters
+    ----------
+    shape : tuple[int, int]
+        Frame shape, as `(ny, nx)`.
+    bad : float, optional
+        Fraction of bad pixels, by default 0.05.
+    seed : int, optional
+        Random seed, by default 0.
+
+    Returns
+    -------
+    NDArray[uint32]
+        Pixel mask.
+    """
+    _rng = np_random.default_rng(seed)
+    _mask = np_zeros(shape, dtype=uint32)
+    _mask[slice(0, shape[0], 551)] = 1
+    _mask[:, slice(0, shape[1], 1040)] = 1
+    _mask.reshape(-1)[_rng.random(_mask.size) < bad] = 2
+    return _mask
+
+
+def write_eiger(
+    directory: Path,
+    shape: tuple[int, int],
+    frames: int,
+    *,
+    per_container: int = 100,
+    chunk: int = 1,
+) -> Path:
+    """Write a synthetic Eiger master file and bitshuffle LZ4 data containers.
+
+    Parameters
+    ----------
+    directory : Path
+        Output directory.
+    shape : tuple[int, int]
+        Frame shape, as `(ny, nx)`.
+    frames : int
+        Number of frames.
+    per_container : int, optional
+        Number of frames per data container, by default 100.
+    chunk : int, optional
+        Number of frames per HDF5 chunk, by default 1, as the detector writes.
+
+    Returns
+    -------
+    Path
+        Master file.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    _master = directory / "bench_master.h5"
+    with h5py.File(_master, "w") as _file:
+        _specific = _file.create_group("/entry/instrument/detector/detectorSpecific")
+        _specific["nimages"] = frames
+        _specific["ntrigger"] = 1
+        _specific["x_pixels_in_detector"] = shape[1]
+        _specific["y_pixels_in_detector"] = shape[0]
+        _specific["countrate_correction_count_cutoff"] = _CUTOFF
+        _specific["pixel_mask"] = synthetic_mask(shape)
+        for _index, _first in enumerate(range(0, frames, per_container), start=1):
+            _name = "bench_data_%06d.h5" % _index
+            with h5py.File(directory / _name, "w") as _data:
+                _data.create_dataset(
+                    "/entry/data/data",
+                    data=synthetic_frames(
+                        shape, min(per_container, frames - _first), seed=_index
+                    ),
+                    chunks=(chunk, *shape),
+                    compression=H5FILTER,
+                    compression_opts=(0, H5_COMPRESS_LZ4),
+                )
+            _file["/entry/data/data_%06d" % _index] = h5py.ExternalLink(
+                _name, "/entry/data/data"
+            )
+    return _master
@@ -0,0 +1,207 @@
+/*
+ * Stub libdozor for benchmarks.
+ *
+ * Exports the same dozor_* symbols and structs as libdozor.so, declared in
+ * pydozor/_compat/dozor.py, doing a fixed, small amount of work per call, so
+ * the Python side overhead of pydozor can be measured without the real
+ * Fortran library. Results are derived from a strided sample of the frame,
+ * they are deterministic but not meaningful.
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+/* Pixels sampled per frame */
+#define SAMPLES 4096
+
+struct DETECTOR
+{
+    int ix, iy;
+    int ix_unbinned, iy_unbinned;
+    int binning_factor;
+    float pixel;
+};
+
+struct DATACOL
+{
+    float wave;
+    float dist;
+    float monoch;
+    float aconst;
+    int Ispot;
+    float texposure;
+    int mrd;
+    float hmax2;
+    float hmin2;
+    float delh2;
+    float mgain;
+    float backpol[51];
+    float backpolP[51];
+    float backerr[51];
+    float IMstep;
+    float xcen, ycen;
+    float start_angl, phiwidth;
+    int number_images,image_first;
+    int graph, sprint, backg, rd, isum;
+    int w, wg;
+    int pr;
+    int prAll;
+    float vbin[50];
+    int pixel_min, pixel_max;
+    int Kxmin, Kxmax, Kymin, Kymax;
+    int nbad;
+    int Bxmin[50], Bxmax[50], Bymin[50], Bymax[50];
+    int wedge;
+    int pLim1[1101], pLim2[1101];
+    float idealback0[50];
+    float idealback[150];
+    float RList[51051];
+    float hklKoor[102000];
+    float Ilimit[51];
+    float vbins[51];
+    float vbina[51];
+    float Wil[2103];
+    float beamstop_size;
+    float beamstop_distance;
+    int beamstop_vertical;
+    float sigLev;
+};
+
+struct LOCAL
+{
+    float cos2tet2[51];
+    float pol[765]; //51*15
+    float absorb[51];
+};
+
+struct DATACOL_PICKLE
+{
+    float backpol2D[51];
+    float Rfexp;
+    float Iav;
+    int NofR;
+    float dlim;
+    double SumTotal2D, SumBack2D;
+    float Coef;
+    int table_suc;
+    double table_sc;
+    double table_b;
+    float table_resol;
+    float table_corr;
+    float table_rfact;
+    float table_intsum;
+    float table_est;
+    float score2;
+    float score3;
+    float dlim09;
+    int NofS;
+};
+
+struct Reflection
+{
+    float x;
+    float y;
+    float intensity;
+};
+
+
+
+/* Struct sizes, checked against the cdef by the benchmark runner */
+void stub_struct_sizes(int* sizes)
+{
+    sizes[0] = sizeof(struct DETECTOR);
+    sizes[1] = sizeof(struct DATACOL);
+    sizes[2] = sizeof(struct LOCAL);
+    sizes[3] = sizeof(struct DATACOL_PICKLE);
+    sizes[4] = sizeof(struct Reflection);
+}
+
+void dozor_set_defaults_(struct DATACOL* d)
+{
+    memset(d, 0, sizeof(struct DATACOL));
+    d->pixel_min = 0;
+    d->pixel_max = 65534;
+}
+
+void read_dozor_(struct DETECTOR* det, struct DATACOL* d, char* config, char* tmpl, char* lib)
+{
+    char key[256], value[256];
+    FILE* f = fopen(config, "r");
+    det->binning_factor = 1;
+    if (!f)
+        return;
+    while (fscanf(f, "%255s", key) == 1 && strcmp(key, "end")) {
+        if (fscanf(f, "%255s", value) != 1)
+            break;
+        if (!strcmp(key, "nx"))
+            det->ix_unbinned = atoi(value);
+        else if (!strcmp(key, "ny"))
+            det->iy_unbinned = atoi(value);
+        else if (!strcmp(key, "pixel"))
+            det->pixel = atof(value);
+        else if (!strcmp(key, "pixel_min"))
+            d->pixel_min = atoi(value);
+        else if (!strcmp(key, "pixel_max"))
+            d->pixel_max = atoi(value);
+        else if (!strcmp(key, "X-ray_wavelength"))
+            d->wave = atof(value);
+        else if (!strcmp(key, "detector_distance"))
+            d->dist = atof(value);
+        else if (!strcmp(key, "orgx"))
+            d->xcen = atof(value);
+        else if (!strcmp(key, "orgy"))
+            d->ycen = atof(value);
+    }
+    fclose(f);
+}
+
+void pre_dozor_(struct DETECTOR* det, struct DATACOL* d, struct LOCAL* l, char* psi, char* kl, int* flag)
+{
+    for (int i = 0; i < 51; i++)
+        l->absorb[i] = 1.0f;
+}
+
+static long stride(struct DETECTOR* det)
+{
+    long n = (long)det->ix * det->iy;
+    return n > SAMPLES ? n / SAMPLES : 1;
+}
+
+void dozor_do_image_(short* im, struct DETECTOR* det, struct DATACOL* din, struct DATACOL* dout, struct DATACOL_PICKLE* p, struct LOCAL* l, char* psi, char* kl)
+{
+    unsigned short* pixels = (unsigned short*)im;
+    long n = (long)det->ix * det->iy, step = stride(det), count = 0;
+    double sum = 0;
+    for (long i = 0; i < n; i += step) {
+        if (pixels[i] < 65534) {
+            sum += pixels[i];
+            if (pixels[i] > din->pixel_min + 100)
+                count++;
+        }
+    }
+    memcpy(dout, din, sizeof(struct DATACOL));
+    memset(p, 0, sizeof(struct DATACOL_PICKLE));
+    p->NofR = (int)count;
+    p->score2 = count / 20.0f;
+    p->score3 = count / 10.0f;
+    p->SumTotal2D = sum;
+    p->dlim = 1.5f;
+    p->dlim09 = 2.0f;
+    for (int i = 0; i < 51; i++)
+        p->backpol2D[i] = (float)i;
+}
+
+void dozor_get_spot_list_(struct DETECTOR* det, struct DATACOL* d, struct DATACOL_PICKLE* p, short* im, struct Reflection* r)
+{
+    unsigned short* pixels = (unsigned short*)im;
+    long n = (long)det->ix * det->iy, step = stride(det);
+    int k = 0;
+    for (long i = 0; i < n && k < p->NofR; i += step) {
+        if (pixels[i] < 65534 && pixels[i] > d->pixel_min + 100) {
+            r[k].x = (float)(i % det->ix);
+            r[k].y = (float)(i / det->ix);
+            r[k].intensity = pixels[i];
+            k++;
+        }
+    }
+}
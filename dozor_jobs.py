@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+usage: dozor_jobs.py [-h] [-o OUTPUT] [-c CUT_OFF] [-n NPROC]
+                     [-f {hdf5,npz,text}] [-t TASK_FRAMES]
+                     [MASTER[:PRIORITY] ...]
+
+analyze many Eiger hdf5 datasets by dozor, on one shared pool of workers
+
+positional arguments:
+  MASTER[:PRIORITY]     EIGER master files, with an optional priority, higher
+                        runs first, read one per line from stdin if none are
+                        given
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -o OUTPUT, --output OUTPUT
+                        output directory, results of each dataset go in a
+                        subdirectory named after its master file
+  -c CUT_OFF, --cut_off CUT_OFF
+                        cut off for hit rate calculation
+  -n NPROC, --nproc NPROC
+                        num of procs
+  -f {hdf5,npz,text}, --format {hdf5,npz,text}
+                        result file format
+  -t TASK_FRAMES, --task-frames TASK_FRAMES
+                        min num of frames per task
+"""
+import argparse
+import os
+import sys
+
+import h5py
+
+from dozor_offline import gen_dozor_dat
+from pydozor import PixelMask
+from pydozor.jobs import DatasetJob, run_jobs
+
+
+def parseArgs():
+    """
+    parse user input and return arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="analyze many Eiger hdf5 datasets by dozor, "
+        "on one shared pool of workers"
+    )
+
+    parser.add_argument(
+        "masters",
+        help="EIGER master files, with an optional priority, higher runs first, "
+        "read one per line from stdin if none are given",
+        metavar="MASTER[:PRIORITY]",
+        nargs="*",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="output directory, results of each dataset go in a subdirectory "
+        "named after its master file",
+        type=str,
+        default="dozor_res",
+    )
+    parser.add_argument(
+        "-c", "--cut_off", help="cut off for hit rate calculation", type=int, default=5
+    )
+    parser.add_argument("-n", "--nproc", help="num of procs", type=int, default=1)
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="result file format",
+        choices=("hdf5", "npz", "text"),
+        default="hdf5",
+    )
+    parser.add_argument(
+        "-t", "--task-frames", help="min num of frames per task", type=int, default=1
+    )
+
+    return parser.parse_args()
+
+
+def read_jobs(masters, output_dir, dozor_dat):
+    for master in masters:
+        master = master.strip()
+        if not master:
+            continue
+        master_file, _, priority = master.rpartition(":")
+        if not master_file or not priority.lstrip("-").isdigit():
+            master_file, priority = master, "0"
+        name = os.path.basename(master_file)
+        if name.endswith("_master.h5"):
+            name = name[: -len("_master.h5")]
+        try:
+            with h5py.File(master_file, "r") as fh:
+                mask = fh["/entry/instrument/detector/detectorSpecific/pixel_mask"][()]
+            # identical masks compile to the same mask, so datasets share engines
+            mask = PixelMask.from_eiger(mask)
+        except OSError:
+            # unreadable master file, reported as a failed job
+            mask = None
+        yield DatasetJob(
+            master_file, dozor_dat, os.path.join(output_dir, name), mask, int(priority)
+        )
+
+
+if __name__ == "__main__":
+    args = parseArgs()  # get cmd line args
+    output_dir = args.output
+    dozor_dat = os.path.join(output_dir, "dozor.dat")
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    gen_dozor_dat(None, dozor_dat)
+
+    jobs = read_jobs(args.masters or sys.stdin, output_dir, dozor_dat)
+    failed = 0
+    for result in run_jobs(
+        jobs,
+        nproc=args.nproc,
+        cut_off=args.cut_off,
+        min_task_frames=args.task_frames,
+        output_format=args.format,
+    ):
+        if result.error is not None:
+            failed += 1
+            print(
+                "Error while processing %s\n%s" % (result.job.master_file, result.error)
+            )
+            continue
+        print(
+            "%s: found bragg spots in %d out of %d images and the hit rate is %.1f %%"
+            " (%.1f s)"
+            % (
+                result.job.master_file,
+                result.hits,
+                result.frames,
+                result.hits * 100.0 / max(result.frames, 1),
+                result.elapsed,
+            )
+        )
+    sys.exit(1 if failed else 0)
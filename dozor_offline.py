@@ -2,6 +2,9 @@
 """
 usage: dozor_offline.py [-h] -m MASTER [-M MASK] [-s START] [-e END]
                         [-c CUT_OFF] [-o OUTPUT] [-n NPROC]
+                        [-f {hdf5,npz,text}] [-r] [--metrics METRICS]
+                        [--prefilter] [--prefilter-peaks PREFILTER_PEAKS]
+                        [--audit AUDIT]
 
 analyze Eiger hdf5 data by dozor
 
@@ -19,15 +22,28 @@ optional arguments:
                         output directory
   -n NPROC, --nproc NPROC
                         num of procs
+  -f {hdf5,npz,text}, --format {hdf5,npz,text}
+                        result file format
+  -r, --resume          resume an interrupted run from its checkpoint
+  --metrics METRICS     write per-stage timings, as Prometheus text, to this
+                        file
+  --prefilter           skip blank frames, found by a cheap peak count,
+                        without running dozor
+  --prefilter-peaks PREFILTER_PEAKS
+                        min peak count of a frame which is not blank
+  --audit AUDIT         run dozor on every AUDIT-th blank frame, and report
+                        how many were hits
 """
 import argparse
-import multiprocessing
 import os
 
 import h5py
-import numpy as np
 
-from pydozor import Dozor
+from pydozor import PixelMask
+from pydozor.metrics import Metrics
+from pydozor.offline import run_offline
+from pydozor.prefilter import BlankFilter
+from pydozor.spots import write_adx
 
 
 def parseArgs():
@@ -49,94 +65,50 @@ def parseArgs():
         "-o", "--output", help="output directory", type=str, default="dozor_res"
     )
     parser.add_argument("-n", "--nproc", help="num of procs", type=int, default=1)
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="result file format",
+        choices=("hdf5", "npz", "text"),
+        default="hdf5",
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        help="resume an interrupted run from its checkpoint",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="write per-stage timings, as Prometheus text, to this file",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--prefilter",
+        help="skip blank frames, found by a cheap peak count, without running dozor",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--prefilter-peaks",
+        help="min peak count of a frame which is not blank",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--audit",
+        help="run dozor on every AUDIT-th blank frame, and report how many were hits",
+        type=int,
+        default=0,
+    )
 
     return parser.parse_args()
 
 
-def worker(
-    work_num,
-    master_file,
-    dozor_dat,
-    mask,
-    start_img,
-    end_img,
-    output_file,
-    cut_off,
-    return_dict,
-):
-    d = Dozor(dozor_dat.encode())
-    max_count = d.data_input.pixel_max
-    hit_num = 0
-    os.path.dirname(output_file)
-    if mask is not None:
-        idx = np.where(mask > 0)
-
-    try:
-        output = open(output_file, "w")
-        fh = h5py.File(master_file, "r")
-        cont_size = fh["/entry/data/data_000001"].shape[0]
-        data = fh["/entry/data/"]
-        i = 0
-        start_cont = int((start_img - 1) / cont_size)
-        end_cont = int((end_img - 1) / cont_size)
-        d_cont = None
-        # print("container range: ", start_cont, end_cont)
-        for i in range(start_cont, end_cont + 1):
-            start_tmp = int(max(0, start_img - i * cont_size - 1))
-            end_tmp = int(min(end_img - i * cont_size, cont_size))
-            # print ("img range: ", start_tmp, end_tmp)
-            dset = "data_%06d" % (i + 1)
-            h5_cont = data[dset]
-            h5_cont_name = h5_cont.file.filename
-            d_cont = h5py.File(h5_cont_name)
-            h5_data = d_cont["/entry/data/data/"]
-
-            for j in range(start_tmp, end_tmp):
-                img = h5_data[j]
-                # convert data to uint16
-                if img.dtype == "uint32":
-                    # if count is over 65534 and below max_count, set to the max value for uint16
-                    img[(img > 65534) & (img <= max_count)] = 65534
-                    img[img > max_count] = 65535
-                    img = img.astype(np.uint16)
-                elif img.dtype == "uint8":
-                    img = img.astype(np.uint16)
-
-                # apply mask if it's not None
-                if mask is not None:
-                    img[idx] = 65535
-
-                res, spots = d.do_image(img)
-                current_img = i * cont_size + j + 1
-                # save spots in adx format, for debugging
-                # save_spots_adx(current_img, spots, output_dir)
-                if res.score3 > cut_off:
-                    hit_num += 1
-                output.write(
-                    "img %d %d %f %f\n"
-                    % (current_img, res.NofR, res.score3, res.dlim09)
-                )
-            d_cont.close()
-    except Exception as ex:
-        raise RuntimeError("Error while running worker %d %s" % (work_num, ex))
-
-    finally:
-        if d_cont is not None:
-            d_cont.close()
-        fh.close()
-        output.close()
-    return_dict[work_num] = hit_num
-
-
 def save_spots_adx(img_num, spots, output_dir):
     adx_filename = os.path.join(output_dir, "%06d.adx" % img_num)
-    output = ""
-    # print (adx_filename)
-    spot_num = len(spots)
-    for i in range(0, spot_num):
-        output += "%d %d %f 1 1\n" % (spots[i].x, spots[i].y, spots[i].intensity)
-    with open(adx_filename, "w") as adx:
-        adx.write(output)
+    # spots as returned by Dozor.get_spot_list, written in a single write
+    write_adx(adx_filename, spots)
 
 
 def gen_dozor_dat(master_file, dozor_filename):
@@ -208,6 +180,7 @@ def gen_dozor_dat(master_file, dozor_filename):
             dozor_dat.write(output)
     except Exception:
         raise RuntimeError("Error while writting dozor.dat file")
+    return config
 
 
 if __name__ == "__main__":
@@ -229,9 +202,6 @@ if __name__ == "__main__":
         end_img = img_per_trigger * triggers
         # print("total images", end_img)
         fh.close()
-    # print (end_img)
-    total_img = end_img - start_img + 1
-    nproc = min(args.nproc, total_img)
 
     mask = None
     if mask_file is not None:
@@ -241,45 +211,47 @@ if __name__ == "__main__":
     else:
         with h5py.File(master_file, "r") as fh:
             mask = fh["/entry/instrument/detector/detectorSpecific/pixel_mask"][()]
+    # compile once, workers receive the compact bad pixel list
+    mask = PixelMask.from_eiger(mask)
 
-    gen_dozor_dat(master_file, dozor_dat)
-
-    procs = []
-    img_per_proc = int(total_img / nproc)
-    if total_img % nproc > 0:
-        img_per_proc += 1
-    start_tmp = start_img
-
-    manager = multiprocessing.Manager()
-    return_dict = manager.dict()
+    config = gen_dozor_dat(master_file, dozor_dat)
 
-    for i in range(nproc):
-        # print ("image range :", start_tmp, min(end_img, start_tmp+img_per_proc))
-        output_file = os.path.join(output_dir, "dozor_res_%d.txt" % i)
-        p = multiprocessing.Process(
-            target=worker,
-            args=(
-                i,
-                master_file,
-                dozor_dat,
-                mask,
-                start_tmp,
-                min(end_img, start_tmp + img_per_proc - 1),
-                output_file,
-                cut_off,
-                return_dict,
-            ),
+    prefilter = None
+    if args.prefilter:
+        prefilter = BlankFilter(
+            config["pixel_max"],
+            mask=mask,
+            min_peaks=args.prefilter_peaks,
+            audit_every=args.audit,
+            cut_off=cut_off,
         )
-        p.start()
-        procs.append(p)
-        start_tmp = start_tmp + img_per_proc
-    for proc in procs:
-        proc.join()
-    hit_num = 0
-    for key, value in return_dict.items():
-        hit_num += value
+
+    metrics = Metrics() if args.metrics is not None else None
+    summary = run_offline(
+        master_file,
+        dozor_dat,
+        output_dir,
+        start=start_img,
+        end=end_img,
+        nproc=args.nproc,
+        mask=mask,
+        cut_off=cut_off,
+        output_format=args.format,
+        resume=args.resume,
+        metrics=metrics,
+        prefilter=prefilter,
+    )
+    total_img = summary.frames
+    hit_num = summary.hits
     perc = "%"
     print(
         "Found bragg spots in %d out of %d images and the hit rate is %.1f %s"
-        % (hit_num, total_img, hit_num * 100.0 / total_img, perc)
+        % (hit_num, total_img, hit_num * 100.0 / max(total_img, 1), perc)
     )
+    if prefilter is not None:
+        print(
+            "Prefilter skipped %d blank images, %d of %d audited were hits"
+            % (summary.skipped, summary.missed, summary.audited)
+        )
+    if metrics is not None:
+        metrics.export(args.metrics)
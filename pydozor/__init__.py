@@ -1,10 +1,63 @@
-from .wrapper import create_config_file, call_dozor
-from .schemas import DatacolSchema, DataSchema, DozorConfig
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .aio import AsyncDozor
+    from .cache import DozorCache, default_cache
+    from .config_store import ConfigStore
+    from .dozor import Dozor
+    from .mask import PixelMask
+    from .pool import DozorThreadPool
+    from .process_pool import DozorProcessPool, DozorSpec
+    from .wrapper import create_config_file, call_dozor
+    from .schemas import DatacolSchema, DataSchema, DozorConfig
 
 __all__ = (
     "create_config_file",
     "call_dozor",
+    "Dozor",
+    "AsyncDozor",
+    "DozorCache",
+    "ConfigStore",
+    "DozorThreadPool",
+    "DozorProcessPool",
+    "DozorSpec",
+    "PixelMask",
+    "default_cache",
     "DatacolSchema",
     "DataSchema",
     "DozorConfig",
 )
+
+# Submodule defining each export, imported on first access so that importing
+# the package does not load cffi, pydantic or asyncio
+_EXPORTS: dict[str, str] = {
+    "AsyncDozor": ".aio",
+    "DozorCache": ".cache",
+    "default_cache": ".cache",
+    "ConfigStore": ".config_store",
+    "Dozor": ".dozor",
+    "PixelMask": ".mask",
+    "DozorThreadPool": ".pool",
+    "DozorProcessPool": ".process_pool",
+    "DozorSpec": ".process_pool",
+    "create_config_file": ".wrapper",
+    "call_dozor": ".wrapper",
+    "DatacolSchema": ".schemas",
+    "DataSchema": ".schemas",
+    "DozorConfig": ".schemas",
+}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        _module = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    _value = getattr(import_module(_module, __name__), name)
+    globals()[name] = _value
+    return _value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
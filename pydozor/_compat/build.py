@@ -0,0 +1,86 @@
+"""Build the API mode cffi bindings of Dozor.
+
+The compiled `pydozor._compat._dozor_cffi` extension is linked against a Dozor
+shared library, and used in place of the ABI mode `ffi.dlopen` bindings when
+present, which avoids parsing the cdef at import and lowers per-call overhead.
+
+Usage: `python -m pydozor._compat.build [LIB_DOZOR_PATH]`
+"""
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from os import environ
+from os.path import abspath as os_abspath, dirname as os_dirname
+from shutil import copy2 as shutil_copy
+from tempfile import TemporaryDirectory
+
+from cffi import FFI
+
+from .dozor import CDEF
+
+__all__ = ("builder", "build")
+
+_MODULE = "pydozor._compat._dozor_cffi"
+
+
+def builder(lib_path: str) -> FFI:
+    """Create the API mode FFI builder.
+
+    Parameters
+    ----------
+    lib_path : str
+        Dozor shared library to link against, found at runtime by its
+        absolute path.
+
+    Returns
+    -------
+    FFI
+        FFI builder, with source and declarations set.
+    """
+    lib_path = os_abspath(lib_path)
+    _builder = FFI()
+    _builder.cdef(CDEF)
+    # Declarations are valid C, Dozor has no header of its own
+    _builder.set_source(
+        _MODULE,
+        CDEF,
+        extra_link_args=[lib_path, f"-Wl,-rpath,{os_dirname(lib_path)}"],
+    )
+    return _builder
+
+
+def build(lib_path: str) -> str:
+    """Compile the API mode bindings into the `pydozor._compat` package.
+
+    Parameters
+    ----------
+    lib_path : str
+        Dozor shared library to link against.
+
+    Returns
+    -------
+    str
+        Compiled extension module.
+    """
+    with TemporaryDirectory() as _build_dir:
+        _compiled = builder(lib_path).compile(tmpdir=_build_dir)
+        return shutil_copy(_compiled, os_dirname(os_abspath(__file__)))
+
+
+def main() -> None:
+    parser = ArgumentParser(description="build API mode cffi bindings of Dozor")
+    parser.add_argument(
+        "lib_path",
+        help="Dozor shared library, by default $LIB_DOZOR_PATH",
+        nargs="?",
+        default=environ.get("LIB_DOZOR_PATH"),
+    )
+    args = parser.parse_args()
+    if args.lib_path is None:
+        parser.error("no Dozor shared library given, and LIB_DOZOR_PATH is unset")
+    print(build(args.lib_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
-from typing import TYPE_CHECKING, Any, ClassVar, Self, overload
-
-from cffi import FFI
-
-__all__ = ("ffi", "Detector", "Datacol", "Local", "DatacolPickle", "Reflection")
-
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator, Mapping
+from functools import lru_cache
+from os import environ
+from typing import TYPE_CHECKING, Any, ClassVar, NamedTuple, Self, overload
+
+from numpy import dtype as np_dtype, frombuffer as np_frombuffer, ndarray
+
+if TYPE_CHECKING:
+    from cffi import FFI
+    from numpy import dtype, void
+    from numpy.typing import NDArray
+
+__all__ = (
+    "CDEF",
+    "BACKEND",
+    "ffi",
+    "load_library",
+    "CDataView",
+    "Detector",
+    "Datacol",
+    "Local",
+    "DatacolPickle",
+    "Reflection",
+)
 
-ffi = FFI()
-ffi.cdef(
-    """
+# Declarations of the Dozor structs and functions, shared by the ABI mode `ffi`
+# and the API mode build in `pydozor._compat.build`
+CDEF = """
 struct DETECTOR
 {
     int ix, iy;
@@ -104,7 +124,73 @@ void pre_dozor_(struct DETECTOR*, struct DATACOL*, struct LOCAL*, char*, char*,
 void dozor_do_image_(short*, struct DETECTOR*, struct DATACOL*, struct DATACOL*, struct DATACOL_PICKLE*, struct LOCAL*, char*, char*);
 void dozor_get_spot_list_(struct DETECTOR*, struct DATACOL*, struct DATACOL_PICKLE*, short*, struct Reflection*);
 """
-)
+
+
+def _load_backend() -> tuple[FFI, Any, str]:
+    """Load the API mode bindings if built, otherwise parse `CDEF` for ABI mode.
+
+    The API mode module is skipped if `PYDOZOR_BACKEND` is set to "abi".
+
+    Returns
+    -------
+    tuple[FFI, Any, str]
+        FFI instance, API mode library or None, and the backend name.
+    """
+    if environ.get("PYDOZOR_BACKEND", "").lower() != "abi":
+        try:
+            from ._dozor_cffi import ffi as _ffi, lib as _lib
+        except ImportError:
+            pass
+        else:
+            return _ffi, _lib, "api"
+
+    # Imported here, API mode only needs the compiled `_cffi_backend`
+    from cffi import FFI
+
+    _ffi = FFI()
+    _ffi.cdef(CDEF)
+    return _ffi, None, "abi"
+
+
+ffi, _api_lib, BACKEND = _load_backend()
+
+
+@lru_cache(maxsize=None)
+def load_library(path: str) -> Any:
+    """Load the Dozor library, once per process for each path.
+
+    Parameters
+    ----------
+    path : str
+        Shared library path, ignored by the API mode backend, which is linked
+        against the library it was built with.
+
+    Returns
+    -------
+    Any
+        Library exposing the Dozor functions.
+    """
+    if _api_lib is not None:
+        return _api_lib
+    return ffi.dlopen(path)
+
+
+_NUMPY_DTYPES: dict[str, str] = {
+    "char": "i1",
+    "short": "i2",
+    "int": "i4",
+    "float": "f4",
+    "double": "f8",
+}
+
+
+class _Field(NamedTuple):
+    """Struct Field Plan"""
+
+    name: str
+    offset: int
+    dtype: str | None
+    length: int | None
 
 
 class _CData:
@@ -112,6 +198,7 @@ class _CData:
 
     _cdecl: ClassVar[str | FFI.CType]
     _cdecl_size: ClassVar[int | None]
+    _plan: ClassVar[dict[str, _Field]]
 
     if TYPE_CHECKING:
 
@@ -133,20 +220,299 @@ class _CData:
             cdecl = cdecl.strip()
         cls._cdecl = cdecl
         cls._cdecl_size = cdecl_size
+        cls._plan = cls._build_plan(cdecl)
+
+    @staticmethod
+    def _build_plan(cdecl: str | FFI.CType) -> dict[str, _Field]:
+        """Build decoding plan for struct fields.
+
+        Parameters
+        ----------
+        cdecl : str | FFI.CType
+            Struct, or struct pointer, C declaration.
+
+        Returns
+        -------
+        dict[str, _Field]
+            Field plans keyed by field name, in declaration order.
+        """
+        _c_type = ffi.typeof(cdecl)
+        if _c_type.kind == "pointer":
+            _c_type = _c_type.item
+
+        _plan = {}
+        for _name, _c_field in _c_type.fields:
+            _field_type = _c_field.type
+            if _field_type.kind == "array":
+                _plan[_name] = _Field(
+                    _name,
+                    _c_field.offset,
+                    _NUMPY_DTYPES.get(_field_type.item.cname),
+                    _field_type.length,
+                )
+            else:
+                _plan[_name] = _Field(
+                    _name,
+                    _c_field.offset,
+                    _NUMPY_DTYPES.get(_field_type.cname),
+                    None,
+                )
+        return _plan
+
+    @classmethod
+    def fields(cls: type[Self]) -> tuple[str, ...]:
+        """Get struct field names.
+
+        Returns
+        -------
+        tuple[str, ...]
+            Field names, in declaration order.
+        """
+        return tuple(cls._plan)
 
     @classmethod
-    def to_dict(cls: type[Self], obj: FFI.CData) -> dict[str, Any]:
-        """ """
-        _obj_dict = {}
-        for _key in dir(obj):
-            _value = getattr(obj, _key, None)
-
-            try:
-                _c_type = ffi.typeof(_value)
-                _obj_dict[_key] = ffi.unpack(_value, _c_type.length)
-            except TypeError:
-                _obj_dict[_key] = _value
-        return _obj_dict
+    def record_dtype(cls: type[Self]) -> dtype:
+        """Get NumPy structured DType matching the struct memory layout.
+
+        Returns
+        -------
+        dtype
+            Structured DType with the same field offsets and item size as the
+            C struct, so struct memory can be copied into records directly.
+
+        Raises
+        ------
+        TypeError
+            Raised if struct has fields of non-numeric type.
+        """
+        try:
+            return cls.__dict__["_record_dtype"]
+        except KeyError:
+            pass
+
+        _names, _formats, _offsets = [], [], []
+        for _field in cls._plan.values():
+            if _field.dtype is None:
+                raise TypeError(f"Field `{_field.name}` has a non-numeric type.")
+            _names.append(_field.name)
+            _formats.append(
+                _field.dtype
+                if _field.length is None
+                else (_field.dtype, (_field.length,))
+            )
+            _offsets.append(_field.offset)
+        _c_type = ffi.typeof(cls._cdecl)
+        if _c_type.kind == "pointer":
+            _c_type = _c_type.item
+        cls._record_dtype = np_dtype(
+            {
+                "names": _names,
+                "formats": _formats,
+                "offsets": _offsets,
+                "itemsize": ffi.sizeof(_c_type),
+            }
+        )
+        return cls._record_dtype
+
+    @classmethod
+    def record(cls: type[Self], obj: FFI.CData) -> NDArray[void]:
+        """Get zero-copy NumPy record view of struct.
+
+        Parameters
+        ----------
+        obj : FFI.CData
+            Struct to view.
+
+        Returns
+        -------
+        NDArray[void]
+            Single element structured array backed by the struct memory.
+        """
+        return np_frombuffer(ffi.buffer(obj), dtype=cls.record_dtype(), count=1)
+
+    @classmethod
+    def array(cls: type[Self], obj: FFI.CData, key: str) -> NDArray[Any]:
+        """Get zero-copy NumPy view of a struct array field.
+
+        The returned array is read-only and shares memory with `obj`, which it
+        keeps alive.
+
+        Parameters
+        ----------
+        obj : FFI.CData
+            Struct to view field of.
+        key : str
+            Array field name.
+
+        Returns
+        -------
+        NDArray[Any]
+            Array backed by the struct memory.
+
+        Raises
+        ------
+        TypeError
+            Raised if field is not an array of a numeric type.
+        """
+        _field = cls._plan[key]
+        if _field.length is None or _field.dtype is None:
+            raise TypeError(f"Field `{key}` is not a numeric array.")
+        _array = np_frombuffer(
+            ffi.buffer(obj),
+            dtype=_field.dtype,
+            count=_field.length,
+            offset=_field.offset,
+        )
+        _array.flags.writeable = False
+        return _array
+
+    @classmethod
+    def decode(
+        cls: type[Self],
+        obj: FFI.CData,
+        key: str,
+        *,
+        as_numpy: bool = False,
+    ) -> Any:
+        """Decode a single struct field.
+
+        Parameters
+        ----------
+        obj : FFI.CData
+            Struct to decode field from.
+        key : str
+            Field name.
+        as_numpy : bool, optional
+            Whether array fields are returned as zero-copy NumPy views, rather
+            than unpacked into lists, by default False.
+
+        Returns
+        -------
+        Any
+            Decoded field value.
+        """
+        _field = cls._plan[key]
+        if _field.length is None:
+            return getattr(obj, key)
+        if as_numpy and _field.dtype is not None:
+            return cls.array(obj, key)
+        return ffi.unpack(getattr(obj, key), _field.length)
+
+    @classmethod
+    def to_dict(
+        cls: type[Self],
+        obj: FFI.CData,
+        fields: Iterable[str] | None = None,
+        *,
+        as_numpy: bool = False,
+    ) -> dict[str, Any]:
+        """Decode struct fields into a dictionary.
+
+        Parameters
+        ----------
+        obj : FFI.CData
+            Struct to decode.
+        fields : Iterable[str] | None, optional
+            Names of fields to decode, if undefined all fields are decoded,
+            by default None.
+        as_numpy : bool, optional
+            Whether array fields are returned as zero-copy NumPy views, rather
+            than unpacked into lists, by default False.
+
+        Returns
+        -------
+        dict[str, Any]
+            Decoded struct fields.
+        """
+        if fields is None:
+            fields = cls._plan
+        return {_key: cls.decode(obj, _key, as_numpy=as_numpy) for _key in fields}
+
+    @classmethod
+    def view(cls: type[Self], obj: FFI.CData) -> CDataView:
+        """Create a lazily decoded view of struct.
+
+        Array fields of the view are zero-copy NumPy views.
+
+        Parameters
+        ----------
+        obj : FFI.CData
+            Struct to view.
+
+        Returns
+        -------
+        CDataView
+            Read-only view decoding fields on access.
+        """
+        return CDataView(cls, obj)
+
+
+class CDataView(Mapping[str, Any]):
+    """Read-only, lazily decoded view of CData struct
+
+    Fields are decoded on first access, by key or attribute, and then kept.
+    Array fields are returned as read-only NumPy views of the struct memory.
+    The view references the underlying struct, when that struct is reused by
+    a `Dozor` engine the view is only valid until the next frame is processed,
+    use `to_dict` to copy values out.
+    """
+
+    __slots__ = ("_cdata_cls", "_cdata", "_values")
+
+    def __init__(self: Self, cdata_cls: type[_CData], cdata: FFI.CData) -> None:
+        self._cdata_cls = cdata_cls
+        self._cdata = cdata
+        self._values: dict[str, Any] = {}
+
+    def __getitem__(self: Self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key not in self._cdata_cls._plan:
+            raise KeyError(key)
+        _value = self._values[key] = self._cdata_cls.decode(
+            self._cdata, key, as_numpy=True
+        )
+        return _value
+
+    def __getattr__(self: Self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self: Self) -> Iterator[str]:
+        return iter(self._cdata_cls._plan)
+
+    def __len__(self: Self) -> int:
+        return len(self._cdata_cls._plan)
+
+    def __repr__(self: Self) -> str:
+        return f"<{type(self).__name__} of {self._cdata_cls.__name__}>"
+
+    def to_dict(self: Self, fields: Iterable[str] | None = None) -> dict[str, Any]:
+        """Decode fields into a dictionary.
+
+        Parameters
+        ----------
+        fields : Iterable[str] | None, optional
+            Names of fields to decode, if undefined all fields are decoded,
+            by default None.
+
+        Returns
+        -------
+        dict[str, Any]
+            Decoded struct fields, array fields are copied out of the struct.
+        """
+        if fields is None:
+            fields = self._cdata_cls._plan
+        _values = {_key: self[_key] for _key in fields}
+        for _key, _value in _values.items():
+            if isinstance(_value, ndarray):
+                # Decoded arrays are views of struct memory the engine may reuse
+                _values[_key] = _value.copy()
+        return _values
 
 
 class Detector(_CData, cdecl="struct DETECTOR*"):
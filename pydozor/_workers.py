@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from multiprocessing.connection import wait
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+
+__all__ = ("get_result",)
+
+
+def get_result(queue: Any, workers: Sequence[BaseProcess]) -> Any:
+    """Wait for a message from worker processes, failing if they die.
+
+    Workers which exit with a nonzero code, e.g. after an uncaught exception,
+    a crash in the native library, or being killed, can never send the
+    message, so waiting for it would block forever.
+
+    Parameters
+    ----------
+    queue : Any
+        `SimpleQueue` the workers send messages on.
+    workers : Sequence[BaseProcess]
+        Worker processes, a worker which exits with code 0 is only expected
+        to have sent all of its messages.
+
+    Returns
+    -------
+    Any
+        Next message on the queue.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if a worker exits with a nonzero code, or every worker exits,
+        while no message is waiting.
+    """
+    _reader = queue._reader
+    _alive = [(_index, _worker) for _index, _worker in enumerate(workers)]
+    # Messages are written before a worker exits, so are checked for first
+    while not _reader.poll():
+        _ready = wait([_reader, *(_worker.sentinel for _, _worker in _alive)])
+        if _reader.poll():
+            break
+        for _index, _worker in _alive:
+            if _worker.sentinel not in _ready:
+                continue
+            # Sentinels are ready once a worker exits, maybe before it is reaped
+            _worker.join()
+            if _worker.exitcode:
+                raise RuntimeError(
+                    "Worker %d (pid %s) exited with code %d"
+                    % (_index, _worker.pid, _worker.exitcode)
+                )
+        _alive = [
+            (_index, _worker) for _index, _worker in _alive if _worker.exitcode is None
+        ]
+        if not _alive:
+            raise RuntimeError("All worker processes exited")
+    return queue.get()
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from asyncio import (
+    Future as AsyncFuture,
+    Semaphore,
+    get_running_loop,
+    to_thread,
+    wrap_future,
+)
+from collections import deque
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Self
+
+from .mask import PixelMask
+from .pool import DozorThreadPool
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from numpy import uint16
+    from numpy.typing import NDArray
+
+    from .schemas import DatacolSchema, DataSchema
+
+__all__ = ("AsyncDozor",)
+
+
+class AsyncDozor:
+    """Asyncio Front End For Dozor
+
+    Native Dozor calls run on a dedicated `DozorThreadPool` of per-thread
+    engines, so the event loop is never blocked. The number of frames
+    submitted but not yet processed is bounded, across all callers, and
+    submitting waits for a free slot, so producers are slowed down rather
+    than building up a backlog of frames in memory.
+
+    Parameters
+    ----------
+    config_file : Path
+        Dozor config file.
+    max_workers : int | None, optional
+        Number of worker threads, if undefined the CPU count is used,
+        by default None.
+    mask : PixelMask | None, optional
+        Pixel mask, applied to each frame in place before processing,
+        by default None.
+    max_in_flight : int | None, optional
+        Maximum number of frames submitted but not yet processed, if undefined
+        twice the number of workers, by default None.
+    """
+
+    def __init__(
+        self: Self,
+        config_file: Path,
+        max_workers: int | None = None,
+        *,
+        mask: PixelMask | None = None,
+        max_in_flight: int | None = None,
+    ) -> None:
+        self._pool = DozorThreadPool(
+            config_file,
+            max_workers,
+            mask=mask,
+            max_in_flight=max_in_flight,
+        )
+        self._max_in_flight = max_in_flight or 2 * self._pool.max_workers
+        self._semaphore = Semaphore(self._max_in_flight)
+
+    async def __aenter__(self: Self) -> Self:
+        return self
+
+    async def __aexit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    @property
+    def max_in_flight(self: Self) -> int:
+        """Maximum number of frames in flight.
+
+        Returns
+        -------
+        int
+            Maximum number of frames submitted but not yet processed.
+        """
+        return self._max_in_flight
+
+    async def submit(
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> AsyncFuture[tuple[DatacolSchema, DataSchema]]:
+        """Submit frame for processing, waiting for a free slot.
+
+        Parameters
+        ----------
+        image : NDArray[uint16]
+            Frame to process, must not be modified until processed.
+        fields : Iterable[str] | None, optional
+            Names of output fields to decode, if undefined all fields are
+            decoded, by default None.
+
+        Returns
+        -------
+        AsyncFuture[tuple[DatacolSchema, DataSchema]]
+            Future resolving to decoded output from `dozor_do_image`.
+        """
+        _loop = get_running_loop()
+        await self._semaphore.acquire()
+        try:
+            _future = self._pool.submit(image, fields=fields)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        # The slot is freed when the native call ends, even if cancelled
+        _future.add_done_callback(
+            lambda _: _loop.call_soon_threadsafe(self._semaphore.release)
+        )
+        return wrap_future(_future, loop=_loop)
+
+    async def do_image(
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> tuple[DatacolSchema, DataSchema]:
+        """Call Dozor to process a frame.
+
+        Parameters
+        ----------
+        image : NDArray[uint16]
+            Frame to process, must not be modified until processed.
+        fields : Iterable[str] | None, optional
+            Names of output fields to decode, if undefined all fields are
+            decoded, by default None.
+
+        Returns
+        -------
+        tuple[DatacolSchema, DataSchema]
+            Decoded output from `dozor_do_image`.
+        """
+        return await (await self.submit(image, fields=fields))
+
+    async def process(
+        self: Self,
+        images: AsyncIterable[NDArray[uint16]] | Iterable[NDArray[uint16]],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> AsyncIterator[tuple[DatacolSchema, DataSchema]]:
+        """Process frames, yielding results in input order.
+
+        Frames are only pulled from `images` when a slot is free, and at most
+        `max_in_flight` results are held back waiting for earlier frames.
+
+        Parameters
+        ----------
+        images : AsyncIterable[NDArray[uint16]] | Iterable[NDArray[uint16]]
+            Frames to process, consumed lazily as results are yielded.
+        fields : Iterable[str] | None, optional
+            Names of output fields to decode, if undefined all fields are
+            decoded, by default None.
+
+        Yields
+        ------
+        tuple[DatacolSchema, DataSchema]
+            Decoded output from `dozor_do_image`, for each frame.
+        """
+        _fields = tuple(fields) if fields is not None else None
+        _pending: deque[AsyncFuture[tuple[DatacolSchema, DataSchema]]] = deque()
+        try:
+            if isinstance(images, AsyncIterable):
+                async for _image in images:
+                    if len(_pending) >= self._max_in_flight:
+                        yield await _pending.popleft()
+                    _pending.append(await self.submit(_image, fields=_fields))
+            else:
+                for _image in images:
+                    if len(_pending) >= self._max_in_flight:
+                        yield await _pending.popleft()
+                    _pending.append(await self.submit(_image, fields=_fields))
+            while _pending:
+                yield await _pending.popleft()
+        finally:
+            for _future in _pending:
+                _future.cancel()
+
+    async def close(self: Self) -> None:
+        """Shut down worker threads, waiting for pending frames to finish."""
+        await to_thread(self._pool.close)
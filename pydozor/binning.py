@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any, Self
+
+from numpy import (
+    add as np_add,
+    ascontiguousarray as np_ascontiguousarray,
+    bool_,
+    copyto as np_copyto,
+    empty as np_empty,
+    greater as np_greater,
+    logical_not as np_logical_not,
+    logical_or as np_logical_or,
+    minimum as np_minimum,
+    multiply as np_multiply,
+    uint8,
+    uint16,
+    uint32,
+    uint64,
+    zeros as np_zeros,
+)
+
+from .dozor import Dozor
+from .mask import PixelMask
+
+if TYPE_CHECKING:
+    from numpy import unsignedinteger, void
+    from numpy.typing import NDArray
+
+    from .schemas import DatacolSchema, DataSchema, DozorConfig
+
+__all__ = ("bin_config", "FrameBinner", "ScreeningDozor")
+
+# Unbinned pixels processed per band of bin rows, keeps band temporaries small
+_BLOCK_SIZE = 1 << 18
+
+
+def bin_config(config: DozorConfig, factor: int) -> DozorConfig:
+    """Derive the Dozor configuration of frames binned by `FrameBinner`.
+
+    Detector size, pixel size, beam centre and resolution ROI are scaled to
+    binned pixels. Spot size, in pixels, is scaled by bin area, and the
+    overload threshold by the number of pixels summed into a bin, within
+    the `uint16` range of binned frames.
+
+    Parameters
+    ----------
+    config : DozorConfig
+        Dozor configuration of unbinned frames.
+    factor : int
+        Number of pixels binned along each axis.
+
+    Returns
+    -------
+    DozorConfig
+        Dozor configuration of binned frames.
+
+    Raises
+    ------
+    ValueError
+        Raised if `factor` is less than 1.
+    """
+    if factor < 1:
+        raise ValueError("Binning `factor` must be at least 1.")
+    return config.model_copy(
+        update={
+            "nx": config.nx // factor,
+            "ny": config.ny // factor,
+            "pixel": config.pixel * factor,
+            "org_x": config.org_x // factor,
+            "org_y": config.org_y // factor,
+            "ix_min": config.ix_min // factor,
+            "ix_max": config.ix_max // factor,
+            "iy_min": config.iy_min // factor,
+            "iy_max": config.iy_max // factor,
+            "spot_size": max(1, round(config.spot_size / factor**2)),
+            "pixel_max": min(config.pixel_max * factor**2, 65534),
+        }
+    )
+
+
+class FrameBinner:
+    """Frame Binning For Fast Screening
+
+    Sums `factor` × `factor` pixel blocks into `uint16` bins, in bands of
+    bin rows without full size temporaries. Masked pixels are left out of
+    each sum, which is scaled up by the fraction of pixels left out. Sums
+    saturate at 65534, while bins with an overloaded pixel, above
+    `pixel_max`, or with every pixel masked are set to 65535, the value
+    Dozor ignores. Trailing rows and columns which do not fill a bin are
+    dropped.
+
+    Parameters
+    ----------
+    shape : tuple[int, int]
+        Unbinned frame shape, as `(ny, nx)`.
+    factor : int
+        Number of pixels binned along each axis.
+    pixel_max : int
+        Max pixel value of unbinned frames.
+    mask : PixelMask | None, optional
+        Pixel mask of unbinned frames, by default None.
+
+    Raises
+    ------
+    ValueError
+        Raised if `factor` is less than 1 or larger than the frame, or mask
+        shape does not match.
+    """
+
+    def __init__(
+        self: Self,
+        shape: tuple[int, int],
+        factor: int,
+        pixel_max: int,
+        *,
+        mask: PixelMask | None = None,
+    ) -> None:
+        _ny, _nx = shape
+        if factor < 1 or factor > min(_ny, _nx):
+            raise ValueError(f"Binning `factor` {factor} invalid for {shape} frames.")
+        self._factor = factor
+        self._pixel_max = pixel_max
+        self._unbinned_shape = (_ny, _nx)
+        self._shape = (_ny // factor, _nx // factor)
+        _rows, _columns = self._shape
+        _area = factor * factor
+        # Bin rows per band, at least one
+        self._band = max(1, _BLOCK_SIZE // (_columns * _area))
+
+        self._good: NDArray[uint8] | None = None
+        self._scale: NDArray[uint32] | None = None
+        self._empty: NDArray[bool_] | None = None
+        if mask is not None and mask.count:
+            _bad = mask.to_bool()
+            if _bad.size != _ny * _nx:
+                raise ValueError(
+                    f"Mask has {_bad.size} pixels, frames have {_ny * _nx}."
+                )
+            _good = np_logical_not(_bad.reshape(shape))
+            self._good = np_ascontiguousarray(
+                _good[: _rows * factor, : _columns * factor]
+            ).view(uint8)
+            _count = np_empty(self._shape, dtype=uint32)
+            self._block_sum(self._good, _count)
+            self._empty = _count == 0
+            _count[self._empty] = 1
+            self._scale = _count
+
+    @property
+    def factor(self: Self) -> int:
+        """Binning factor.
+
+        Returns
+        -------
+        int
+            Number of pixels binned along each axis.
+        """
+        return self._factor
+
+    @property
+    def shape(self: Self) -> tuple[int, int]:
+        """Binned frame shape.
+
+        Returns
+        -------
+        tuple[int, int]
+            Binned frame shape, as `(ny, nx)`.
+        """
+        return self._shape
+
+    @property
+    def unbinned_shape(self: Self) -> tuple[int, int]:
+        """Unbinned frame shape.
+
+        Returns
+        -------
+        tuple[int, int]
+            Unbinned frame shape, as `(ny, nx)`.
+        """
+        return self._unbinned_shape
+
+    def _block_sum(self: Self, array: NDArray[Any], out: NDArray[Any]) -> None:
+        """Sum `factor` × `factor` blocks of a contiguous array into `out`.
+
+        Rows of each block are added first, then columns, as whole array
+        additions of strided views, much faster than a multi-axis reduction.
+        """
+        _factor = self._factor
+        _rows = array.shape[0] // _factor
+        _width = array.shape[1]
+        if _factor == 1:
+            np_copyto(out, array, casting="unsafe")
+            return
+        _blocks = array.reshape(_rows, _factor, _width)
+        _row_sums = np_empty((_rows, _width), dtype=out.dtype)
+        np_add(_blocks[:, 0], _blocks[:, 1], out=_row_sums, casting="unsafe")
+        for _index in range(2, _factor):
+            np_add(_row_sums, _blocks[:, _index], out=_row_sums, casting="unsafe")
+        _columns = _row_sums.reshape(_rows, _width // _factor, _factor)
+        np_add(_columns[:, :, 0], _columns[:, :, 1], out=out)
+        for _index in range(2, _factor):
+            np_add(out, _columns[:, :, _index], out=out)
+
+    def bin(
+        self: Self,
+        frame: NDArray[unsignedinteger[Any]],
+        *,
+        out: NDArray[uint16] | None = None,
+    ) -> NDArray[uint16]:
+        """Bin a frame.
+
+        Parameters
+        ----------
+        frame : NDArray[unsignedinteger[Any]]
+            Unbinned frame, with any unsigned integer DType, either raw
+            counts or converted to `uint16`. Masked pixels of converted
+            frames are overloaded to the binner, so frames are best binned
+            before masking.
+        out : NDArray[uint16] | None, optional
+            Output buffer, if undefined a new array is allocated,
+            by default None.
+
+        Returns
+        -------
+        NDArray[uint16]
+            Binned frame.
+
+        Raises
+        ------
+        ValueError
+            Raised if frame or `out` shape does not match.
+        """
+        if frame.shape != self._unbinned_shape:
+            raise ValueError(
+                f"Frame shape {frame.shape} does not match {self._unbinned_shape}."
+            )
+        if out is None:
+            out = np_empty(self._shape, dtype=uint16)
+        elif out.shape != self._shape or out.dtype != uint16:
+            raise ValueError(
+                "Array `out` must match binned shape, with DType `uint16`."
+            )
+
+        _factor = self._factor
+        _area = _factor * _factor
+        _rows, _columns = self._shape
+        _width = _columns * _factor
+        # Converted frames already hold 65535 for overloaded and masked pixels
+        _limit = (
+            self._pixel_max if frame.dtype.itemsize > 2 else min(self._pixel_max, 65534)
+        )
+        # Overloaded pixels are raised to a value whose block sum always
+        # exceeds the largest sum of pixels within the limit
+        _overload = _limit * _area + 1
+        _dtype = uint32 if _overload * _area < 1 << 32 else uint64
+        _band_shape = (self._band * _factor, _width)
+        _values = np_empty(_band_shape, dtype=_dtype)
+        _over = np_empty(_band_shape, dtype=bool_)
+        _sums = np_empty((self._band, _columns), dtype=_dtype)
+        for _first in range(0, _rows, self._band):
+            _last = min(_first + self._band, _rows)
+            _pixels = slice(_first * _factor, _last * _factor)
+            _band = frame[_pixels, :_width]
+            _band_values = _values[: _band.shape[0]]
+            _band_over = _over[: _band.shape[0]]
+            _band_sums = _sums[: _last - _first]
+            np_minimum(_band, _limit + 1, out=_band_values, casting="unsafe")
+            if self._good is not None:
+                np_multiply(_band_values, self._good[_pixels], out=_band_values)
+            np_greater(_band_values, _limit, out=_band_over)
+            np_copyto(_band_values, _overload, where=_band_over)
+            self._block_sum(_band_values, _band_sums)
+
+            _binned = out[_first:_last]
+            if self._scale is None:
+                np_minimum(_band_sums, 65534, out=_binned, casting="unsafe")
+                _binned[_band_sums >= _overload] = 65535
+                continue
+            _bad = _band_sums >= _overload
+            np_logical_or(_bad, self._empty[_first:_last], out=_bad)
+            # Scale up sums by the fraction of pixels masked, rounded
+            _band_sums *= _area
+            _band_sums += self._scale[_first:_last] // 2
+            _band_sums //= self._scale[_first:_last]
+            np_minimum(_band_sums, 65534, out=_binned, casting="unsafe")
+            _binned[_bad] = 65535
+        return out
+
+
+class ScreeningDozor:
+    """Binned Dozor Engine For Fast Screening
+
+    Frames are binned by a `FrameBinner` before processing, by an engine
+    built from the matching binned configuration, see `bin_config`. Spot
+    finding runs on `factor`² fewer pixels, for quick hit rate estimates
+    where full resolution spot finding is not required.
+
+    Parameters
+    ----------
+    config : DozorConfig
+        Dozor configuration of unbinned frames.
+    factor : int
+        Number of pixels binned along each axis.
+    mask : PixelMask | None, optional
+        Pixel mask of unbinned frames, by default None.
+    reuse_buffers : bool, optional
+        Whether the engine reuses its output structs, see `Dozor`,
+        by default True.
+    """
+
+    def __init__(
+        self: Self,
+        config: DozorConfig,
+        factor: int,
+        *,
+        mask: PixelMask | None = None,
+        reuse_buffers: bool = True,
+    ) -> None:
+        self._engine = Dozor.from_config(
+            bin_config(config, factor), reuse_buffers=reuse_buffers
+        )
+        self._binner = FrameBinner(
+            (config.ny, config.nx), factor, config.pixel_max, mask=mask
+        )
+        self._frame = np_zeros(self._binner.shape, dtype=uint16)
+
+    @property
+    def engine(self: Self) -> Dozor:
+        """Engine processing binned frames.
+
+        Returns
+        -------
+        Dozor
+            Dozor engine of the binned configuration.
+        """
+        return self._engine
+
+    @property
+    def binner(self: Self) -> FrameBinner:
+        """Frame binner.
+
+        Returns
+        -------
+        FrameBinner
+            Binner of unbinned frames.
+        """
+        return self._binner
+
+    def do_image(
+        self: Self,
+        frame: NDArray[unsignedinteger[Any]],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> tuple[DatacolSchema, DataSchema]:
+        """Bin and process a frame.
+
+        Parameters
+        ----------
+        frame : NDArray[unsignedinteger[Any]]
+            Unbinned frame, with any unsigned integer DType.
+        fields : Iterable[str] | None, optional
+            Names of output fields to include, see `Dozor.do_image`,
+            by default None.
+
+        Returns
+        -------
+        tuple[DatacolSchema, DataSchema]
+            Decoded output from `dozor_do_image`.
+        """
+        return self._engine.do_image(
+            self._binner.bin(frame, out=self._frame), fields=fields
+        )
+
+    def do_images(
+        self: Self,
+        stack: NDArray[unsignedinteger[Any]] | Iterable[NDArray[Any]],
+        *,
+        fields: Iterable[str] | None = None,
+        out: NDArray[void] | None = None,
+    ) -> NDArray[void]:
+        """Bin and process a stack of frames.
+
+        Parameters
+        ----------
+        stack : NDArray[unsignedinteger[Any]] | Iterable[NDArray[Any]]
+            Unbinned frames, either an `(N, ny, nx)` array or any iterable of
+            frames.
+        fields : Iterable[str] | None, optional
+            Names of `DatacolPickle` fields to include, see `Dozor.do_images`,
+            by default None.
+        out : NDArray[void] | None, optional
+            Preallocated results array, see `Dozor.do_images`,
+            by default None.
+
+        Returns
+        -------
+        NDArray[void]
+            Structured array of `DatacolPickle` records, one per frame.
+        """
+        # Each binned frame is processed before the next overwrites it
+        return self._engine.do_images(
+            (self._binner.bin(_frame, out=self._frame) for _frame in stack),
+            fields=fields,
+            out=out,
+        )
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from os import stat as os_stat
+from os.path import realpath as os_realpath
+from pathlib import Path
+from threading import Lock, RLock
+from typing import Hashable, Self
+
+from .config_store import config_digest
+from .dozor import Dozor
+from .schemas import DozorConfig
+
+__all__ = ("DozorCache", "default_cache")
+
+
+class DozorCache:
+    """LRU Cache Of Initialized Dozor Engines
+
+    Engines are keyed on the contents of their configuration, a config file
+    is identified by its resolved path plus size and modification time, while
+    a `DozorConfig` is identified by a hash of its serialized form.
+
+    Cached engines are shared, and reuse their output structs between frames,
+    so an engine from `get` must not be used from more than one thread at a
+    time. Callers in different threads hold the per-engine lock from
+    `get_with_lock` while using an engine.
+    """
+
+    def __init__(self: Self, maxsize: int = 8) -> None:
+        if maxsize < 1:
+            raise ValueError("Cache `maxsize` must be at least 1.")
+        self._maxsize = maxsize
+        self._engines: OrderedDict[Hashable, tuple[Dozor, Lock]] = OrderedDict()
+        self._lock = RLock()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def maxsize(self: Self) -> int:
+        """Maximum number of cached engines.
+
+        Returns
+        -------
+        int
+            Maximum number of cached engines.
+        """
+        return self._maxsize
+
+    def __len__(self: Self) -> int:
+        return len(self._engines)
+
+    @staticmethod
+    def key(config: Path | str | DozorConfig) -> Hashable:
+        """Generate cache key for a Dozor config.
+
+        Parameters
+        ----------
+        config : Path | str | DozorConfig
+            Dozor config file path, or Dozor configuration.
+
+        Returns
+        -------
+        Hashable
+            Key identifying the contents of the Dozor config.
+        """
+        if isinstance(config, DozorConfig):
+            return ("config", config_digest(config))
+        _path = os_realpath(config)
+        _stat = os_stat(_path)
+        return ("file", _path, _stat.st_size, _stat.st_mtime_ns)
+
+    def get(self: Self, config: Path | str | DozorConfig) -> Dozor:
+        """Get a warm Dozor engine for config, creating one if required.
+
+        Parameters
+        ----------
+        config : Path | str | DozorConfig
+            Dozor config file path, or Dozor configuration.
+
+        Returns
+        -------
+        Dozor
+            Initialized Dozor engine.
+        """
+        return self.get_with_lock(config)[0]
+
+    def get_with_lock(
+        self: Self,
+        config: Path | str | DozorConfig,
+    ) -> tuple[Dozor, Lock]:
+        """Get a warm Dozor engine for config, and the lock guarding its use.
+
+        Parameters
+        ----------
+        config : Path | str | DozorConfig
+            Dozor config file path, or Dozor configuration.
+
+        Returns
+        -------
+        tuple[Dozor, Lock]
+            Initialized Dozor engine, and its lock, to be held while the
+            engine processes frames.
+        """
+        _key = self.key(config)
+        with self._lock:
+            _entry = self._engines.get(_key)
+            if _entry is not None:
+                self._engines.move_to_end(_key)
+                self.hits += 1
+                return _entry
+            self.misses += 1
+
+            if isinstance(config, DozorConfig):
+                _engine = Dozor.from_config(config, reuse_buffers=True)
+            else:
+                _engine = Dozor(Path(config), reuse_buffers=True)
+
+            _entry = self._engines[_key] = (_engine, Lock())
+            while len(self._engines) > self._maxsize:
+                self._engines.popitem(last=False)
+            return _entry
+
+    def invalidate(self: Self, config: Path | str | DozorConfig) -> bool:
+        """Drop cached engine for config.
+
+        Parameters
+        ----------
+        config : Path | str | DozorConfig
+            Dozor config file path, or Dozor configuration.
+
+        Returns
+        -------
+        bool
+            Whether an engine was dropped from the cache.
+        """
+        with self._lock:
+            if isinstance(config, DozorConfig):
+                return self._engines.pop(self.key(config), None) is not None
+
+            # Match on path alone, so stale engines of modified files are dropped
+            _path = os_realpath(config)
+            _keys = [
+                _key for _key in self._engines if _key[0] == "file" and _key[1] == _path
+            ]
+            for _key in _keys:
+                del self._engines[_key]
+            return len(_keys) > 0
+
+    def clear(self: Self) -> None:
+        """Drop all cached engines and reset hit/miss counters."""
+        with self._lock:
+            self._engines.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+default_cache = DozorCache()
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from hashlib import sha256
+from os import getpid, remove as os_remove, replace as os_replace
+from os.path import exists as os_exists
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Lock
+from typing import TYPE_CHECKING, Self
+from weakref import finalize
+
+if TYPE_CHECKING:
+    from .schemas import DozorConfig
+
+__all__ = ("ConfigStore", "config_digest", "default_store")
+
+
+def config_digest(config: DozorConfig) -> str:
+    """Hash the serialized form of a Dozor config.
+
+    Parameters
+    ----------
+    config : DozorConfig
+        Dozor configuration.
+
+    Returns
+    -------
+    str
+        SHA-256 hex digest of the Dozor config file contents.
+    """
+    return sha256(config.model_dump().encode("utf-8")).hexdigest()
+
+
+def _remove_directory(directory: str, pid: int) -> None:
+    """Remove store directory, only from the process which created it."""
+    if getpid() == pid:
+        rmtree(directory, ignore_errors=True)
+
+
+class ConfigStore:
+    """Content Addressed Store Of Dozor Config Files
+
+    Config files are named by the hash of their contents, so identical
+    configs share a single file, which is written once and found again by
+    an in-memory lookup. The least recently used files are removed once more
+    than `maxsize` are stored.
+
+    A returned path is therefore only valid until `maxsize` other configs
+    are requested. Paths used for longer, e.g. by engines or workers created
+    later, are pinned with `path(config, pin=True)` or `pinned`, and are not
+    removed until every pin is released, the store holding more than
+    `maxsize` files meanwhile if required.
+
+    Parameters
+    ----------
+    directory : Path | str | None, optional
+        Directory to store config files in, files already in it are reused,
+        if undefined a temporary directory is created on first use and
+        removed when the process exits, by default None.
+    maxsize : int, optional
+        Maximum number of config files kept, by default 128.
+
+    Raises
+    ------
+    ValueError
+        Raised if `maxsize` is less than 1.
+    """
+
+    def __init__(
+        self: Self,
+        directory: Path | str | None = None,
+        maxsize: int = 128,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("Store `maxsize` must be at least 1.")
+        self._directory = Path(directory) if directory is not None else None
+        self._maxsize = maxsize
+        self._paths: OrderedDict[str, Path] = OrderedDict()
+        # Number of pins of each config file, by digest
+        self._pins: dict[str, int] = {}
+        self._lock = Lock()
+
+    @property
+    def directory(self: Self) -> Path:
+        """Store directory.
+
+        Returns
+        -------
+        Path
+            Directory holding the config files, created if required.
+        """
+        with self._lock:
+            return self._ensure_directory()
+
+    def __len__(self: Self) -> int:
+        return len(self._paths)
+
+    def _ensure_directory(self: Self) -> Path:
+        """Get store directory, creating it if required."""
+        if self._directory is None:
+            _directory = mkdtemp(prefix="pydozor-config-")
+            finalize(self, _remove_directory, _directory, getpid())
+            self._directory = Path(_directory)
+        else:
+            self._directory.mkdir(parents=True, exist_ok=True)
+        return self._directory
+
+    def path(self: Self, config: DozorConfig, *, pin: bool = False) -> Path:
+        """Get the config file of a Dozor config, writing it if required.
+
+        Parameters
+        ----------
+        config : DozorConfig
+            Dozor configuration.
+        pin : bool, optional
+            Whether to keep the config file until released with `release`,
+            by default False.
+
+        Returns
+        -------
+        Path
+            Config file, must not be modified.
+        """
+        _contents = config.model_dump()
+        _digest = sha256(_contents.encode("utf-8")).hexdigest()
+        with self._lock:
+            _path = self._paths.get(_digest)
+            if _path is not None and os_exists(_path):
+                self._paths.move_to_end(_digest)
+                if pin:
+                    self._pins[_digest] = self._pins.get(_digest, 0) + 1
+                return _path
+
+            _path = self._ensure_directory() / f"{_digest}.dat"
+            if not os_exists(_path):
+                # Written under a unique name and renamed, so readers never
+                # see a partial file
+                _temp = _path.with_name(f"{_digest}.{getpid()}.tmp")
+                with open(_temp, "w") as _file:
+                    _file.write(_contents)
+                os_replace(_temp, _path)
+
+            self._paths[_digest] = _path
+            if pin:
+                self._pins[_digest] = self._pins.get(_digest, 0) + 1
+            self._evict(_digest)
+            return _path
+
+    def release(self: Self, path: Path | str) -> None:
+        """Release a pin of a config file.
+
+        Parameters
+        ----------
+        path : Path | str
+            Config file, as returned by `path` with `pin` set.
+
+        Raises
+        ------
+        ValueError
+            Raised if the config file is not pinned.
+        """
+        _digest = Path(path).stem
+        with self._lock:
+            _count = self._pins.get(_digest, 0)
+            if not _count:
+                raise ValueError(f"Config file `{path}` is not pinned.")
+            if _count == 1:
+                del self._pins[_digest]
+                self._evict()
+            else:
+                self._pins[_digest] = _count - 1
+
+    @contextmanager
+    def pinned(self: Self, config: DozorConfig) -> Iterator[Path]:
+        """Get the config file of a Dozor config, kept while in the context.
+
+        Parameters
+        ----------
+        config : DozorConfig
+            Dozor configuration.
+
+        Yields
+        ------
+        Path
+            Config file, must not be modified.
+        """
+        _path = self.path(config, pin=True)
+        try:
+            yield _path
+        finally:
+            self.release(_path)
+
+    def _evict(self: Self, keep: str | None = None) -> None:
+        """Remove least recently used config files which are not pinned."""
+        _excess = len(self._paths) - self._maxsize
+        for _digest in list(self._paths):
+            if _excess <= 0:
+                break
+            if _digest in self._pins or _digest == keep:
+                continue
+            try:
+                os_remove(self._paths.pop(_digest))
+            except FileNotFoundError:
+                pass
+            _excess -= 1
+
+    def clear(self: Self) -> None:
+        """Remove all config files written or reused by this store, except pinned."""
+        with self._lock:
+            for _digest in list(self._paths):
+                if _digest in self._pins:
+                    continue
+                try:
+                    os_remove(self._paths.pop(_digest))
+                except FileNotFoundError:
+                    pass
+
+
+default_store = ConfigStore()
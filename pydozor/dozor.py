@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from os import environ
+from collections import OrderedDict
+from collections.abc import Iterable
+from functools import lru_cache
+from os import close as os_close, environ, write as os_write
 from os.path import (
     abspath as os_abspath,
     dirname as os_dirname,
@@ -8,17 +11,53 @@ from os.path import (
     realpath as os_realpath,
 )
 from pathlib import Path
-from typing import TYPE_CHECKING, Self
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Hashable, Literal, Self, overload
 
-from ._compat.dozor import Datacol, DatacolPickle, Detector, Local, ffi
-from .schemas import DatacolSchema, DataSchema
+from numpy import (
+    empty as np_empty,
+    float32,
+    frombuffer as np_frombuffer,
+    ndarray,
+    resize as np_resize,
+)
+
+from . import metrics
+from ._compat.dozor import (
+    CDataView,
+    Datacol,
+    DatacolPickle,
+    Detector,
+    Local,
+    Reflection,
+    ffi,
+    load_library,
+)
+from .config_store import config_digest, default_store
+from .mask import PixelMask
+
+try:
+    from os import memfd_create as os_memfd_create
+except ImportError:
+    # Linux only
+    os_memfd_create = None
 
 if TYPE_CHECKING:
-    from numpy import uint16
+    from cffi import FFI
+    from numpy import uint16, void
     from numpy.typing import NDArray
 
+    from .schemas import DatacolSchema, DataSchema, DozorConfig
+
 __all__ = ("Dozor",)
 
+# Maximum number of configurations kept read by `Dozor.from_config`
+_CONFIG_CACHE_SIZE = 32
+
+_config_cache: OrderedDict[Hashable, tuple[FFI.CData, FFI.CData]] = OrderedDict()
+_config_cache_lock = Lock()
+
 CUR_DIR = os_dirname(os_realpath(__file__))
 
 
@@ -29,25 +68,179 @@ elif Path(os_joinpath(CUR_DIR, "../libdozor.so")).exists():
     _lib_dozor_path = str(os_abspath(os_joinpath(CUR_DIR, "../libdozor.so")))
 
 
+@lru_cache(maxsize=64)
+def _split_fields(
+    fields: tuple[str, ...],
+) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Split field names between `Datacol` and `DatacolPickle` structs.
+
+    Parameters
+    ----------
+    fields : tuple[str, ...]
+        Field names.
+
+    Returns
+    -------
+    tuple[tuple[str, ...], tuple[str, ...]]
+        `Datacol` and `DatacolPickle` field names.
+
+    Raises
+    ------
+    ValueError
+        Raised if a field name is not in either struct.
+    """
+    _datacol_fields = set(Datacol.fields())
+    _data_fields = set(DatacolPickle.fields())
+    _unknown = [_key for _key in fields if _key not in _datacol_fields | _data_fields]
+    if _unknown:
+        raise ValueError(f"Unknown Dozor output fields: {', '.join(_unknown)}.")
+    return (
+        tuple(_key for _key in fields if _key in _datacol_fields),
+        tuple(_key for _key in fields if _key in _data_fields),
+    )
+
+
+# Allocates without zeroing, for memory overwritten straight away
+_new_uninitialized = ffi.new_allocator(should_clear_after_alloc=False)
+
+
+def _copy_cdata(cdata: FFI.CData) -> FFI.CData:
+    """Copy a struct or array allocated by `ffi.new` into new memory."""
+    _type = ffi.typeof(cdata)
+    _copy = _new_uninitialized(_type)
+    ffi.memmove(
+        _copy,
+        cdata,
+        ffi.sizeof(_type.item if _type.kind == "pointer" else _type),
+    )
+    return _copy
+
+
+def _read_config(lib: Any, config_file: Path | str) -> tuple[FFI.CData, FFI.CData]:
+    """Read a Dozor config file into new `Detector` and input `Datacol` structs."""
+    _data_input = Datacol()
+    lib.dozor_set_defaults_(_data_input)
+    _detector = Detector()
+    lib.read_dozor_(
+        _detector,
+        _data_input,
+        ffi.new("char[1024]", str(config_file).encode("utf-8")),
+        ffi.new("char[1024]"),
+        ffi.cast("char*", ffi.NULL),
+    )
+    return _detector, _data_input
+
+
+def _read_config_cached(
+    lib: Any,
+    config: DozorConfig,
+) -> tuple[FFI.CData, FFI.CData]:
+    """Get the structs read from a Dozor configuration, reading it once.
+
+    Returned structs are shared, and must be copied before use.
+    """
+    _key = (id(lib), config_digest(config))
+    with _config_cache_lock:
+        _structs = _config_cache.get(_key)
+        if _structs is not None:
+            _config_cache.move_to_end(_key)
+            return _structs
+
+    _fd = -1
+    if os_memfd_create is not None:
+        try:
+            _fd = os_memfd_create("dozor.dat")
+        except OSError:
+            pass
+    if _fd < 0:
+        # No anonymous files on this platform, use the stored config file
+        _structs = _read_config(lib, default_store.path(config))
+    else:
+        try:
+            os_write(_fd, config.model_dump().encode("utf-8"))
+            _structs = _read_config(lib, f"/proc/self/fd/{_fd}")
+        finally:
+            os_close(_fd)
+
+    with _config_cache_lock:
+        _config_cache[_key] = _structs
+        while len(_config_cache) > _CONFIG_CACHE_SIZE:
+            _config_cache.popitem(last=False)
+    return _structs
+
+
+def _metrics_stage(
+    metrics: metrics.Metrics,
+    stage: str,
+    start: float,
+    nbytes: int = 0,
+) -> float:
+    """Record latency of a single frame stage, returning its end time."""
+    _now = perf_counter()
+    metrics.observe(stage, _now - start, frames=1, nbytes=nbytes)
+    return _now
+
+
 class Dozor:
-    """Python Wrapper For Dozor"""
+    """Python Wrapper For Dozor
 
-    def __init__(self, config_file: Path) -> None:
-        self._lib = ffi.dlopen(_lib_dozor_path)
+    Parameters
+    ----------
+    config_file : Path
+        Dozor config file.
+    reuse_buffers : bool, optional
+        Whether the engine owns a single pair of output structs which are
+        reused for every frame, rather than allocating new ones per frame,
+        by default False. Decoded results returned by `do_image` are copied
+        out of the output structs, so remain valid across calls, except lazy
+        views, which are only valid until the next call unless copied out
+        with their `to_dict`.
+    """
 
-        self._data_input = Datacol()
-        self._lib.dozor_set_defaults_(self._data_input)
+    def __init__(self, config_file: Path, *, reuse_buffers: bool = False) -> None:
+        self._lib = load_library(_lib_dozor_path)
+        self._detector, self._data_input = _read_config(self._lib, config_file)
+        self._prepare(reuse_buffers)
 
-        self._detector = Detector()
+    @classmethod
+    def from_config(
+        cls: type[Self],
+        config: DozorConfig,
+        *,
+        reuse_buffers: bool = False,
+    ) -> Self:
+        """Create engine from a Dozor configuration, without a config file.
 
-        self._lib.read_dozor_(
-            self._detector,
-            self._data_input,
-            ffi.new("char[1024]", str(config_file).encode("utf-8")),
-            ffi.new("char[1024]"),
-            ffi.cast("char*", ffi.NULL),
-        )
+        The `Detector` and input `Datacol` structs read from a configuration
+        are kept for its content hash, and copied into every later engine of
+        an identical configuration before `pre_dozor_`. The first engine of
+        a configuration has Dozor read it from an in-memory file, where the
+        platform supports it.
+
+        Parameters
+        ----------
+        config : DozorConfig
+            Dozor configuration.
+        reuse_buffers : bool, optional
+            Whether the engine reuses its output structs, see `Dozor`,
+            by default False.
+
+        Returns
+        -------
+        Self
+            Initialized Dozor engine.
+        """
+        _lib = load_library(_lib_dozor_path)
+        _detector, _data_input = _read_config_cached(_lib, config)
+        _engine = object.__new__(cls)
+        _engine._lib = _lib
+        _engine._detector = _copy_cdata(_detector)
+        _engine._data_input = _copy_cdata(_data_input)
+        _engine._prepare(reuse_buffers)
+        return _engine
 
+    def _prepare(self: Self, reuse_buffers: bool) -> None:
+        """Run `pre_dozor_` on the config read into the input structs."""
         self._local = Local()
         self._detector.ix = self._detector.ix_unbinned * self._detector.binning_factor
         self._detector.iy = self._detector.iy_unbinned * self._detector.binning_factor
@@ -63,6 +256,64 @@ class Dozor:
             ffi.new("int*", 0),
         )
 
+        self._init_outputs(reuse_buffers)
+
+    def _init_outputs(self: Self, reuse_buffers: bool) -> None:
+        """Set up output structs and per-frame state of a new engine."""
+        self._reuse_buffers = reuse_buffers
+        self._datacol_out: FFI.CData | None = None
+        self._data_out: FFI.CData | None = None
+        if reuse_buffers:
+            self._datacol_out = Datacol()
+            self._data_out = DatacolPickle()
+        self._last_outputs: tuple[FFI.CData, FFI.CData] | None = None
+        self._spots: FFI.CData | None = None
+        self._spots_capacity = 0
+
+    def clone(self: Self, *, reuse_buffers: bool | None = None) -> Self:
+        """Create an independent engine with the same initialized state.
+
+        The detector, input `Datacol`, `Local` and `psi_im`/`kl_im` state
+        computed by `read_dozor_` and `pre_dozor_` is copied, so the config
+        file is neither read nor preprocessed again. Clone an engine before it
+        has processed any frames, since the per-frame `Local` state it holds
+        after processing is copied as well.
+
+        Parameters
+        ----------
+        reuse_buffers : bool | None, optional
+            Whether the clone reuses its output structs, if undefined the
+            same as this engine, by default None.
+
+        Returns
+        -------
+        Self
+            New engine, sharing no mutable state with this engine.
+        """
+        _clone = object.__new__(type(self))
+        _clone._lib = self._lib
+        _clone._detector = _copy_cdata(self._detector)
+        _clone._data_input = _copy_cdata(self._data_input)
+        _clone._local = _copy_cdata(self._local)
+        _clone._pixel_count = self._pixel_count
+        _clone._psi_im = _copy_cdata(self._psi_im)
+        _clone._kl_im = _copy_cdata(self._kl_im)
+        _clone._init_outputs(
+            self._reuse_buffers if reuse_buffers is None else reuse_buffers
+        )
+        return _clone
+
+    @property
+    def reuse_buffers(self: Self) -> bool:
+        """Reuse output structs.
+
+        Returns
+        -------
+        bool
+            Whether output structs are reused between frames.
+        """
+        return self._reuse_buffers
+
     @property
     def pixel_max(self: Self) -> int:
         """Pixel max.
@@ -74,10 +325,89 @@ class Dozor:
         """
         return self._data_input.pixel_max
 
+    @property
+    def shape(self: Self) -> tuple[int, int]:
+        """Frame shape.
+
+        Returns
+        -------
+        tuple[int, int]
+            Frame shape expected by Dozor, as `(iy, ix)`.
+        """
+        return (self._detector.iy, self._detector.ix)
+
+    def _frame_pointer(self: Self, image: NDArray[uint16]) -> FFI.CData:
+        """Get pointer to frame data to pass to Dozor.
+
+        Parameters
+        ----------
+        image : NDArray[uint16]
+            Frame to process.
+
+        Returns
+        -------
+        FFI.CData
+            Frame data pointer.
+
+        Raises
+        ------
+        TypeError
+            Raised if frame does not have DType `uint16`.
+        ValueError
+            Raised if frame is not contiguous or has the wrong pixel count.
+        """
+        if image.dtype.itemsize != 2 or image.dtype.kind not in "ui":
+            raise TypeError(f"Frame must have DType `uint16`, not `{image.dtype}`.")
+        if image.size != self._pixel_count:
+            raise ValueError(
+                f"Frame has {image.size} pixels, Dozor expects {self._pixel_count}."
+            )
+        if not image.flags.c_contiguous:
+            raise ValueError("Frame must be C-contiguous.")
+        return ffi.cast("short*", ffi.from_buffer(image))
+
+    def _output_structs(self: Self) -> tuple[FFI.CData, FFI.CData]:
+        """Get output structs for the next frame.
+
+        Returns
+        -------
+        tuple[FFI.CData, FFI.CData]
+            `Datacol` and `DatacolPickle` output structs, owned by the engine
+            when buffers are reused, otherwise newly allocated.
+        """
+        if self._reuse_buffers:
+            return self._datacol_out, self._data_out
+        return Datacol(), DatacolPickle()
+
+    @overload
+    def do_image(  # noqa: E704
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        mask: PixelMask | None = None,
+        fields: Iterable[str] | None = None,
+        lazy: Literal[False] = False,
+        as_numpy: bool = False,
+    ) -> tuple[DatacolSchema, DataSchema]: ...
+
+    @overload
+    def do_image(  # noqa: E704
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        mask: PixelMask | None = None,
+        lazy: Literal[True],
+    ) -> tuple[CDataView, CDataView]: ...
+
     def do_image(
         self: Self,
         image: NDArray[uint16],
-    ) -> tuple[DatacolSchema, DataSchema]:
+        *,
+        mask: PixelMask | None = None,
+        fields: Iterable[str] | None = None,
+        lazy: bool = False,
+        as_numpy: bool = False,
+    ) -> tuple[DatacolSchema, DataSchema] | tuple[CDataView, CDataView]:
         """Call Dozor to process frame.
 
         Wrapper around Dozor `dozor_do_image` subroutine.
@@ -86,16 +416,53 @@ class Dozor:
         ----------
         image : NDArray
             Frame to process.
+        mask : PixelMask | None, optional
+            Pixel mask, applied to `image` in place before processing,
+            by default None.
+        fields : Iterable[str] | None, optional
+            Names of `Datacol` and `DatacolPickle` fields to decode, if
+            undefined all fields are decoded, by default None.
+        lazy : bool, optional
+            Whether to return lazily decoded views of the output structs
+            instead of dictionaries, by default False. When output buffers are
+            reused, views are only valid until the next call.
+        as_numpy : bool, optional
+            Whether decoded array fields are NumPy arrays rather than lists,
+            by default False. Arrays are zero-copy views of the output structs,
+            except when output buffers are reused, where they are copies, as
+            views would be overwritten by the next call. Lazy views always
+            return NumPy arrays.
 
         Returns
         -------
-        tuple[DatacolSchema, DataSchema]
+        tuple[DatacolSchema, DataSchema] | tuple[CDataView, CDataView]
             Decoded output from `dozor_do_image`.
+
+        Raises
+        ------
+        ValueError
+            Raised if `fields` and `lazy` are both defined, or `fields`
+            includes an unknown field name.
         """
-        _data = DatacolPickle()
-        _datacol = Datacol()
+        _datacol_fields: tuple[str, ...] | None = None
+        _data_fields: tuple[str, ...] | None = None
+        if fields is not None:
+            if lazy:
+                raise ValueError("Arguments `fields` and `lazy` are exclusive.")
+            _datacol_fields, _data_fields = _split_fields(tuple(fields))
+
+        _image_pointer = self._frame_pointer(image)
+        _metrics = metrics._active
+        if _metrics is not None:
+            _start = perf_counter()
+        if mask is not None:
+            mask.apply(image)
+            if _metrics is not None:
+                _start = _metrics_stage(_metrics, "mask", _start, image.nbytes)
+
+        _datacol, _data = self._output_structs()
         self._lib.dozor_do_image_(
-            ffi.cast("short*", ffi.from_buffer(image)),
+            _image_pointer,
             self._detector,
             self._data_input,
             _datacol,
@@ -104,44 +471,210 @@ class Dozor:
             self._psi_im,
             self._kl_im,
         )
-        return (
-            Datacol.to_dict(_datacol),
-            DatacolPickle.to_dict(_data),
-        )
+        self._last_outputs = (_datacol, _data)
+        if _metrics is not None:
+            _start = _metrics_stage(_metrics, "native", _start, image.nbytes)
+
+        if lazy:
+            _results = Datacol.view(_datacol), DatacolPickle.view(_data)
+        else:
+            _results = (
+                Datacol.to_dict(_datacol, _datacol_fields, as_numpy=as_numpy),
+                DatacolPickle.to_dict(_data, _data_fields, as_numpy=as_numpy),
+            )
+            if as_numpy and self._reuse_buffers:
+                for _decoded in _results:
+                    for _key, _value in _decoded.items():
+                        if isinstance(_value, ndarray):
+                            _decoded[_key] = _value.copy()
+        if _metrics is not None:
+            _metrics_stage(_metrics, "marshal", _start)
+        return _results
+
+    def do_images(
+        self: Self,
+        stack: NDArray[uint16] | Iterable[NDArray[uint16]],
+        *,
+        mask: PixelMask | None = None,
+        fields: Iterable[str] | None = None,
+        out: NDArray[void] | None = None,
+    ) -> NDArray[void]:
+        """Call Dozor to process a stack of frames.
 
-    # def get_spot_list(
-    #     self: Self,
-    #     image: NDArray,
-    #     data: DataSchema,
-    #     datacol: DatacolSchema,
-    # ) -> list[ReflectionSchema]:
-    #     """Get spot X/Y coordinates.
-
-    #     Wrapper around Dozor `dozor_get_spot_list` subroutine.
-
-    #     Parameters
-    #     ----------
-    #     image : NDArray
-    #         Frame to get spots coords for.
-    #     data : DataSchema
-    #         Output from `dozor_do_image`.
-    #     datacol : DatacolSchema
-    #         Datacol.
-
-    #     Returns
-    #     -------
-    #     list[ReflectionSchema]
-    #         Spots X/Y coordinates.
-    #     """
-    #     _spots_length = data["NofR"]
-    #     _spots = ffi.new(f"struct Reflection[{_spots_length}]")
-    #     ffi.dozor_get_spot_list_(
-    #         self._detector,
-    #         Datacol(**datacol),
-    #         DatacolPickle(**data),
-    #         ffi.cast("short*", ffi.from_buffer(image)),
-    #         _spots,
-    #     )
-    #     return [
-    #         Reflection.to_dict(_item) for _item in ffi.unpack(_spots, _spots_length)
-    #     ]
+        Results are written into a structured array with one record per frame,
+        laid out like `struct DATACOL_PICKLE`, so each frame costs a single
+        record copy and no Python objects. Columns can be accessed by name,
+        e.g. `results["score3"]`.
+
+        Parameters
+        ----------
+        stack : NDArray[uint16] | Iterable[NDArray[uint16]]
+            Frames to process, either an `(N, ny, nx)` array or any iterable
+            of frames.
+        mask : PixelMask | None, optional
+            Pixel mask, applied to each frame in place before processing,
+            by default None.
+        fields : Iterable[str] | None, optional
+            Names of `DatacolPickle` fields to include in results, if undefined
+            all fields are included, by default None.
+        out : NDArray[void] | None, optional
+            Preallocated array of `DatacolPickle.record_dtype()` records to
+            write results into, must hold at least one record per frame, if
+            undefined a new array is allocated, by default None.
+
+        Returns
+        -------
+        NDArray[void]
+            Structured array of `DatacolPickle` records, one per frame.
+
+        Raises
+        ------
+        ValueError
+            Raised if `fields` includes an unknown field name, or `out` is too
+            small or has the wrong DType.
+        """
+        _dtype = DatacolPickle.record_dtype()
+        if fields is not None:
+            fields = list(fields)
+            _unknown = [_key for _key in fields if _key not in _dtype.names]
+            if _unknown:
+                raise ValueError(f"Unknown Dozor output fields: {', '.join(_unknown)}.")
+
+        _datacol, _data = self._output_structs()
+        _record = DatacolPickle.record(_data)
+
+        if out is not None:
+            if out.dtype != _dtype:
+                raise ValueError("Array `out` must have `DatacolPickle` record DType.")
+            _results = out
+        else:
+            _results = np_empty(
+                len(stack) if hasattr(stack, "__len__") else 64,
+                dtype=_dtype,
+            )
+        _metrics = metrics._active
+        _count = 0
+        for _image in stack:
+            if _count == len(_results):
+                if out is not None:
+                    raise ValueError("Array `out` is smaller than frame stack.")
+                # Length not known ahead of time, grow results geometrically
+                _results = np_resize(_results, max(2 * _count, 64))
+            _image_pointer = self._frame_pointer(_image)
+            if _metrics is not None:
+                _start = perf_counter()
+            if mask is not None:
+                mask.apply(_image)
+                if _metrics is not None:
+                    _start = _metrics_stage(_metrics, "mask", _start, _image.nbytes)
+            self._lib.dozor_do_image_(
+                _image_pointer,
+                self._detector,
+                self._data_input,
+                _datacol,
+                _data,
+                self._local,
+                self._psi_im,
+                self._kl_im,
+            )
+            if _metrics is not None:
+                _start = _metrics_stage(_metrics, "native", _start, _image.nbytes)
+            _results[_count] = _record[0]
+            if _metrics is not None:
+                _metrics_stage(_metrics, "marshal", _start)
+            _count += 1
+        if _count:
+            self._last_outputs = (_datacol, _data)
+
+        _results = _results[:_count]
+        if fields is not None:
+            return _results[fields]
+        return _results
+
+    @overload
+    def get_spot_list(  # noqa: E704
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        structured: Literal[False] = False,
+        copy: bool = False,
+    ) -> NDArray[float32]: ...
+
+    @overload
+    def get_spot_list(  # noqa: E704
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        structured: Literal[True],
+        copy: bool = False,
+    ) -> NDArray[void]: ...
+
+    def get_spot_list(
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        structured: bool = False,
+        copy: bool = False,
+    ) -> NDArray[float32] | NDArray[void]:
+        """Get spot X/Y coordinates and intensities.
+
+        Wrapper around Dozor `dozor_get_spot_list` subroutine, using the
+        output structs of the last frame processed, so must be called with
+        that same frame, after `do_image`, or after `do_images` for its last
+        frame. Spots are written into a `Reflection` buffer owned by the
+        engine, grown as needed to hold `NofR` spots.
+
+        Parameters
+        ----------
+        image : NDArray[uint16]
+            Last frame processed, as passed to Dozor, including the mask.
+        structured : bool, optional
+            Whether to return a structured array of `Reflection` records with
+            fields `x`, `y` and `intensity`, rather than an `(n, 3)` float32
+            array, by default False.
+        copy : bool, optional
+            Whether to copy spots out of the engine buffer, otherwise the
+            returned array views the buffer and is only valid until the next
+            call, by default False.
+
+        Returns
+        -------
+        NDArray[float32] | NDArray[void]
+            Spots, one row or record per spot, as `x`, `y` and `intensity`.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if no frame has been processed yet.
+        """
+        if self._last_outputs is None:
+            raise RuntimeError("No frame has been processed yet.")
+        _datacol, _data = self._last_outputs
+        _image_pointer = self._frame_pointer(image)
+
+        _count = max(0, _data.NofR)
+        if _count > self._spots_capacity:
+            self._spots_capacity = max(_count, 2 * self._spots_capacity)
+            self._spots = ffi.new(f"struct Reflection[{self._spots_capacity}]")
+        if _count:
+            self._lib.dozor_get_spot_list_(
+                self._detector,
+                _datacol,
+                _data,
+                _image_pointer,
+                self._spots,
+            )
+
+        _dtype = Reflection.record_dtype()
+        _spots = (
+            np_frombuffer(
+                ffi.buffer(self._spots, _count * _dtype.itemsize),
+                dtype=_dtype,
+                count=_count,
+            )
+            if _count
+            else np_empty(0, dtype=_dtype)
+        )
+        if not structured:
+            _spots = _spots.view(float32).reshape(_count, 3)
+        return _spots.copy() if copy else _spots
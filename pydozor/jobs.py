@@ -0,0 +1,430 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Hashable, Iterable, Iterator
+from hashlib import blake2b
+from heapq import heappop, heappush
+from multiprocessing import get_context
+from os import cpu_count, makedirs, remove as os_remove
+from os.path import exists as os_exists, join as os_joinpath
+from pathlib import Path
+from threading import Thread
+from time import monotonic
+from traceback import format_exc
+from typing import TYPE_CHECKING, Any, NamedTuple, Self
+
+from ._workers import get_result
+from .cache import DozorCache
+from .config_store import default_store
+from .mask import PixelMask
+from .offline import _RESULT_SUFFIXES
+from .reader import EigerReader
+from .results import ResultFormat, ResultWriter, merge_results
+from .schemas import DozorConfig
+from .wrapper import _convert_to_uint16
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+
+__all__ = ("DatasetJob", "JobResult", "run_jobs")
+
+
+class DatasetJob(NamedTuple):
+    """Dataset Processing Job"""
+
+    master_file: Path | str
+    config: Path | str | DozorConfig
+    output_dir: Path | str
+    mask: PixelMask | None = None
+    priority: int = 0
+    start: int = 1
+    end: int | None = None
+
+
+class JobResult(NamedTuple):
+    """Dataset Processing Job Result"""
+
+    job: DatasetJob
+    frames: int
+    hits: int
+    output: str | None
+    error: str | None
+    elapsed: float
+
+
+def _mask_key(mask: PixelMask | None) -> Hashable:
+    """Key identifying the contents of a mask."""
+    if mask is None:
+        return None
+    _kind, _data = mask._compact()
+    return (mask.shape, mask.count, _kind, blake2b(_data.data, digest_size=16).digest())
+
+
+def _worker(
+    work_num: int,
+    cut_off: float,
+    engines: int,
+    tasks: Any,
+    done: Any,
+) -> None:
+    """Job worker, keeps warm engines and masks of every config group it sees."""
+    _cache = DozorCache(engines)
+    _groups: dict[int, tuple[str, PixelMask | None]] = {}
+    _specs: dict[int, tuple[int, str, str]] = {}
+    _jobs: dict[int, tuple[EigerReader, ResultWriter]] = {}
+    try:
+        while (_message := tasks.get()) is not None:
+            _kind = _message[0]
+            if _kind == "group":
+                _, _group, _config_file, _mask = _message
+                _groups[_group] = (_config_file, _mask)
+            elif _kind == "job":
+                _, _job, _group, _master_file, _part = _message
+                _specs[_job] = (_group, _master_file, _part)
+            elif _kind == "close":
+                _job = _message[1]
+                _specs.pop(_job, None)
+                _opened = _jobs.pop(_job, None)
+                try:
+                    if _opened is not None:
+                        _opened[1].close()
+                        _opened[0].close()
+                finally:
+                    done.put(("closed", work_num, _job, None))
+            else:
+                _, _job, _first, _last = _message
+                try:
+                    _group, _master_file, _part = _specs[_job]
+                    if _job not in _jobs:
+                        _jobs[_job] = (
+                            EigerReader(_master_file, workers=1),
+                            ResultWriter(_part, format="raw"),
+                        )
+                    _reader, _output = _jobs[_job]
+                    _config_file, _mask = _groups[_group]
+                    _engine = _cache.get(_config_file)
+                    _frames = _reader.read(_first, _last)
+                    _results = _engine.do_images(
+                        _convert_to_uint16(_frames, _engine.pixel_max, inplace=True),
+                        mask=_mask,
+                    )
+                    _output.write(_first, _results)
+                    _reader.release(_frames)
+                    _hits = int((_results["score3"] > cut_off).sum())
+                    done.put(("done", work_num, _job, _hits))
+                except Exception:
+                    done.put(("failed", work_num, _job, format_exc()))
+    except Exception:
+        done.put(("error", work_num, None, format_exc()))
+    finally:
+        for _reader, _output in _jobs.values():
+            _output.close()
+            _reader.close()
+
+
+def _feed(jobs: Any, min_task_frames: int, done: Any) -> None:
+    """Plan jobs into chunk tasks as they arrive, for the scheduler."""
+    try:
+        for _job in iter(jobs.get, None) if hasattr(jobs, "get") else jobs:
+            try:
+                with EigerReader(_job.master_file, workers=1) as _reader:
+                    _tasks = _reader.chunks(
+                        _job.start, _job.end, min_frames=min_task_frames
+                    )
+                _mask = _mask_key(_job.mask)
+                _config_file = _job.config
+                if isinstance(_config_file, DozorConfig):
+                    # Workers read the file later, kept until the job completes
+                    _config_file = default_store.path(_config_file, pin=True)
+                _config_file = str(_config_file)
+                _key = (DozorCache.key(_config_file), _mask)
+                _plan: Any = (_tasks, _config_file, _key)
+            except Exception:
+                _plan = format_exc()
+            done.put(("job", None, _job, _plan))
+        done.put(("end", None, None, None))
+    except Exception:
+        done.put(("error", None, None, format_exc()))
+
+
+class _JobState:
+    """Scheduling State Of A Job"""
+
+    def __init__(
+        self: Self,
+        job: DatasetJob,
+        group: int,
+        tasks: list[tuple[int, int]],
+        output: str,
+    ) -> None:
+        self.job = job
+        self.group = group
+        self.tasks = deque(tasks)
+        self.frames = sum(_last - _first + 1 for _first, _last in tasks)
+        self.remaining = self.frames
+        self.output = output
+        self.parts: dict[int, str] = {}
+        self.running = 0
+        # Workers yet to close their partial files, once closing is requested
+        self.closing: int | None = None
+        self.hits = 0
+        self.error: str | None = None
+        self.started = monotonic()
+
+
+class _Scheduler:
+    """Chunk Task Scheduler Over Per-Worker Queues
+
+    Jobs are ordered by priority, then by frames left to dispatch, so a small
+    job arriving behind a large one of the same priority runs next rather than
+    after it. Each worker is sent a config group's engine config and mask the
+    first time it gets one of its tasks, and idle workers are chosen among
+    those already holding the group.
+    """
+
+    def __init__(
+        self: Self,
+        queues: list[Any],
+        in_flight: int,
+        output_format: ResultFormat,
+    ) -> None:
+        self._queues = queues
+        self._in_flight = in_flight
+        self._output_format = output_format
+        self._running = [0] * len(queues)
+        self._warm: list[set[int]] = [set() for _ in queues]
+        self._groups: dict[Hashable, int] = {}
+        self._group_specs: list[tuple[str, PixelMask | None]] = []
+        self._jobs: dict[int, _JobState] = {}
+        self._ready: list[tuple[int, int, int]] = []
+        self._next_job = 0
+
+    def __len__(self: Self) -> int:
+        return len(self._jobs)
+
+    def add(
+        self: Self,
+        job: DatasetJob,
+        plan: tuple[list[tuple[int, int]], str, Hashable] | str,
+    ) -> None:
+        """Add a planned job, or a job which failed planning."""
+        _job_id = self._next_job
+        self._next_job += 1
+        _output = os_joinpath(
+            job.output_dir, "dozor_res" + _RESULT_SUFFIXES[self._output_format]
+        )
+        if isinstance(plan, str):
+            _state = _JobState(job, -1, [], _output)
+            _state.error = plan
+            self._jobs[_job_id] = _state
+            return
+
+        _tasks, _config_file, _key = plan
+        _group = self._groups.get(_key)
+        if _group is None:
+            _group = self._groups[_key] = len(self._group_specs)
+            self._group_specs.append((_config_file, job.mask))
+
+        makedirs(job.output_dir, exist_ok=True)
+        _state = _JobState(job, _group, _tasks, _output)
+        self._jobs[_job_id] = _state
+        if _state.tasks:
+            heappush(self._ready, (-job.priority, _state.remaining, _job_id))
+
+    def dispatch(self: Self) -> None:
+        """Hand out tasks until every worker is busy or no task is left."""
+        while self._ready:
+            _, _, _job_id = self._ready[0]
+            _state = self._jobs[_job_id]
+            if _state.error is not None or not _state.tasks:
+                heappop(self._ready)
+                continue
+            _idle = [
+                _work_num
+                for _work_num, _running in enumerate(self._running)
+                if _running < self._in_flight
+            ]
+            if not _idle:
+                return
+            _work_num = min(
+                _idle,
+                key=lambda _index: (
+                    _state.group not in self._warm[_index],
+                    self._running[_index],
+                ),
+            )
+            heappop(self._ready)
+            self._send(_work_num, _job_id, _state)
+            if _state.tasks:
+                heappush(self._ready, (-_state.job.priority, _state.remaining, _job_id))
+
+    def _send(self: Self, work_num: int, job_id: int, state: _JobState) -> None:
+        """Send the next task of a job to a worker, with any setup it lacks."""
+        _queue = self._queues[work_num]
+        if state.group not in self._warm[work_num]:
+            _queue.put(("group", state.group, *self._group_specs[state.group]))
+            self._warm[work_num].add(state.group)
+        if work_num not in state.parts:
+            _part = os_joinpath(
+                state.job.output_dir, "dozor_res_%d_%d.rec" % (job_id, work_num)
+            )
+            state.parts[work_num] = _part
+            _queue.put(("job", job_id, state.group, str(state.job.master_file), _part))
+        _first, _last = state.tasks.popleft()
+        _queue.put(("task", job_id, _first, _last))
+        state.remaining -= _last - _first + 1
+        state.running += 1
+        self._running[work_num] += 1
+
+    def update(self: Self, kind: str, work_num: int, job_id: int, payload: Any) -> None:
+        """Record a message from a worker."""
+        _state = self._jobs[job_id]
+        if kind == "closed":
+            _state.closing -= 1
+            return
+        self._running[work_num] -= 1
+        _state.running -= 1
+        if kind == "done":
+            _state.hits += payload
+        elif _state.error is None:
+            # Tasks already sent to workers still run, but no more are sent
+            _state.error = payload
+            _state.tasks.clear()
+
+    def finished(self: Self) -> Iterator[JobResult]:
+        """Close and merge jobs with no task left, yielding their results."""
+        for _job_id, _state in list(self._jobs.items()):
+            if _state.running or _state.tasks:
+                continue
+            if _state.closing is None:
+                # Workers close their partial files before they are merged
+                for _work_num in _state.parts:
+                    self._queues[_work_num].put(("close", _job_id))
+                _state.closing = len(_state.parts)
+            if _state.closing:
+                continue
+            del self._jobs[_job_id]
+            yield self._complete(_state)
+
+    def _complete(self: Self, state: _JobState) -> JobResult:
+        """Merge partial files of a closed job into its result."""
+        if state.group >= 0 and isinstance(state.job.config, DozorConfig):
+            default_store.release(self._group_specs[state.group][0])
+        _parts = [_part for _part in state.parts.values() if os_exists(_part)]
+        if state.error is not None:
+            for _part in _parts:
+                os_remove(_part)
+            return JobResult(
+                state.job,
+                state.frames,
+                0,
+                None,
+                state.error,
+                monotonic() - state.started,
+            )
+        merge_results(_parts, state.output, format=self._output_format, remove=True)
+        return JobResult(
+            state.job,
+            state.frames,
+            state.hits,
+            state.output,
+            None,
+            monotonic() - state.started,
+        )
+
+
+def run_jobs(
+    jobs: Iterable[DatasetJob] | Any,
+    *,
+    nproc: int | None = None,
+    cut_off: float = 5,
+    in_flight: int = 2,
+    min_task_frames: int = 1,
+    output_format: ResultFormat = "hdf5",
+    engines: int = 8,
+) -> Iterator[JobResult]:
+    """Process many Eiger datasets with one shared pool of Dozor workers.
+
+    Jobs are read from `jobs` as they arrive and planned into chunk aligned
+    tasks, and tasks of every job are scheduled onto the same worker
+    processes. Jobs sharing a config and mask form a config group, whose
+    engine is built and mask sent once per worker, then reused by every later
+    job of the group. Higher priority jobs are dispatched first, and among
+    jobs of equal priority the one with the fewest frames left, so small
+    datasets submitted behind a large one do not wait for it to finish.
+
+    Each job writes a single `dozor_res.<h5|npz|txt>` file under its
+    `output_dir`, merged from the partial files of the workers which
+    processed it once all its tasks are done.
+
+    Parameters
+    ----------
+    jobs : Iterable[DatasetJob] | Any
+        Jobs to process, either an iterable, or a queue with a `get` method
+        from which jobs are taken until it returns None.
+    nproc : int | None, optional
+        Number of worker processes, if undefined the CPU count is used,
+        by default None.
+    cut_off : float, optional
+        Minimum `score3` of a hit, by default 5.
+    in_flight : int, optional
+        Number of tasks queued or being processed per worker, by default 2.
+    min_task_frames : int, optional
+        Minimum number of frames per task, consecutive chunks are merged until
+        reached, by default 1.
+    output_format : ResultFormat, optional
+        Result file format, by default "hdf5".
+    engines : int, optional
+        Number of engines each worker keeps warm, one per config,
+        by default 8.
+
+    Yields
+    ------
+    JobResult
+        Result of each job, in completion order, with the number of frames
+        and hits, the merged result file, and the time since the job was
+        planned. Jobs which fail have an error and no result file.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if a worker fails or dies, or taking jobs from `jobs` fails.
+    """
+    nproc = nproc or cpu_count() or 1
+    _context = get_context()
+    _done = _context.SimpleQueue()
+    _queues = [_context.SimpleQueue() for _ in range(nproc)]
+    _workers: list[BaseProcess] = [
+        _context.Process(
+            target=_worker,
+            args=(_index, cut_off, engines, _queues[_index], _done),
+        )
+        for _index in range(nproc)
+    ]
+    for _worker_process in _workers:
+        _worker_process.start()
+    # Planning reads master files, so runs alongside the scheduler
+    _feeder = Thread(target=_feed, args=(jobs, min_task_frames, _done), daemon=True)
+    _feeder.start()
+
+    _scheduler = _Scheduler(_queues, in_flight, output_format)
+    _feeding = True
+    try:
+        while _feeding or len(_scheduler):
+            _kind, _work_num, _job, _payload = get_result(_done, _workers)
+            if _kind == "error":
+                _source = "job feed" if _work_num is None else f"worker {_work_num}"
+                raise RuntimeError("Error while running %s\n%s" % (_source, _payload))
+            if _kind == "job":
+                _scheduler.add(_job, _payload)
+            elif _kind == "end":
+                _feeding = False
+            else:
+                _scheduler.update(_kind, _work_num, _job, _payload)
+            _scheduler.dispatch()
+            yield from _scheduler.finished()
+    finally:
+        for _queue in _queues:
+            _queue.put(None)
+        for _worker_process in _workers:
+            _worker_process.join()
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Hashable, Literal, Self
+
+from numpy import (
+    ascontiguousarray as np_ascontiguousarray,
+    bool_,
+    copyto as np_copyto,
+    count_nonzero as np_count_nonzero,
+    flatnonzero as np_flatnonzero,
+    int32,
+    int64,
+    less as np_less,
+    not_equal as np_not_equal,
+    packbits as np_packbits,
+    uint8,
+    unpackbits as np_unpackbits,
+    zeros as np_zeros,
+)
+
+if TYPE_CHECKING:
+    from numpy import integer
+    from numpy.typing import NDArray
+
+__all__ = ("PixelMask",)
+
+# Pixels unpacked per block when applying a bit packed mask, multiple of 8
+_BLOCK_SIZE = 1 << 16
+
+# Maximum number of masks kept by the content hash cache
+_CACHE_SIZE = 8
+
+_cache: OrderedDict[Hashable, PixelMask] = OrderedDict()
+_cache_lock = Lock()
+
+
+class PixelMask:
+    """Precompiled Pixel Mask
+
+    Bad pixels are stored in a compact form chosen by mask density, either as
+    flat pixel indices or as packed bits, so applying the mask to a frame is a
+    single scatter and never a scan of the full mask.
+
+    Parameters
+    ----------
+    bad : NDArray[bool_]
+        Boolean array, `True` for bad pixels.
+    """
+
+    __slots__ = ("_shape", "_size", "_count", "_indices", "_bits")
+
+    def __init__(self: Self, bad: NDArray[bool_]) -> None:
+        bad = np_ascontiguousarray(bad, dtype=bool_)
+        self._shape: tuple[int, ...] = bad.shape
+        self._size = bad.size
+        self._count = int(np_count_nonzero(bad))
+        self._indices: NDArray[integer[Any]] | None = None
+        self._bits: NDArray[uint8] | None = None
+
+        _index_dtype = int32 if self._size < 2**31 else int64
+        # Flat indices cost one index per bad pixel, packed bits one bit per pixel
+        if self._count * _index_dtype().itemsize * 8 <= self._size:
+            self._indices = np_flatnonzero(bad).astype(_index_dtype)
+        else:
+            self._bits = np_packbits(bad.reshape(-1))
+
+    @classmethod
+    def _from_compact(
+        cls: type[Self],
+        shape: tuple[int, ...],
+        count: int,
+        kind: Literal["indices", "bits"],
+        data: NDArray[Any],
+    ) -> Self:
+        """Rebuild mask from its compact representation, without copying."""
+        _mask = cls.__new__(cls)
+        _mask._shape = tuple(shape)
+        _mask._size = 1
+        for _dim in _mask._shape:
+            _mask._size *= _dim
+        _mask._count = count
+        _mask._indices = data if kind == "indices" else None
+        _mask._bits = data if kind == "bits" else None
+        return _mask
+
+    def _compact(self: Self) -> tuple[Literal["indices", "bits"], NDArray[Any]]:
+        """Get compact representation of mask, as kind and data array."""
+        if self._bits is not None:
+            return "bits", self._bits
+        return "indices", self._indices
+
+    @classmethod
+    def from_array(
+        cls: type[Self],
+        mask: NDArray[Any],
+        *,
+        bad: Literal["nonzero", "negative"] = "nonzero",
+    ) -> Self:
+        """Create pixel mask from a mask array.
+
+        Masks are cached by content hash, so passing the same detector mask
+        again returns the existing compiled mask.
+
+        Parameters
+        ----------
+        mask : NDArray[Any]
+            Mask array.
+        bad : Literal["nonzero", "negative"], optional
+            Which pixels are bad, "nonzero" matches the Eiger `pixel_mask`
+            convention, "negative" the `call_dozor` convention,
+            by default "nonzero".
+
+        Returns
+        -------
+        Self
+            Compiled pixel mask.
+        """
+        mask = np_ascontiguousarray(mask)
+        _key = (
+            cls,
+            bad,
+            mask.shape,
+            mask.dtype.str,
+            blake2b(mask.data, digest_size=16).digest(),
+        )
+        with _cache_lock:
+            _mask = _cache.get(_key)
+            if _mask is not None:
+                _cache.move_to_end(_key)
+                return _mask
+
+        if bad == "nonzero":
+            _mask = cls(np_not_equal(mask, 0))
+        elif bad == "negative":
+            _mask = cls(np_less(mask, 0))
+        else:
+            raise ValueError(f"Unknown bad pixel convention `{bad}`.")
+
+        with _cache_lock:
+            _cache[_key] = _mask
+            while len(_cache) > _CACHE_SIZE:
+                _cache.popitem(last=False)
+        return _mask
+
+    @classmethod
+    def from_eiger(cls: type[Self], pixel_mask: NDArray[Any]) -> Self:
+        """Create pixel mask from an Eiger `pixel_mask`.
+
+        Parameters
+        ----------
+        pixel_mask : NDArray[Any]
+            Eiger pixel mask, nonzero pixels are bad.
+
+        Returns
+        -------
+        Self
+            Compiled pixel mask.
+        """
+        return cls.from_array(pixel_mask, bad="nonzero")
+
+    @property
+    def shape(self: Self) -> tuple[int, ...]:
+        """Mask shape.
+
+        Returns
+        -------
+        tuple[int, ...]
+            Shape of frames the mask applies to.
+        """
+        return self._shape
+
+    @property
+    def count(self: Self) -> int:
+        """Number of bad pixels.
+
+        Returns
+        -------
+        int
+            Number of bad pixels.
+        """
+        return self._count
+
+    @property
+    def packed(self: Self) -> bool:
+        """Packed bits representation.
+
+        Returns
+        -------
+        bool
+            Whether bad pixels are stored as packed bits, rather than indices.
+        """
+        return self._bits is not None
+
+    def to_bool(self: Self) -> NDArray[bool_]:
+        """Expand mask to a boolean array.
+
+        Returns
+        -------
+        NDArray[bool_]
+            Boolean array, `True` for bad pixels.
+        """
+        if self._bits is not None:
+            return (
+                np_unpackbits(self._bits, count=self._size)
+                .view(bool_)
+                .reshape(self._shape)
+            )
+        _bad = np_zeros(self._size, dtype=bool_)
+        _bad[self._indices] = True
+        return _bad.reshape(self._shape)
+
+    def apply(self: Self, frame: NDArray[Any], value: int = 65535) -> NDArray[Any]:
+        """Set bad pixels of frame, in place.
+
+        Parameters
+        ----------
+        frame : NDArray[Any]
+            C-contiguous frame to mask.
+        value : int, optional
+            Value to set bad pixels to, by default 65535.
+
+        Returns
+        -------
+        NDArray[Any]
+            Masked frame.
+
+        Raises
+        ------
+        ValueError
+            Raised if frame size does not match the mask, or frame is not
+            C-contiguous.
+        """
+        if frame.size != self._size:
+            raise ValueError(
+                f"Frame has {frame.size} pixels, mask expects {self._size}."
+            )
+        if not frame.flags.c_contiguous:
+            raise ValueError("Frame must be C-contiguous.")
+        if not self._count:
+            return frame
+
+        _flat = frame.reshape(-1)
+        if self._bits is None:
+            _flat[self._indices] = value
+            return frame
+
+        for _start in range(0, self._size, _BLOCK_SIZE):
+            _stop = min(_start + _BLOCK_SIZE, self._size)
+            _bad = np_unpackbits(
+                self._bits[slice(_start // 8, (_stop + 7) // 8)],
+                count=_stop - _start,
+            ).view(bool_)
+            np_copyto(_flat[_start:_stop], value, where=_bad)
+        return frame
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Callable
+from os import replace as os_replace
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Self
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+__all__ = (
+    "Metrics",
+    "MetricsExporter",
+    "active",
+    "enable",
+    "disable",
+)
+
+# Upper bounds of latency histogram buckets, in seconds, as exact literals
+_BUCKETS: tuple[float, ...] = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Histogram `le` label values, the shortest repr of each bound, as Prometheus
+# clients format them
+_BUCKET_LABELS: tuple[str, ...] = (*map(repr, _BUCKETS), "+Inf")
+
+# Stage counting processed frames, for frames per second
+_FRAME_STAGE = "native"
+
+# Metrics recorded by instrumentation hooks, None when disabled
+_active: Metrics | None = None
+
+
+class _Stage:
+    """Per-Stage Latency Histogram And Counters"""
+
+    __slots__ = ("buckets", "count", "sum", "frames", "bytes")
+
+    def __init__(self: Self) -> None:
+        self.buckets = [0] * (len(_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.frames = 0
+        self.bytes = 0
+
+
+class Metrics:
+    """Processing Stage Metrics
+
+    Records latency histograms, processed frames and bytes for each stage,
+    e.g. `decode`, `convert`, `mask`, `native` and `marshal`. Recording is
+    thread-safe. Instrumentation hooks only record into the active metrics,
+    see `enable`, and cost a `None` check per stage while disabled.
+    """
+
+    def __init__(self: Self) -> None:
+        self._lock = Lock()
+        self._stages: dict[str, _Stage] = {}
+        self._start = monotonic()
+
+    def observe(
+        self: Self,
+        stage: str,
+        seconds: float,
+        *,
+        frames: int = 0,
+        nbytes: int = 0,
+    ) -> None:
+        """Record a stage latency.
+
+        Parameters
+        ----------
+        stage : str
+            Stage name.
+        seconds : float
+            Time spent in stage.
+        frames : int, optional
+            Number of frames processed, by default 0.
+        nbytes : int, optional
+            Number of bytes processed, by default 0.
+        """
+        _bucket = bisect_left(_BUCKETS, seconds)
+        with self._lock:
+            _stage = self._stages.get(stage)
+            if _stage is None:
+                _stage = self._stages[stage] = _Stage()
+            _stage.buckets[_bucket] += 1
+            _stage.count += 1
+            _stage.sum += seconds
+            _stage.frames += frames
+            _stage.bytes += nbytes
+
+    def snapshot(self: Self) -> dict[str, dict[str, Any]]:
+        """Get a picklable copy of recorded metrics.
+
+        Returns
+        -------
+        dict[str, dict[str, Any]]
+            Recorded values of each stage.
+        """
+        with self._lock:
+            return {
+                _name: {
+                    "buckets": list(_stage.buckets),
+                    "count": _stage.count,
+                    "sum": _stage.sum,
+                    "frames": _stage.frames,
+                    "bytes": _stage.bytes,
+                }
+                for _name, _stage in self._stages.items()
+            }
+
+    def merge(self: Self, snapshot: dict[str, dict[str, Any]]) -> None:
+        """Add metrics recorded elsewhere, e.g. by a worker process.
+
+        Parameters
+        ----------
+        snapshot : dict[str, dict[str, Any]]
+            Snapshot returned by `snapshot`.
+        """
+        with self._lock:
+            for _name, _values in snapshot.items():
+                _stage = self._stages.get(_name)
+                if _stage is None:
+                    _stage = self._stages[_name] = _Stage()
+                for _index, _count in enumerate(_values["buckets"]):
+                    _stage.buckets[_index] += _count
+                _stage.count += _values["count"]
+                _stage.sum += _values["sum"]
+                _stage.frames += _values["frames"]
+                _stage.bytes += _values["bytes"]
+
+    def frames_per_second(self: Self) -> float:
+        """Frames processed per second, since the metrics were created.
+
+        Returns
+        -------
+        float
+            Frames processed by the native Dozor call, per second.
+        """
+        with self._lock:
+            _stage = self._stages.get(_FRAME_STAGE)
+            _frames = _stage.frames if _stage is not None else 0
+        return _frames / max(monotonic() - self._start, 1e-9)
+
+    def to_prometheus(self: Self, prefix: str = "pydozor") -> str:
+        """Format metrics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Metric name prefix, by default "pydozor".
+
+        Returns
+        -------
+        str
+            Metrics, as Prometheus text.
+        """
+        _snapshot = self.snapshot()
+        _lines = [
+            "# HELP %s_stage_seconds Time spent in each processing stage." % prefix,
+            "# TYPE %s_stage_seconds histogram" % prefix,
+        ]
+        for _name, _values in sorted(_snapshot.items()):
+            _cumulative = 0
+            for _bound, _count in zip(_BUCKET_LABELS, _values["buckets"], strict=True):
+                _cumulative += _count
+                _lines.append(
+                    '%s_stage_seconds_bucket{stage="%s",le="%s"} %d'
+                    % (prefix, _name, _bound, _cumulative)
+                )
+            _lines.append(
+                '%s_stage_seconds_sum{stage="%s"} %r' % (prefix, _name, _values["sum"])
+            )
+            _lines.append(
+                '%s_stage_seconds_count{stage="%s"} %d'
+                % (prefix, _name, _values["count"])
+            )
+        for _metric, _key, _help in (
+            ("frames_total", "frames", "Frames processed by each stage."),
+            ("bytes_total", "bytes", "Bytes processed by each stage."),
+        ):
+            _lines.append("# HELP %s_%s %s" % (prefix, _metric, _help))
+            _lines.append("# TYPE %s_%s counter" % (prefix, _metric))
+            for _name, _values in sorted(_snapshot.items()):
+                _lines.append(
+                    '%s_%s{stage="%s"} %d' % (prefix, _metric, _name, _values[_key])
+                )
+        _lines.append(
+            "# HELP %s_frames_per_second Frames processed per second." % prefix
+        )
+        _lines.append("# TYPE %s_frames_per_second gauge" % prefix)
+        _lines.append("%s_frames_per_second %r" % (prefix, self.frames_per_second()))
+        return "\n".join(_lines) + "\n"
+
+    def export(self: Self, target: Path | str | Callable[[str], Any]) -> None:
+        """Export metrics as Prometheus text.
+
+        Parameters
+        ----------
+        target : Path | str | Callable[[str], Any]
+            File to write, replaced atomically, e.g. for the node exporter
+            textfile collector, or callback called with the text.
+        """
+        _text = self.to_prometheus()
+        if callable(target):
+            target(_text)
+            return
+        _path = Path(target)
+        _temp = _path.with_name(_path.name + ".tmp")
+        _temp.write_text(_text)
+        os_replace(_temp, _path)
+
+
+class MetricsExporter:
+    """Periodic Metrics Exporter
+
+    Exports metrics as Prometheus text from a background thread, and once
+    more when stopped.
+
+    Parameters
+    ----------
+    metrics : Metrics
+        Metrics to export.
+    target : Path | str | Callable[[str], Any]
+        File to write, or callback called with the text.
+    interval : float, optional
+        Time between exports, in seconds, by default 15.
+    """
+
+    def __init__(
+        self: Self,
+        metrics: Metrics,
+        target: Path | str | Callable[[str], Any],
+        interval: float = 15,
+    ) -> None:
+        self._metrics = metrics
+        self._target = target
+        self._interval = interval
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _run(self: Self) -> None:
+        """Export metrics every interval until stopped."""
+        while not self._stop.wait(self._interval):
+            self._metrics.export(self._target)
+
+    def close(self: Self) -> None:
+        """Stop exporting, after a final export."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self._metrics.export(self._target)
+
+
+def active() -> Metrics | None:
+    """Get the metrics recorded by instrumentation hooks.
+
+    Returns
+    -------
+    Metrics | None
+        Active metrics, or None while instrumentation is disabled.
+    """
+    return _active
+
+
+def enable(metrics: Metrics | None = None) -> Metrics:
+    """Enable instrumentation hooks of this process.
+
+    Parameters
+    ----------
+    metrics : Metrics | None, optional
+        Metrics to record into, if undefined new metrics are created,
+        by default None.
+
+    Returns
+    -------
+    Metrics
+        Active metrics.
+    """
+    global _active
+    _active = metrics if metrics is not None else Metrics()
+    return _active
+
+
+def disable() -> None:
+    """Disable instrumentation hooks of this process."""
+    global _active
+    _active = None
@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from json import dump as json_dump, load as json_load
+from multiprocessing import get_context
+from os import remove as os_remove, replace as os_replace
+from os.path import exists as os_exists, join as os_joinpath, realpath as os_realpath
+from pathlib import Path
+from time import monotonic, perf_counter
+from traceback import format_exc
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from ._workers import get_result
+from .dozor import Dozor
+from .mask import PixelMask
+from .metrics import Metrics, disable as metrics_disable, enable as metrics_enable
+from .prefilter import BlankFilter, PrefilteredDozor
+from .reader import EigerReader
+from .results import ResultFormat, ResultWriter, merge_results
+from .wrapper import _convert_to_uint16
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+
+    from numpy.typing import NDArray
+
+__all__ = ("OfflineSummary", "run_offline")
+
+_RESULT_SUFFIXES: dict[str, str] = {"hdf5": ".h5", "npz": ".npz", "text": ".txt"}
+
+_CHECKPOINT_FILE = "dozor_res.checkpoint.json"
+
+# Per task counts reported by workers, and totalled in the checkpoint
+_COUNTS = ("hits", "skipped", "audited", "missed")
+
+
+class OfflineSummary(NamedTuple):
+    """Offline Processing Run Summary"""
+
+    frames: int
+    hits: int
+    skipped: int = 0
+    audited: int = 0
+    missed: int = 0
+
+
+def _fetch(
+    reader: EigerReader, tasks: Any
+) -> tuple[tuple[int, int] | None, NDArray[Any] | None]:
+    """Take the next task from the shared task queue, and read its frames."""
+    _task = tasks.get()
+    if _task is None:
+        return None, None
+    return _task, reader.read(*_task)
+
+
+def _worker(
+    work_num: int,
+    master_file: str,
+    config_file: str,
+    mask: PixelMask | None,
+    output_file: str,
+    cut_off: float,
+    tasks: Any,
+    done: Any,
+    collect_metrics: bool,
+    prefilter: BlankFilter | None,
+) -> None:
+    """Offline worker, processes frame ranges pulled from the shared task queue."""
+    _reader: EigerReader | None = None
+    # Frames of the next task are read and decompressed while Dozor processes
+    # the current task
+    _prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    # Forked workers inherit the active metrics of the parent process
+    _metrics = metrics_enable() if collect_metrics else metrics_disable()
+    try:
+        _engine = Dozor(Path(config_file), reuse_buffers=True)
+        _prefiltered = (
+            None if prefilter is None else PrefilteredDozor(_engine, prefilter)
+        )
+        _reader = EigerReader(master_file, workers=1)
+        with ResultWriter(output_file, format="raw") as _output:
+            _next = _prefetch.submit(_fetch, _reader, tasks)
+            while True:
+                _task, _frames = _next.result()
+                if _task is None or _frames is None:
+                    break
+                _next = _prefetch.submit(_fetch, _reader, tasks)
+                _first, _last = _task
+                _skipped: list[int] = []
+                _converted = _convert_to_uint16(
+                    _frames, _engine.pixel_max, inplace=True
+                )
+                if _prefiltered is None:
+                    _results = _engine.do_images(_converted, mask=mask)
+                else:
+                    _before = _prefiltered.blank_filter.stats
+                    _results = _prefiltered.do_images(
+                        _converted, mask=mask, skipped=_skipped
+                    )
+                if _metrics is not None:
+                    _start = perf_counter()
+                _output.write(_first, _results, _skipped)
+                # Results must be on disk before the task is reported done
+                _output.flush()
+                if _metrics is not None:
+                    _metrics.observe(
+                        "write", perf_counter() - _start, frames=len(_results)
+                    )
+                _reader.release(_frames)
+                _counts = [int((_results["score3"] > cut_off).sum()), 0, 0, 0]
+                if _prefiltered is not None:
+                    _counts[1:] = (_prefiltered.blank_filter.stats - _before)[1:]
+                done.put((work_num, _task, _counts))
+        if _metrics is not None:
+            done.put((work_num, "metrics", _metrics.snapshot()))
+    except Exception:
+        done.put((work_num, None, format_exc()))
+    finally:
+        # A pending fetch returns once the scheduler stops the worker
+        _prefetch.shutdown(wait=True)
+        if _reader is not None:
+            _reader.close()
+
+
+def _load_checkpoint(path: str, plan: dict[str, Any]) -> dict[str, Any] | None:
+    """Load checkpoint of an earlier run, if it exists.
+
+    Raises
+    ------
+    ValueError
+        Raised if the checkpoint was written by a run with a different plan.
+    """
+    if not os_exists(path):
+        return None
+    with open(path) as _file:
+        _state = json_load(_file)
+    if _state["plan"] != plan:
+        raise ValueError(
+            f"Checkpoint `{path}` belongs to a different run, "
+            "remove it or run without resuming."
+        )
+    return _state
+
+
+def _save_checkpoint(path: str, state: dict[str, Any]) -> None:
+    """Save checkpoint atomically, never leaving a partially written file."""
+    with open(path + ".tmp", "w") as _file:
+        json_dump(state, _file)
+    os_replace(path + ".tmp", path)
+
+
+def _summary(frames: int, state: dict[str, Any]) -> OfflineSummary:
+    """Summarize a run from its checkpoint state."""
+    return OfflineSummary(frames, *(state[_key] for _key in _COUNTS))
+
+
+def _collect_metrics(
+    workers: list[BaseProcess], tasks: Any, done: Any, metrics: Metrics
+) -> None:
+    """Stop workers, adding the metrics each reports once stopped.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if a worker fails or dies.
+    """
+    for _ in workers:
+        tasks.put(None)
+    for _ in workers:
+        _work_num, _kind, _result = get_result(done, workers)
+        if _kind is None:
+            raise RuntimeError(
+                "Error while running worker %d\n%s" % (_work_num, _result)
+            )
+        metrics.merge(_result)
+
+
+def run_offline(
+    master_file: Path | str,
+    config_file: Path | str,
+    output_dir: Path | str,
+    *,
+    start: int = 1,
+    end: int | None = None,
+    nproc: int = 1,
+    mask: PixelMask | None = None,
+    cut_off: float = 5,
+    in_flight: int | None = None,
+    min_task_frames: int = 1,
+    output_format: ResultFormat = "hdf5",
+    resume: bool = False,
+    checkpoint_interval: float = 30,
+    metrics: Metrics | None = None,
+    prefilter: BlankFilter | None = None,
+) -> OfflineSummary:
+    """Process an Eiger dataset with a pool of Dozor worker processes.
+
+    The frame range is split into chunk aligned tasks, which are handed out
+    from a shared queue as workers become idle, with a fixed number of tasks
+    in flight. Slow frames therefore delay only the worker processing them,
+    and the run finishes when the total work is done. Each worker appends
+    its results to a partial file, which are merged into a single
+    `dozor_res.<h5|npz|txt>` file under `output_dir` once all tasks are done.
+
+    Completed tasks and partial files are recorded in a checkpoint under
+    `output_dir`, saved periodically and whenever the run stops. A resumed
+    run only processes tasks missing from the checkpoint, and merges the
+    partial files of every earlier attempt with its own.
+
+    Parameters
+    ----------
+    master_file : Path | str
+        Eiger master file.
+    config_file : Path | str
+        Dozor config file.
+    output_dir : Path | str
+        Output directory.
+    start : int, optional
+        First frame number, by default 1.
+    end : int | None, optional
+        Last frame number, inclusive, if undefined or negative the last frame
+        of the dataset, by default None.
+    nproc : int, optional
+        Number of worker processes, by default 1.
+    mask : PixelMask | None, optional
+        Pixel mask, by default None.
+    cut_off : float, optional
+        Minimum `score3` of a hit, by default 5.
+    in_flight : int | None, optional
+        Number of tasks queued or being processed at any time, if undefined
+        twice the number of workers, by default None.
+    min_task_frames : int, optional
+        Minimum number of frames per task, consecutive chunks are merged until
+        reached, by default 1.
+    output_format : ResultFormat, optional
+        Result file format, by default "hdf5".
+    resume : bool, optional
+        Whether to continue from the checkpoint of an interrupted run with the
+        same dataset and frame range, if there is one, by default False.
+    checkpoint_interval : float, optional
+        Minimum time between checkpoints, in seconds, by default 30.
+    metrics : Metrics | None, optional
+        Metrics to add the stage timings of every worker to, once the run
+        completes, if undefined workers are not instrumented, by default None.
+    prefilter : BlankFilter | None, optional
+        Blank frame prefilter, frames it finds blank are not processed, and
+        get all zero results flagged as `skipped`, except in text results,
+        by default None.
+
+    Returns
+    -------
+    OfflineSummary
+        Number of frames processed, number of hits, and prefilter counts of
+        skipped frames, audited frames, and audited frames which were hits.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if a worker fails or dies, the checkpoint then allows resuming.
+    ValueError
+        Raised if resuming from a checkpoint of a different run.
+    """
+    with EigerReader(master_file, workers=1) as _reader:
+        _tasks = _reader.chunks(start, end, min_frames=min_task_frames)
+    _frames = sum(_last - _first + 1 for _first, _last in _tasks)
+    _output = os_joinpath(output_dir, "dozor_res" + _RESULT_SUFFIXES[output_format])
+
+    _checkpoint = os_joinpath(output_dir, _CHECKPOINT_FILE)
+    _plan = {
+        "master_file": os_realpath(master_file),
+        "tasks": [list(_task) for _task in _tasks],
+    }
+    _state = _load_checkpoint(_checkpoint, _plan) if resume else None
+    if _state is not None and "merged" in _state:
+        # Earlier run completed, reprocess only if its output is gone
+        if _state["merged"] == _output and os_exists(_output):
+            return _summary(_frames, _state)
+        _state = None
+    if _state is None:
+        if os_exists(_checkpoint):
+            # Fresh run, discard partial files of the earlier run
+            with open(_checkpoint) as _file:
+                for _part in json_load(_file)["parts"]:
+                    if os_exists(_part):
+                        os_remove(_part)
+        _state = {"plan": _plan, "runs": 0, "parts": [], "done": []}
+        _state.update(dict.fromkeys(_COUNTS, 0))
+
+    _done = {tuple(_task) for _task in _state["done"]}
+    _tasks = [_task for _task in _tasks if _task not in _done]
+    nproc = max(1, min(nproc, len(_tasks)))
+    in_flight = in_flight or 2 * nproc
+
+    _parts = [
+        os_joinpath(output_dir, "dozor_res_%d_%d.rec" % (_state["runs"], _index))
+        for _index in range(nproc)
+    ]
+    _state["runs"] += 1
+    _state["parts"].extend(_parts)
+    _save_checkpoint(_checkpoint, _state)
+
+    _context = get_context()
+    _task_queue = _context.SimpleQueue()
+    _done_queue = _context.SimpleQueue()
+    _workers: list[BaseProcess] = [
+        _context.Process(
+            target=_worker,
+            args=(
+                _index,
+                str(master_file),
+                str(config_file),
+                mask,
+                _parts[_index],
+                cut_off,
+                _task_queue,
+                _done_queue,
+                metrics is not None,
+                prefilter,
+            ),
+        )
+        for _index in range(nproc)
+    ]
+    for _worker_process in _workers:
+        _worker_process.start()
+
+    _pending = iter(_tasks)
+    _queued = 0
+    _saved = monotonic()
+    try:
+        for _task in _pending:
+            _task_queue.put(_task)
+            _queued += 1
+            if _queued >= in_flight:
+                break
+        while _queued:
+            _work_num, _task, _result = get_result(_done_queue, _workers)
+            if _task is None:
+                raise RuntimeError(
+                    "Error while running worker %d\n%s" % (_work_num, _result)
+                )
+            _queued -= 1
+            _state["done"].append(list(_task))
+            for _key, _count in zip(_COUNTS, _result, strict=True):
+                _state[_key] += _count
+            if monotonic() - _saved >= checkpoint_interval:
+                _save_checkpoint(_checkpoint, _state)
+                _saved = monotonic()
+            _next = next(_pending, None)
+            if _next is not None:
+                _task_queue.put(_next)
+                _queued += 1
+        if metrics is not None:
+            _collect_metrics(_workers, _task_queue, _done_queue, metrics)
+    finally:
+        for _worker_process in _workers:
+            if _worker_process.is_alive():
+                _task_queue.put(None)
+        for _worker_process in _workers:
+            _worker_process.join()
+        _save_checkpoint(_checkpoint, _state)
+
+    # Frames of a task finished but not checkpointed may have been run twice
+    merge_results(
+        [_part for _part in _state["parts"] if os_exists(_part)],
+        _output,
+        format=output_format,
+        remove=True,
+        unique=True,
+    )
+    _state["parts"] = []
+    _state["merged"] = _output
+    _save_checkpoint(_checkpoint, _state)
+    return _summary(_frames, _state)
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from os import cpu_count
+from pathlib import Path
+from threading import local
+from typing import TYPE_CHECKING, Self
+
+from numpy import array_split as np_array_split, concatenate as np_concatenate
+
+from .dozor import Dozor
+from .mask import PixelMask
+from .wrapper import _convert_to_uint16
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from numpy import uint16, void
+    from numpy.typing import NDArray
+
+    from .schemas import DatacolSchema, DataSchema
+
+__all__ = ("DozorThreadPool",)
+
+
+class DozorThreadPool:
+    """Thread Pool Of Dozor Engines
+
+    Every worker thread owns its own Dozor engine, cloned from a prototype
+    built once from the config, as engines carry mutable per-instance state
+    and cannot be shared between threads. cffi releases the GIL during native
+    Dozor calls, so frames are processed concurrently, and frame buffers are
+    passed to workers without copying.
+
+    Parameters
+    ----------
+    config_file : Path
+        Dozor config file.
+    max_workers : int | None, optional
+        Number of worker threads, if undefined the CPU count is used,
+        by default None.
+    mask : PixelMask | None, optional
+        Pixel mask, applied to each frame in place before processing,
+        by default None.
+    max_in_flight : int | None, optional
+        Maximum number of frames submitted but not yet returned by `map` and
+        `imap`, if undefined twice the number of workers, by default None.
+    convert : bool, optional
+        Whether workers saturate frames to uint16 in place before processing,
+        so frames of any integer DType can be submitted, by default False.
+    """
+
+    def __init__(
+        self: Self,
+        config_file: Path,
+        max_workers: int | None = None,
+        *,
+        mask: PixelMask | None = None,
+        max_in_flight: int | None = None,
+        convert: bool = False,
+    ) -> None:
+        self._config_file = Path(config_file)
+        self._convert = convert
+        self._mask = mask
+        self._max_workers = max_workers or cpu_count() or 1
+        self._max_in_flight = max_in_flight or 2 * self._max_workers
+        # Never processes frames, workers clone its initialized state
+        self._prototype = Dozor(self._config_file)
+        self._local = local()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers,
+            thread_name_prefix="dozor",
+            initializer=self._init_worker,
+        )
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def max_workers(self: Self) -> int:
+        """Number of worker threads.
+
+        Returns
+        -------
+        int
+            Number of worker threads.
+        """
+        return self._max_workers
+
+    def _init_worker(self: Self) -> None:
+        """Create Dozor engine for worker thread."""
+        self._local.engine = self._prototype.clone(reuse_buffers=True)
+
+    def _do_image(
+        self: Self,
+        image: NDArray[uint16],
+        fields: tuple[str, ...] | None,
+    ) -> tuple[DatacolSchema, DataSchema]:
+        """Process frame with the engine of the current worker thread."""
+        _engine: Dozor = self._local.engine
+        if self._convert:
+            image = _convert_to_uint16(image, _engine.pixel_max, inplace=True)
+        return _engine.do_image(image, mask=self._mask, fields=fields)
+
+    def _do_images(
+        self: Self,
+        stack: NDArray[uint16],
+        fields: list[str] | None,
+    ) -> NDArray[void]:
+        """Process frames with the engine of the current worker thread."""
+        _engine: Dozor = self._local.engine
+        if self._convert:
+            stack = _convert_to_uint16(stack, _engine.pixel_max, inplace=True)
+        return _engine.do_images(stack, mask=self._mask, fields=fields)
+
+    def submit(
+        self: Self,
+        image: NDArray[uint16],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> Future[tuple[DatacolSchema, DataSchema]]:
+        """Submit frame for processing.
+
+        Parameters
+        ----------
+        image : NDArray[uint16]
+            Frame to process, must not be modified until processed.
+        fields : Iterable[str] | None, optional
+            Names of output fields to decode, if undefined all fields are
+            decoded, by default None.
+
+        Returns
+        -------
+        Future[tuple[DatacolSchema, DataSchema]]
+            Future resolving to decoded output from `dozor_do_image`.
+        """
+        return self._executor.submit(
+            self._do_image,
+            image,
+            tuple(fields) if fields is not None else None,
+        )
+
+    def _submit_all(
+        self: Self,
+        images: Iterable[NDArray[uint16]],
+        fields: Iterable[str] | None,
+    ) -> Iterator[tuple[int, Future[tuple[DatacolSchema, DataSchema]]]]:
+        """Lazily submit frames, yielding index and future of each."""
+        _fields = tuple(fields) if fields is not None else None
+        for _index, _image in enumerate(images):
+            yield _index, self._executor.submit(self._do_image, _image, _fields)
+
+    def map(
+        self: Self,
+        images: Iterable[NDArray[uint16]],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> Iterator[tuple[DatacolSchema, DataSchema]]:
+        """Process frames, yielding results in input order.
+
+        Parameters
+        ----------
+        images : Iterable[NDArray[uint16]]
+            Frames to process, consumed lazily as results are yielded.
+        fields : Iterable[str] | None, optional
+            Names of output fields to decode, if undefined all fields are
+            decoded, by default None.
+
+        Yields
+        ------
+        tuple[DatacolSchema, DataSchema]
+            Decoded output from `dozor_do_image`, for each frame.
+        """
+        _pending: deque[Future[tuple[DatacolSchema, DataSchema]]] = deque()
+        try:
+            for _, _future in self._submit_all(images, fields):
+                _pending.append(_future)
+                if len(_pending) >= self._max_in_flight:
+                    yield _pending.popleft().result()
+            while _pending:
+                yield _pending.popleft().result()
+        finally:
+            for _future in _pending:
+                _future.cancel()
+
+    def imap(
+        self: Self,
+        images: Iterable[NDArray[uint16]],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> Iterator[tuple[int, tuple[DatacolSchema, DataSchema]]]:
+        """Process frames, yielding results as soon as they complete.
+
+        Parameters
+        ----------
+        images : Iterable[NDArray[uint16]]
+            Frames to process, consumed lazily as results are yielded.
+        fields : Iterable[str] | None, optional
+            Names of output fields to decode, if undefined all fields are
+            decoded, by default None.
+
+        Yields
+        ------
+        tuple[int, tuple[DatacolSchema, DataSchema]]
+            Index of frame in `images`, and decoded output from
+            `dozor_do_image`, in completion order.
+        """
+        _pending: dict[Future[tuple[DatacolSchema, DataSchema]], int] = {}
+        try:
+            for _index, _future in self._submit_all(images, fields):
+                _pending[_future] = _index
+                if len(_pending) >= self._max_in_flight:
+                    _done, _ = wait(_pending, return_when=FIRST_COMPLETED)
+                    for _future in _done:
+                        yield _pending.pop(_future), _future.result()
+            while _pending:
+                _done, _ = wait(_pending, return_when=FIRST_COMPLETED)
+                for _future in _done:
+                    yield _pending.pop(_future), _future.result()
+        finally:
+            for _future in _pending:
+                _future.cancel()
+
+    def do_images(
+        self: Self,
+        stack: NDArray[uint16],
+        *,
+        fields: Iterable[str] | None = None,
+    ) -> NDArray[void]:
+        """Process a stack of frames, split evenly across worker threads.
+
+        Parameters
+        ----------
+        stack : NDArray[uint16]
+            Frames to process, as an `(N, ny, nx)` array.
+        fields : Iterable[str] | None, optional
+            Names of `DatacolPickle` fields to include in results, if undefined
+            all fields are included, by default None.
+
+        Returns
+        -------
+        NDArray[void]
+            Structured array of `DatacolPickle` records, one per frame.
+        """
+        _fields = list(fields) if fields is not None else None
+        _futures = [
+            self._executor.submit(self._do_images, _chunk, _fields)
+            for _chunk in np_array_split(
+                stack, max(1, min(self._max_workers, len(stack)))
+            )
+        ]
+        return np_concatenate([_future.result() for _future in _futures])
+
+    def close(self: Self, wait: bool = True) -> None:
+        """Shut down worker threads.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for pending frames to finish, by default True.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
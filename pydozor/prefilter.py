@@ -0,0 +1,492 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Literal, NamedTuple, Self
+
+from numpy import (
+    add as np_add,
+    arange as np_arange,
+    bool_,
+    copyto as np_copyto,
+    count_nonzero as np_count_nonzero,
+    empty as np_empty,
+    float32,
+    float64,
+    greater as np_greater,
+    inf,
+    logical_not as np_logical_not,
+    multiply as np_multiply,
+    ones as np_ones,
+    sqrt as np_sqrt,
+    uint8,
+    zeros as np_zeros,
+)
+
+from ._compat.dozor import Datacol, DatacolPickle
+from .dozor import _split_fields
+
+if TYPE_CHECKING:
+    from numpy import unsignedinteger, void
+    from numpy.typing import NDArray
+
+    from .dozor import Dozor
+    from .mask import PixelMask
+    from .schemas import DatacolSchema, DataSchema
+
+__all__ = ("PrefilterStats", "BlankFilter", "PrefilteredDozor")
+
+
+class PrefilterStats(NamedTuple):
+    """Blank Frame Prefilter Statistics"""
+
+    frames: int
+    skipped: int
+    audited: int
+    missed: int
+
+    def __add__(self: Self, other: tuple[Any, ...]) -> PrefilterStats:
+        return PrefilterStats(*(_a + _b for _a, _b in zip(self, other, strict=True)))
+
+    def __sub__(self: Self, other: tuple[Any, ...]) -> PrefilterStats:
+        return PrefilterStats(*(_a - _b for _a, _b in zip(self, other, strict=True)))
+
+
+class BlankFilter:
+    """Blank Frame Prefilter
+
+    Counts peak pixels in a strided subsample of each frame, restricted to
+    unmasked pixels within an optional resolution annulus. The subsample is
+    split into tiles, and a pixel is a peak if it exceeds the mean of its
+    tile, the local background, by `sigma` Poisson standard deviations.
+    Frames with fewer than `min_peaks` peaks are blank, and need not be
+    processed by Dozor.
+
+    Every `audit_every`-th blank frame is processed regardless, and counted
+    as missed if Dozor finds it a hit, to measure how often the prefilter is
+    wrong with its current settings.
+
+    Parameters
+    ----------
+    pixel_max : int
+        Max pixel value, larger pixels are ignored.
+    mask : PixelMask | None, optional
+        Pixel mask, masked pixels are ignored, by default None.
+    center : tuple[float, float] | None, optional
+        Beam centre, as `(y, x)` in pixels, required by `radius`,
+        by default None.
+    radius : tuple[float, float] | None, optional
+        Resolution annulus, as minimum and maximum distance from `center` in
+        pixels, if undefined the whole frame is used, by default None.
+    stride : int, optional
+        Subsample every `stride`-th pixel along each axis, by default 2.
+    tile : int, optional
+        Tile size of the local background, in subsampled pixels,
+        by default 16.
+    sigma : float, optional
+        Peak threshold above the local background, in Poisson standard
+        deviations, by default 8.
+    min_peaks : int, optional
+        Minimum number of peaks of a frame which is not blank, by default 3.
+    audit_every : int, optional
+        Process every `audit_every`-th blank frame to check it, if 0 blank
+        frames are never processed, by default 0.
+    cut_off : float, optional
+        Minimum `score3` of a hit, for audits, by default 5.
+
+    Raises
+    ------
+    ValueError
+        Raised if `radius` is given without `center`, or `stride` or `tile`
+        is less than 1.
+    """
+
+    def __init__(
+        self: Self,
+        pixel_max: int,
+        *,
+        mask: PixelMask | None = None,
+        center: tuple[float, float] | None = None,
+        radius: tuple[float, float] | None = None,
+        stride: int = 2,
+        tile: int = 16,
+        sigma: float = 8,
+        min_peaks: int = 3,
+        audit_every: int = 0,
+        cut_off: float = 5,
+    ) -> None:
+        if radius is not None and center is None:
+            raise ValueError("Prefilter `radius` requires the beam `center`.")
+        if stride < 1 or tile < 1:
+            raise ValueError("Prefilter `stride` and `tile` must be at least 1.")
+        self._pixel_max = pixel_max
+        self._mask = mask
+        self._center = center
+        self._radius = radius
+        self._stride = stride
+        self._tile = tile
+        self._sigma = sigma
+        self._min_peaks = min_peaks
+        self._audit_every = audit_every
+        self._cut_off = cut_off
+
+        # Subsample state, prepared for the shape of the first frame
+        self._shape: tuple[int, ...] | None = None
+        self._region: NDArray[uint8] | None = None
+        self._counts: NDArray[float64] | None = None
+
+        self._lock = Lock()
+        self._frames = 0
+        self._skipped = 0
+        self._audited = 0
+        self._missed = 0
+        self._blank_seen = 0
+
+    def __getstate__(self: Self) -> dict[str, Any]:
+        _state = self.__dict__.copy()
+        del _state["_lock"]
+        return _state
+
+    def __setstate__(self: Self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    @property
+    def cut_off(self: Self) -> float:
+        """Minimum `score3` of a hit.
+
+        Returns
+        -------
+        float
+            Minimum `score3` of a hit, for audits.
+        """
+        return self._cut_off
+
+    @property
+    def stats(self: Self) -> PrefilterStats:
+        """Prefilter statistics.
+
+        Returns
+        -------
+        PrefilterStats
+            Number of frames checked, skipped as blank, blank but processed
+            for an audit, and audited frames which were hits.
+        """
+        with self._lock:
+            return PrefilterStats(
+                self._frames, self._skipped, self._audited, self._missed
+            )
+
+    def reset(self: Self) -> None:
+        """Reset prefilter statistics."""
+        with self._lock:
+            self._frames = self._skipped = self._audited = self._missed = 0
+            self._blank_seen = 0
+
+    def _prepare(self: Self, shape: tuple[int, ...]) -> None:
+        """Prepare the subsample region and tile pixel counts for a shape."""
+        _stride, _tile = self._stride, self._tile
+        _rows = (shape[0] + _stride - 1) // _stride // _tile * _tile
+        _columns = (shape[1] + _stride - 1) // _stride // _tile * _tile
+        if not _rows or not _columns:
+            raise ValueError(f"Frame shape {shape} is smaller than a prefilter tile.")
+
+        _region = np_ones((_rows, _columns), dtype=bool_)
+        if self._mask is not None and self._mask.count:
+            _bad = self._mask.to_bool().reshape(shape)
+            np_logical_not(_bad[::_stride, ::_stride][:_rows, :_columns], out=_region)
+        if self._radius is not None:
+            _y = np_arange(0, _rows * _stride, _stride, dtype=float64)[:, None]
+            _x = np_arange(0, _columns * _stride, _stride, dtype=float64)[None, :]
+            _distance = (_y - self._center[0]) ** 2 + (_x - self._center[1]) ** 2
+            _region &= _distance >= self._radius[0] ** 2
+            _region &= _distance <= self._radius[1] ** 2
+
+        self._region = _region.view(uint8)
+        self._counts = self._tile_sums(self._region)
+        self._shape = shape
+
+    def _tile_sums(self: Self, values: NDArray[Any]) -> NDArray[float64]:
+        """Sum tiles of a subsample."""
+        _rows, _columns = values.shape
+        _tile = self._tile
+        _row_sums = np_add.reduce(
+            values.reshape(_rows // _tile, _tile, _columns), axis=1, dtype=float64
+        )
+        return np_add.reduce(
+            _row_sums.reshape(_rows // _tile, _columns // _tile, _tile), axis=2
+        )
+
+    def peaks(self: Self, frame: NDArray[unsignedinteger[Any]]) -> int:
+        """Count peak pixels in the subsample of a frame.
+
+        Parameters
+        ----------
+        frame : NDArray[unsignedinteger[Any]]
+            Frame, with any unsigned integer DType.
+
+        Returns
+        -------
+        int
+            Number of subsampled pixels above the local background threshold.
+        """
+        if frame.shape != self._shape:
+            self._prepare(frame.shape)
+        _region = self._region
+        _rows, _columns = _region.shape
+        _tile = self._tile
+        _sample = frame[:: self._stride, :: self._stride][:_rows, :_columns]
+
+        _values = np_empty((_rows, _columns), dtype=float32)
+        np_multiply(_sample, _region, out=_values, casting="unsafe")
+        # Overloaded pixels, and pixels of converted frames set to 65535
+        _over = np_greater(_values, min(self._pixel_max, 65534))
+        np_copyto(_values, 0, where=_over)
+
+        _counts = self._counts
+        _background = self._tile_sums(_values)
+        _background /= _counts.clip(1)
+        _threshold = _background + self._sigma * np_sqrt(_background + 1)
+        _threshold[_counts == 0] = inf
+        _peaks = np_greater(
+            _values.reshape(_rows // _tile, _tile, _columns // _tile, _tile),
+            _threshold.astype(float32)[:, None, :, None],
+        )
+        return int(np_count_nonzero(_peaks))
+
+    def is_blank(self: Self, frame: NDArray[unsignedinteger[Any]]) -> bool:
+        """Check whether a frame is blank.
+
+        Parameters
+        ----------
+        frame : NDArray[unsignedinteger[Any]]
+            Frame, with any unsigned integer DType.
+
+        Returns
+        -------
+        bool
+            Whether the frame has fewer than `min_peaks` peaks.
+        """
+        return self.peaks(frame) < self._min_peaks
+
+    def check(
+        self: Self,
+        frame: NDArray[unsignedinteger[Any]],
+    ) -> Literal["keep", "skip", "audit"]:
+        """Decide how to handle a frame, counting it in the statistics.
+
+        Parameters
+        ----------
+        frame : NDArray[unsignedinteger[Any]]
+            Frame, with any unsigned integer DType.
+
+        Returns
+        -------
+        Literal["keep", "skip", "audit"]
+            "keep" to process a frame which is not blank, "skip" to skip a
+            blank frame, or "audit" to process a blank frame and report
+            whether it was a hit with `record_audit`.
+        """
+        _blank = self.is_blank(frame)
+        with self._lock:
+            self._frames += 1
+            if not _blank:
+                return "keep"
+            self._blank_seen += 1
+            if self._audit_every and self._blank_seen % self._audit_every == 0:
+                self._audited += 1
+                return "audit"
+            self._skipped += 1
+            return "skip"
+
+    def record_audit(self: Self, hit: bool) -> None:
+        """Report the Dozor result of an audited frame.
+
+        Parameters
+        ----------
+        hit : bool
+            Whether Dozor found the blank frame a hit.
+        """
+        if hit:
+            with self._lock:
+                self._missed += 1
+
+
+class PrefilteredDozor:
+    """Dozor Engine Behind A Blank Frame Prefilter
+
+    Frames the prefilter finds blank are skipped, and get all zero results,
+    so `score3` and `NofR` are 0, along with a flag telling them apart from
+    frames Dozor found empty.
+
+    Parameters
+    ----------
+    engine : Dozor
+        Dozor engine.
+    blank_filter : BlankFilter
+        Blank frame prefilter.
+    """
+
+    def __init__(self: Self, engine: Dozor, blank_filter: BlankFilter) -> None:
+        self._engine = engine
+        self._filter = blank_filter
+        # Decoded all zero results of skipped frames, per field selection
+        self._blank: dict[
+            tuple[tuple[str, ...] | None, tuple[str, ...] | None],
+            tuple[dict[str, Any], dict[str, Any]],
+        ] = {}
+
+    @property
+    def engine(self: Self) -> Dozor:
+        """Dozor engine.
+
+        Returns
+        -------
+        Dozor
+            Engine processing frames which are not skipped.
+        """
+        return self._engine
+
+    @property
+    def blank_filter(self: Self) -> BlankFilter:
+        """Blank frame prefilter.
+
+        Returns
+        -------
+        BlankFilter
+            Prefilter deciding which frames are skipped.
+        """
+        return self._filter
+
+    def _blank_result(
+        self: Self,
+        datacol_fields: tuple[str, ...] | None,
+        data_fields: tuple[str, ...] | None,
+    ) -> tuple[DatacolSchema, DataSchema]:
+        """Get all zero output of a skipped frame, decoded once per fields."""
+        _key = (datacol_fields, data_fields)
+        _blank = self._blank.get(_key)
+        if _blank is None:
+            _blank = self._blank[_key] = (
+                Datacol.to_dict(Datacol(), datacol_fields),
+                DatacolPickle.to_dict(DatacolPickle(), data_fields),
+            )
+        # Array fields are lists, copied so callers never modify the cached output
+        _datacol, _data = (
+            {
+                _name: _value.copy() if isinstance(_value, list) else _value
+                for _name, _value in _output.items()
+            }
+            for _output in _blank
+        )
+        return _datacol, _data
+
+    def do_image(
+        self: Self,
+        image: NDArray[Any],
+        *,
+        mask: PixelMask | None = None,
+        fields: Iterable[str] | None = None,
+    ) -> tuple[DatacolSchema, DataSchema, bool]:
+        """Call Dozor to process a frame, unless it is blank.
+
+        Parameters
+        ----------
+        image : NDArray[Any]
+            Frame to process, see `Dozor.do_image`.
+        mask : PixelMask | None, optional
+            Pixel mask, applied in place before processing, by default None.
+        fields : Iterable[str] | None, optional
+            Names of output fields to include, see `Dozor.do_image`,
+            by default None.
+
+        Returns
+        -------
+        tuple[DatacolSchema, DataSchema, bool]
+            Decoded output from `dozor_do_image`, all zero for blank frames,
+            and whether the frame was skipped as blank.
+        """
+        _datacol_fields: tuple[str, ...] | None = None
+        _data_fields: tuple[str, ...] | None = None
+        if fields is not None:
+            _datacol_fields, _data_fields = _split_fields(tuple(fields))
+
+        _decision = self._filter.check(image)
+        if _decision == "skip":
+            return (*self._blank_result(_datacol_fields, _data_fields), True)
+        if _decision == "keep":
+            return (*self._engine.do_image(image, mask=mask, fields=fields), False)
+
+        _datacol, _data = self._engine.do_image(image, mask=mask)
+        self._filter.record_audit(_data["score3"] > self._filter.cut_off)
+        _results = (
+            (
+                _datacol
+                if _datacol_fields is None
+                else {_key: _datacol[_key] for _key in _datacol_fields}
+            ),
+            (
+                _data
+                if _data_fields is None
+                else {_key: _data[_key] for _key in _data_fields}
+            ),
+            False,
+        )
+        return _results
+
+    def do_images(
+        self: Self,
+        stack: NDArray[Any] | Iterable[NDArray[Any]],
+        *,
+        mask: PixelMask | None = None,
+        fields: Iterable[str] | None = None,
+        skipped: list[int] | None = None,
+    ) -> NDArray[void]:
+        """Call Dozor to process a stack of frames, skipping blank frames.
+
+        Parameters
+        ----------
+        stack : NDArray[Any] | Iterable[NDArray[Any]]
+            Frames to process, see `Dozor.do_images`.
+        mask : PixelMask | None, optional
+            Pixel mask, applied in place before processing, by default None.
+        fields : Iterable[str] | None, optional
+            Names of `DatacolPickle` fields to include in results, if undefined
+            all fields are included, by default None.
+        skipped : list[int] | None, optional
+            List to append indices of skipped frames to, by default None.
+
+        Returns
+        -------
+        NDArray[void]
+            Structured array of `DatacolPickle` records, one per frame, all
+            zero for skipped frames.
+        """
+        _kept: list[int] = []
+        _audited: list[int] = []
+        _skipped: list[int] = [] if skipped is None else skipped
+        _count = 0
+
+        def _frames() -> Iterator[NDArray[Any]]:
+            nonlocal _count
+            for _index, _frame in enumerate(stack):
+                _count = _index + 1
+                _decision = self._filter.check(_frame)
+                if _decision == "skip":
+                    _skipped.append(_index)
+                    continue
+                if _decision == "audit":
+                    _audited.append(len(_kept))
+                _kept.append(_index)
+                yield _frame
+
+        _records = self._engine.do_images(_frames(), mask=mask)
+        for _position in _audited:
+            self._filter.record_audit(
+                bool(_records["score3"][_position] > self._filter.cut_off)
+            )
+        _results = np_zeros(_count, dtype=_records.dtype)
+        _results[_kept] = _records
+        if fields is not None:
+            return _results[list(fields)]
+        return _results
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from os import cpu_count
+from pathlib import Path
+from traceback import format_exc
+from typing import TYPE_CHECKING, Any, NamedTuple, Self
+
+from numpy import (
+    copyto as np_copyto,
+    dtype as np_dtype,
+    empty as np_empty,
+    ndarray,
+    prod as np_prod,
+    resize as np_resize,
+    uint16,
+)
+
+from ._compat.dozor import DatacolPickle
+from ._workers import get_result
+from .dozor import Dozor
+from .mask import PixelMask
+
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+    from multiprocessing.process import BaseProcess
+    from types import TracebackType
+
+    from numpy import void
+    from numpy.typing import NDArray
+
+__all__ = ("DozorSpec", "DozorProcessPool")
+
+
+class DozorSpec(NamedTuple):
+    """Picklable Dozor Engine Specification"""
+
+    config_file: str
+
+    def build(self: Self) -> Dozor:
+        """Build Dozor engine from specification.
+
+        Returns
+        -------
+        Dozor
+            Initialized Dozor engine.
+        """
+        return Dozor(Path(self.config_file), reuse_buffers=True)
+
+
+class _SharedArray:
+    """NumPy Array Backed By Shared Memory"""
+
+    def __init__(
+        self: Self,
+        shape: tuple[int, ...],
+        dtype: Any,
+        name: str | None = None,
+    ) -> None:
+        _nbytes = int(np_prod(shape)) * np_dtype(dtype).itemsize
+        self._shm = SharedMemory(name=name, create=name is None, size=max(1, _nbytes))
+        self.array: ndarray = ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+
+    @property
+    def name(self: Self) -> str:
+        """Shared memory block name.
+
+        Returns
+        -------
+        str
+            Name to attach to the shared memory block with.
+        """
+        return self._shm.name
+
+    def close(self: Self, unlink: bool = False) -> None:
+        """Release shared memory.
+
+        Parameters
+        ----------
+        unlink : bool, optional
+            Whether to also destroy the shared memory block, by default False.
+        """
+        del self.array
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+def _worker(
+    spec: DozorSpec,
+    shape: tuple[int, int],
+    slots: int,
+    frames_name: str,
+    results_name: str,
+    mask_spec: tuple[str, int, str, tuple[int, ...], str] | None,
+    tasks: Any,
+    done: Any,
+) -> None:
+    """Process pool worker, processes frames from shared memory ring slots."""
+    _frames = _SharedArray((slots, *shape), uint16, frames_name)
+    _results = _SharedArray((slots,), DatacolPickle.record_dtype(), results_name)
+    _mask_data: _SharedArray | None = None
+    _mask: PixelMask | None = None
+    if mask_spec is not None:
+        _mask_name, _mask_count, _mask_kind, _mask_shape, _mask_dtype = mask_spec
+        _mask_data = _SharedArray(_mask_shape, _mask_dtype, _mask_name)
+        _mask = PixelMask._from_compact(
+            shape, _mask_count, _mask_kind, _mask_data.array
+        )
+    try:
+        _engine = spec.build()
+        while (_task := tasks.get()) is not None:
+            _slot, _index = _task
+            _window = slice(_slot, _slot + 1)
+            try:
+                _engine.do_images(
+                    _frames.array[_window],
+                    mask=_mask,
+                    out=_results.array[_window],
+                )
+                done.put((_slot, _index, None))
+            except Exception:
+                done.put((_slot, _index, format_exc()))
+    finally:
+        _frames.close()
+        _results.close()
+        if _mask_data is not None:
+            del _mask
+            _mask_data.close()
+
+
+class DozorProcessPool:
+    """Process Pool Of Dozor Engines
+
+    Every worker process builds one long-lived Dozor engine from a picklable
+    engine specification. Frames are passed to workers through shared memory
+    ring buffer slots, the compiled mask is shared once, and results come back
+    as packed `DatacolPickle` records, also in shared memory, so nothing is
+    pickled per frame except slot indices.
+
+    Parameters
+    ----------
+    spec : DozorSpec | Path | str
+        Dozor engine specification, or Dozor config file.
+    shape : tuple[int, int]
+        Frame shape, as `(ny, nx)`.
+    processes : int | None, optional
+        Number of worker processes, if undefined the CPU count is used,
+        by default None.
+    mask : PixelMask | NDArray[Any] | None, optional
+        Pixel mask, either compiled or an Eiger style array in which nonzero
+        pixels are masked, by default None.
+    slots : int | None, optional
+        Number of frame slots in the ring buffer, bounding the number of
+        frames in flight, if undefined twice the number of processes,
+        by default None.
+    context : str | None, optional
+        Multiprocessing start method, by default None.
+    """
+
+    def __init__(
+        self: Self,
+        spec: DozorSpec | Path | str,
+        shape: tuple[int, int],
+        processes: int | None = None,
+        *,
+        mask: PixelMask | NDArray[Any] | None = None,
+        slots: int | None = None,
+        context: str | None = None,
+    ) -> None:
+        if not isinstance(spec, DozorSpec):
+            spec = DozorSpec(str(spec))
+        self._spec = spec
+        self._shape = (int(shape[0]), int(shape[1]))
+        self._processes = processes or cpu_count() or 1
+        self._slots = slots or 2 * self._processes
+
+        self._frames = _SharedArray((self._slots, *self._shape), uint16)
+        self._results = _SharedArray((self._slots,), DatacolPickle.record_dtype())
+        self._mask: _SharedArray | None = None
+        _mask_spec = None
+        if mask is not None:
+            if not isinstance(mask, PixelMask):
+                mask = PixelMask.from_eiger(mask)
+            _mask_kind, _mask_data = mask._compact()
+            self._mask = _SharedArray(_mask_data.shape, _mask_data.dtype)
+            np_copyto(self._mask.array, _mask_data)
+            _mask_spec = (
+                self._mask.name,
+                mask.count,
+                _mask_kind,
+                _mask_data.shape,
+                _mask_data.dtype.str,
+            )
+
+        _context: BaseContext = get_context(context)
+        self._tasks = _context.SimpleQueue()
+        self._done = _context.SimpleQueue()
+        self._free: deque[int] = deque(range(self._slots))
+        self._workers: list[BaseProcess] = [
+            _context.Process(
+                target=_worker,
+                args=(
+                    self._spec,
+                    self._shape,
+                    self._slots,
+                    self._frames.name,
+                    self._results.name,
+                    _mask_spec,
+                    self._tasks,
+                    self._done,
+                ),
+                daemon=True,
+            )
+            for _ in range(self._processes)
+        ]
+        for _worker_process in self._workers:
+            _worker_process.start()
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def processes(self: Self) -> int:
+        """Number of worker processes.
+
+        Returns
+        -------
+        int
+            Number of worker processes.
+        """
+        return self._processes
+
+    def _collect(self: Self) -> tuple[int, NDArray[void]]:
+        """Wait for a frame to complete and release its slot.
+
+        Returns
+        -------
+        tuple[int, NDArray[void]]
+            Frame index, and a single element array holding a copy of its
+            `DatacolPickle` record.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if a worker failed to process the frame, or a worker
+            process died.
+        """
+        _slot, _index, _error = get_result(self._done, self._workers)
+        _record = self._results.array[slice(_slot, _slot + 1)].copy()
+        self._free.append(_slot)
+        if _error is not None:
+            raise RuntimeError(f"Error while processing frame {_index}:\n{_error}")
+        return _index, _record
+
+    def imap(
+        self: Self,
+        images: Iterable[NDArray[uint16]],
+    ) -> Iterator[tuple[int, NDArray[void]]]:
+        """Process frames, yielding results as soon as they complete.
+
+        Parameters
+        ----------
+        images : Iterable[NDArray[uint16]]
+            Frames to process, each is copied into a shared memory slot.
+
+        Yields
+        ------
+        tuple[int, NDArray[void]]
+            Index of frame in `images`, and a single element array holding
+            its `DatacolPickle` record, in completion order.
+
+        Raises
+        ------
+        TypeError
+            Raised if a frame does not have DType `uint16`.
+        ValueError
+            Raised if a frame does not have the shape of the pool.
+        """
+        _in_flight = 0
+        try:
+            for _index, _image in enumerate(images):
+                if not self._free:
+                    _in_flight -= 1
+                    yield self._collect()
+                if _image.dtype.itemsize != 2 or _image.dtype.kind not in "ui":
+                    raise TypeError(
+                        f"Frame must have DType `uint16`, not `{_image.dtype}`."
+                    )
+                if _image.shape != self._shape:
+                    raise ValueError(
+                        f"Frame has shape {_image.shape}, pool expects {self._shape}."
+                    )
+                _slot = self._free.popleft()
+                np_copyto(self._frames.array[_slot], _image, casting="unsafe")
+                self._tasks.put((_slot, _index))
+                _in_flight += 1
+            while _in_flight:
+                _in_flight -= 1
+                yield self._collect()
+        finally:
+            # Drain frames still in flight, so slots are free for reuse, frames
+            # of a dead worker never complete
+            while _in_flight:
+                _in_flight -= 1
+                try:
+                    _slot, _, _ = get_result(self._done, self._workers)
+                except RuntimeError:
+                    break
+                self._free.append(_slot)
+
+    def do_images(
+        self: Self,
+        stack: NDArray[uint16] | Iterable[NDArray[uint16]],
+    ) -> NDArray[void]:
+        """Process a stack of frames.
+
+        Parameters
+        ----------
+        stack : NDArray[uint16] | Iterable[NDArray[uint16]]
+            Frames to process, either an `(N, ny, nx)` array or any iterable
+            of frames.
+
+        Returns
+        -------
+        NDArray[void]
+            Structured array of `DatacolPickle` records, in frame order.
+
+        Raises
+        ------
+        TypeError
+            Raised if a frame does not have DType `uint16`.
+        ValueError
+            Raised if a frame does not have the shape of the pool.
+        """
+        _results = np_empty(
+            len(stack) if hasattr(stack, "__len__") else 64,
+            dtype=DatacolPickle.record_dtype(),
+        )
+        _count = 0
+        for _index, _record in self.imap(stack):
+            if _index >= len(_results):
+                _results = np_resize(_results, max(2 * _index, 64))
+            _results[_index] = _record[0]
+            _count = max(_count, _index + 1)
+        return _results[:_count]
+
+    def close(self: Self) -> None:
+        """Stop worker processes and release shared memory."""
+        if not self._workers:
+            return
+        for _ in self._workers:
+            self._tasks.put(None)
+        for _worker_process in self._workers:
+            _worker_process.join()
+        self._workers = []
+
+        self._frames.close(unlink=True)
+        self._results.close(unlink=True)
+        if self._mask is not None:
+            self._mask.close(unlink=True)
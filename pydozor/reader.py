@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import cpu_count
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from re import compile as re_compile
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, NamedTuple, Self
+
+from bitshuffle import decompress_lz4
+from h5py import Dataset, File as H5File
+from numpy import empty as np_empty, frombuffer as np_frombuffer, ndarray, uint8
+
+from . import metrics
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from numpy import dtype
+    from numpy.typing import NDArray
+
+__all__ = ("EigerReader",)
+
+# HDF5 filter ID of bitshuffle, and its LZ4 compression option
+_BSHUF_FILTER = 32008
+_BSHUF_LZ4 = 2
+
+# Header of a bitshuffle chunk, 8 byte uncompressed size and 4 byte block size
+_BSHUF_HEADER = 12
+
+_CONTAINER_PATTERN = re_compile(r"^data_\d{6}$")
+
+
+class _Container(NamedTuple):
+    """Eiger Data Container"""
+
+    dataset: Dataset
+    first: int
+    count: int
+    chunk: int
+    bitshuffle: bool
+
+
+def _is_bitshuffle_lz4(dataset: Dataset) -> bool:
+    """Check if dataset is compressed only with bitshuffle LZ4, in whole frames.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        HDF5 dataset.
+
+    Returns
+    -------
+    bool
+        Whether raw chunks can be decompressed directly with bitshuffle.
+    """
+    if dataset.chunks is None or dataset.chunks[1:] != dataset.shape[1:]:
+        return False
+    _plist = dataset.id.get_create_plist()
+    if _plist.get_nfilters() != 1:
+        return False
+    _code, _, _values, _ = _plist.get_filter(0)
+    return _code == _BSHUF_FILTER and len(_values) > 4 and _values[4] == _BSHUF_LZ4
+
+
+class EigerReader:
+    """Eiger HDF5 Frame Reader
+
+    Reads frames from an Eiger master file and its data containers, which are
+    each opened once. Bitshuffle LZ4 compressed chunks are read raw with
+    `read_direct_chunk` and decompressed on a thread pool, bypassing the HDF5
+    filter pipeline, while the next chunks are prefetched. Other datasets
+    are read through HDF5 into reusable buffers.
+
+    Frames are numbered from 1, across all data containers.
+
+    Parameters
+    ----------
+    master_file : Path | str
+        Eiger master file.
+    workers : int | None, optional
+        Number of decompression threads, if undefined the CPU count, up to 8,
+        by default None.
+    prefetch : int | None, optional
+        Number of chunks read ahead, if undefined twice the number of workers,
+        by default None.
+    """
+
+    def __init__(
+        self: Self,
+        master_file: Path | str,
+        *,
+        workers: int | None = None,
+        prefetch: int | None = None,
+    ) -> None:
+        self._workers = workers or min(8, cpu_count() or 1)
+        self._prefetch = prefetch or 2 * self._workers
+        self._master = H5File(master_file, "r")
+
+        _data = self._master["/entry/data"]
+        self._containers: list[_Container] = []
+        _first = 1
+        for _name in sorted(_key for _key in _data if _CONTAINER_PATTERN.match(_key)):
+            try:
+                _dataset: Dataset = _data[_name]
+            except KeyError:
+                # Dangling external link, container not written (yet)
+                break
+            _count = _dataset.shape[0]
+            self._containers.append(
+                _Container(
+                    _dataset,
+                    _first,
+                    _count,
+                    _dataset.chunks[0] if _dataset.chunks else _count,
+                    _is_bitshuffle_lz4(_dataset),
+                )
+            )
+            _first += _count
+        if not self._containers:
+            raise ValueError(f"No data containers found in `{master_file}`.")
+
+        self._shape: tuple[int, int] = self._containers[0].dataset.shape[1:]
+        self._dtype: dtype[Any] = self._containers[0].dataset.dtype
+        self._frame_count = _first - 1
+        self._buffers: SimpleQueue[NDArray[Any]] = SimpleQueue()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __len__(self: Self) -> int:
+        return self._frame_count
+
+    @property
+    def shape(self: Self) -> tuple[int, int]:
+        """Frame shape.
+
+        Returns
+        -------
+        tuple[int, int]
+            Frame shape, as `(ny, nx)`.
+        """
+        return self._shape
+
+    @property
+    def dtype(self: Self) -> dtype[Any]:
+        """Frame DType.
+
+        Returns
+        -------
+        dtype[Any]
+            DType of stored frames.
+        """
+        return self._dtype
+
+    @property
+    def master(self: Self) -> H5File:
+        """Master file.
+
+        Returns
+        -------
+        H5File
+            Open Eiger master file.
+        """
+        return self._master
+
+    def _container(self: Self, image: int) -> _Container:
+        """Get data container holding frame number."""
+        for _container in self._containers:
+            if image < _container.first + _container.count:
+                return _container
+        raise IndexError(f"Frame {image} out of range 1-{self._frame_count}.")
+
+    def _bounds(self: Self, start: int, end: int | None) -> tuple[int, int]:
+        """Clamp inclusive frame range to frames in dataset."""
+        if end is None or end < 0 or end > self._frame_count:
+            end = self._frame_count
+        return max(1, start), end
+
+    def chunks(
+        self: Self,
+        start: int = 1,
+        end: int | None = None,
+        *,
+        min_frames: int = 1,
+    ) -> list[tuple[int, int]]:
+        """Split frame range into chunk aligned ranges.
+
+        Ranges never cross a data container or HDF5 chunk boundary, so each
+        can be read with a single chunk read, unless `min_frames` merges
+        consecutive chunks of a container.
+
+        Parameters
+        ----------
+        start : int, optional
+            First frame number, by default 1.
+        end : int | None, optional
+            Last frame number, inclusive, if undefined or negative the last
+            frame of the dataset, by default None.
+        min_frames : int, optional
+            Minimum number of frames per range, consecutive chunks within a
+            data container are merged until reached, by default 1.
+
+        Returns
+        -------
+        list[tuple[int, int]]
+            First and last frame numbers, inclusive, of each range.
+        """
+        start, end = self._bounds(start, end)
+        _ranges = []
+        for _container in self._containers:
+            _last = _container.first + _container.count - 1
+            _first = max(start, _container.first)
+            while _first <= min(end, _last):
+                _chunk_index = (_first - _container.first) // _container.chunk
+                _chunk_last = _container.first + (_chunk_index + 1) * _container.chunk
+                _stop = min(end, _last, _chunk_last - 1)
+                if _ranges and _ranges[-1][0] >= _container.first:
+                    _previous = _ranges[-1]
+                    if _previous[1] - _previous[0] + 1 < min_frames:
+                        _ranges[-1] = (_previous[0], _stop)
+                        _first = _stop + 1
+                        continue
+                _ranges.append((_first, _stop))
+                _first = _stop + 1
+        return _ranges
+
+    def _acquire(self: Self, count: int) -> NDArray[Any]:
+        """Get reusable buffer holding at least `count` frames."""
+        try:
+            _buffer = self._buffers.get_nowait()
+            if len(_buffer) >= count:
+                return _buffer
+        except Empty:
+            pass
+        return np_empty((count, *self._shape), dtype=self._dtype)
+
+    def release(self: Self, frames: NDArray[Any]) -> None:
+        """Return frames block to the reader for reuse.
+
+        Parameters
+        ----------
+        frames : NDArray[Any]
+            Frames block returned by `read`, must no longer be used.
+        """
+        _base = frames.base if frames.base is not None else frames
+        if self._buffers.qsize() > self._prefetch or not isinstance(_base, ndarray):
+            return
+        if _base.shape[1:] == self._shape and _base.dtype == self._dtype:
+            self._buffers.put(_base)
+
+    def _read_chunk(self: Self, first: int, last: int) -> NDArray[Any]:
+        """Read frames within a single chunk, decompressing raw chunks."""
+        _metrics = metrics._active
+        if _metrics is not None:
+            _start = perf_counter()
+        _container = self._container(first)
+        _offset = first - _container.first
+        _count = last - first + 1
+        if _container.bitshuffle:
+            _chunk_start = (_offset // _container.chunk) * _container.chunk
+            _, _raw = _container.dataset.id.read_direct_chunk((_chunk_start, 0, 0))
+            _raw_array = np_frombuffer(_raw, dtype=uint8)
+            _block_size = int.from_bytes(_raw[8:_BSHUF_HEADER], "big")
+            _frames = decompress_lz4(
+                _raw_array[_BSHUF_HEADER:],
+                (_container.chunk, *self._shape),
+                self._dtype,
+                _block_size // self._dtype.itemsize,
+            )
+            if _metrics is not None:
+                _metrics.observe(
+                    "decode", perf_counter() - _start, frames=_count, nbytes=len(_raw)
+                )
+            _first = _offset - _chunk_start
+            return _frames[slice(_first, _first + _count)]
+
+        _frames = self._acquire(_count)[:_count]
+        _container.dataset.read_direct(
+            _frames,
+            source_sel=slice(_offset, _offset + _count),
+            dest_sel=slice(0, _count),
+        )
+        if _metrics is not None:
+            _metrics.observe(
+                "decode", perf_counter() - _start, frames=_count, nbytes=_frames.nbytes
+            )
+        return _frames
+
+    def read(self: Self, first: int, last: int) -> NDArray[Any]:
+        """Read frame range.
+
+        Parameters
+        ----------
+        first : int
+            First frame number.
+        last : int
+            Last frame number, inclusive.
+
+        Returns
+        -------
+        NDArray[Any]
+            Frames, as an `(N, ny, nx)` array.
+        """
+        _ranges = self.chunks(first, last)
+        if len(_ranges) == 1:
+            return self._read_chunk(*_ranges[0])
+        _frames = np_empty((last - first + 1, *self._shape), dtype=self._dtype)
+        for _first, _last in _ranges:
+            _block = self._read_chunk(_first, _last)
+            _frames[slice(_first - first, _last - first + 1)] = _block
+            self.release(_block)
+        return _frames
+
+    def iter_chunks(
+        self: Self,
+        start: int = 1,
+        end: int | None = None,
+    ) -> Iterator[tuple[int, NDArray[Any]]]:
+        """Iterate over chunk aligned frame blocks, prefetching ahead.
+
+        Each block is only valid until the next block is requested, as its
+        memory may be reused.
+
+        Parameters
+        ----------
+        start : int, optional
+            First frame number, by default 1.
+        end : int | None, optional
+            Last frame number, inclusive, if undefined or negative the last
+            frame of the dataset, by default None.
+
+        Yields
+        ------
+        tuple[int, NDArray[Any]]
+            Number of first frame in block, and frames block.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers,
+                thread_name_prefix="eiger-reader",
+            )
+        _ranges = iter(self.chunks(start, end))
+        _pending: deque[tuple[int, Future[NDArray[Any]]]] = deque()
+
+        def _submit() -> None:
+            _range = next(_ranges, None)
+            if _range is not None:
+                _pending.append(
+                    (_range[0], self._executor.submit(self._read_chunk, *_range))
+                )
+
+        for _ in range(self._prefetch):
+            _submit()
+        try:
+            while _pending:
+                _first, _future = _pending.popleft()
+                _submit()
+                _frames = _future.result()
+                yield _first, _frames
+                self.release(_frames)
+        finally:
+            for _, _future in _pending:
+                _future.cancel()
+
+    def frames(
+        self: Self,
+        start: int = 1,
+        end: int | None = None,
+    ) -> Iterator[tuple[int, NDArray[Any]]]:
+        """Iterate over frames, prefetching ahead.
+
+        Each frame is only valid until the next frame is requested.
+
+        Parameters
+        ----------
+        start : int, optional
+            First frame number, by default 1.
+        end : int | None, optional
+            Last frame number, inclusive, if undefined or negative the last
+            frame of the dataset, by default None.
+
+        Yields
+        ------
+        tuple[int, NDArray[Any]]
+            Frame number, and frame.
+        """
+        for _first, _block in self.iter_chunks(start, end):
+            for _index, _frame in enumerate(_block):
+                yield _first + _index, _frame
+
+    def close(self: Self) -> None:
+        """Stop prefetching and close HDF5 files."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._containers.clear()
+        self._master.close()
@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+from functools import lru_cache
+from os import remove as os_remove
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, Self
+
+from h5py import File as H5File
+from numpy import (
+    arange as np_arange,
+    argsort as np_argsort,
+    bool_,
+    concatenate as np_concatenate,
+    dtype as np_dtype,
+    empty as np_empty,
+    fromfile as np_fromfile,
+    int64,
+    load as np_load,
+    savez_compressed as np_savez_compressed,
+    unique as np_unique,
+    zeros as np_zeros,
+)
+
+from ._compat.dozor import DatacolPickle
+from .schemas import DataSchema
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from numpy import void
+    from numpy.typing import NDArray
+
+__all__ = (
+    "ResultFormat",
+    "ResultWriter",
+    "result_dtype",
+    "read_results",
+    "merge_results",
+)
+
+ResultFormat = Literal["hdf5", "npz", "raw", "text"]
+
+# `DataSchema` field names of `DatacolPickle` fields
+_FIELD_NAMES: dict[str, str] = {
+    "Coef": "coef",
+    "Iav": "iav",
+    "NofR": "nof_r",
+    "NofS": "nof_s",
+    "Rfexp": "rfexp",
+    "SumBack2D": "sumback_2d",
+    "SumTotal2D": "sumtotal_2d",
+    "backpol2D": "backpol_2d",
+    "dlim": "dlim",
+    "dlim09": "dlim09",
+    "score2": "score2",
+    "score3": "score3",
+    "table_b": "table_b",
+    "table_corr": "table_corr",
+    "table_est": "table_est",
+    "table_intsum": "table_intsum",
+    "table_resol": "table_resol",
+    "table_rfact": "table_rfact",
+    "table_sc": "table_sc",
+    "table_suc": "table_suc",
+}
+
+_SUFFIXES: dict[str, ResultFormat] = {
+    ".h5": "hdf5",
+    ".hdf5": "hdf5",
+    ".nxs": "hdf5",
+    ".npz": "npz",
+    ".rec": "raw",
+    ".txt": "text",
+}
+
+# Name of results dataset in HDF5 files, and results array in NPZ files
+_DATASET = "results"
+
+
+@lru_cache(maxsize=1)
+def result_dtype() -> np_dtype[void]:
+    """Get DType of result records.
+
+    Records hold the frame number as `img`, followed by every `DataSchema`
+    field, in `DataSchema` order, and whether the frame was skipped by a
+    prefilter as `skipped`, which tells skipped frames apart from empty ones.
+
+    Returns
+    -------
+    np_dtype[void]
+        Structured DType of result records.
+    """
+    _source = DatacolPickle.record_dtype()
+    _names = {_value: _key for _key, _value in _FIELD_NAMES.items()}
+    _fields = [("img", int64)]
+    _fields.extend(
+        (_name, _source.fields[_names[_name]][0])
+        for _name in DataSchema.__annotations__
+    )
+    _fields.append(("skipped", bool_))
+    return np_dtype(_fields)
+
+
+def _result_format(path: Path, format: ResultFormat | None) -> ResultFormat:
+    """Get result format, from file suffix if undefined."""
+    if format is not None:
+        return format
+    try:
+        return _SUFFIXES[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown result file format `{path.suffix}`.") from None
+
+
+class ResultWriter:
+    """Buffered Dozor Result Writer
+
+    Results are collected into a fixed size buffer of records and written in
+    bulk whenever it fills, either appended to a chunked, compressed compound
+    dataset in an HDF5 file, saved as one array in an NPZ file when closed,
+    appended as flat binary records to a raw file, or as legacy
+    `img <frame> <NofR> <score3> <dlim09>` text lines, which do not record
+    whether frames were skipped by a prefilter.
+
+    Raw files are append only, so a file cut short by a killed process still
+    reads back every complete record, which makes them suited to partial
+    results that must survive an interrupted run.
+
+    Parameters
+    ----------
+    path : Path | str
+        Output file.
+    format : ResultFormat | None, optional
+        Output format, if undefined inferred from the file suffix,
+        by default None.
+    buffer_size : int, optional
+        Number of records buffered between writes, also the HDF5 chunk size,
+        by default 4096.
+    compression : str | None, optional
+        HDF5 compression filter, by default "gzip".
+    """
+
+    def __init__(
+        self: Self,
+        path: Path | str,
+        *,
+        format: ResultFormat | None = None,
+        buffer_size: int = 4096,
+        compression: str | None = "gzip",
+    ) -> None:
+        self._path = Path(path)
+        self._format = _result_format(self._path, format)
+        self._buffer = np_empty(max(1, buffer_size), dtype=result_dtype())
+        self._count = 0
+        self._written = 0
+        self._blocks: list[NDArray[void]] = []
+        self._file: Any = None
+        self._closed = False
+        if self._format == "hdf5":
+            self._file = H5File(self._path, "w")
+            self._file.create_dataset(
+                _DATASET,
+                shape=(0,),
+                maxshape=(None,),
+                dtype=result_dtype(),
+                chunks=(len(self._buffer),),
+                compression=compression,
+                shuffle=compression is not None,
+            )
+        elif self._format == "text":
+            self._file = open(self._path, "w")
+        elif self._format == "raw":
+            self._file = open(self._path, "wb")
+        elif self._format != "npz":
+            raise ValueError(f"Unknown result format `{self._format}`.")
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def path(self: Self) -> Path:
+        """Output file.
+
+        Returns
+        -------
+        Path
+            Output file.
+        """
+        return self._path
+
+    @property
+    def format(self: Self) -> ResultFormat:
+        """Output format.
+
+        Returns
+        -------
+        ResultFormat
+            Output format.
+        """
+        return self._format
+
+    def __len__(self: Self) -> int:
+        return self._written + self._count
+
+    def write(
+        self: Self,
+        first: int,
+        records: NDArray[void],
+        skipped: Sequence[int] | None = None,
+    ) -> None:
+        """Add results of consecutive frames.
+
+        Parameters
+        ----------
+        first : int
+            Frame number of first record.
+        records : NDArray[void]
+            Structured array of `DatacolPickle` records, as returned by
+            `Dozor.do_images`, one per frame.
+        skipped : Sequence[int] | None, optional
+            Indices of records of frames skipped by a prefilter, as collected
+            by `PrefilteredDozor.do_images`, by default None.
+        """
+        _skipped = np_zeros(len(records), dtype=bool_)
+        if skipped:
+            _skipped[list(skipped)] = True
+        _offset = 0
+        while _offset < len(records):
+            _size = min(len(records) - _offset, len(self._buffer) - self._count)
+            _target = self._buffer[slice(self._count, self._count + _size)]
+            _source = records[slice(_offset, _offset + _size)]
+            _target["img"] = np_arange(first + _offset, first + _offset + _size)
+            for _key, _name in _FIELD_NAMES.items():
+                _target[_name] = _source[_key]
+            _target["skipped"] = _skipped[slice(_offset, _offset + _size)]
+            self._count += _size
+            _offset += _size
+            if self._count == len(self._buffer):
+                self.flush()
+
+    def write_records(self: Self, records: NDArray[void]) -> None:
+        """Add result records, as returned by `read_results`.
+
+        Parameters
+        ----------
+        records : NDArray[void]
+            Structured array of `result_dtype()` records.
+        """
+        if self._count:
+            self.flush()
+        self._write(records)
+
+    def _write(self: Self, records: NDArray[void]) -> None:
+        """Write result records to the output file."""
+        if not len(records):
+            return
+        if self._format == "hdf5":
+            _dataset = self._file[_DATASET]
+            _dataset.resize((self._written + len(records),))
+            _dataset[slice(self._written, self._written + len(records))] = records
+        elif self._format == "raw":
+            self._file.write(records.tobytes())
+        elif self._format == "text":
+            self._file.writelines(
+                "img %d %d %f %f\n" % _row
+                for _row in zip(
+                    records["img"].tolist(),
+                    records["nof_r"].tolist(),
+                    records["score3"].tolist(),
+                    records["dlim09"].tolist(),
+                    strict=True,
+                )
+            )
+        else:
+            self._blocks.append(records.copy())
+        self._written += len(records)
+
+    def flush(self: Self) -> None:
+        """Write buffered results."""
+        self._write(self._buffer[: self._count])
+        self._count = 0
+        if self._format != "npz":
+            self._file.flush()
+
+    def close(self: Self) -> None:
+        """Write buffered results and close the output file."""
+        if self._closed:
+            return
+        self.flush()
+        if self._format == "npz":
+            _records = (
+                np_concatenate(self._blocks)
+                if self._blocks
+                else np_empty(0, dtype=result_dtype())
+            )
+            # Write through a file object, so the path is used as given
+            with open(self._path, "wb") as _file:
+                np_savez_compressed(_file, **{_DATASET: _records})
+            self._blocks.clear()
+        else:
+            self._file.close()
+        self._closed = True
+
+
+def read_results(path: Path | str, format: ResultFormat | None = None) -> NDArray[void]:
+    """Read results written by `ResultWriter`.
+
+    Parameters
+    ----------
+    path : Path | str
+        Result file.
+    format : ResultFormat | None, optional
+        File format, if undefined inferred from the file suffix,
+        by default None.
+
+    Returns
+    -------
+    NDArray[void]
+        Structured array of `result_dtype()` records, text files only fill
+        `img`, `nof_r`, `score3` and `dlim09`, other fields are zero.
+    """
+    path = Path(path)
+    _format = _result_format(path, format)
+    if _format == "hdf5":
+        with H5File(path, "r") as _file:
+            return _file[_DATASET][()]
+    if _format == "npz":
+        with np_load(path) as _file:
+            return _file[_DATASET]
+    if _format == "raw":
+        # Ignore an incomplete trailing record, left by an interrupted write
+        _dtype = result_dtype()
+        return np_fromfile(
+            path, dtype=_dtype, count=path.stat().st_size // _dtype.itemsize
+        )
+
+    with open(path) as _file:
+        _rows = [_line.split() for _line in _file if _line.startswith("img ")]
+    _records = np_zeros(len(_rows), dtype=result_dtype())
+    for _index, _name in enumerate(("img", "nof_r", "score3", "dlim09"), start=1):
+        _records[_name] = [_row[_index] for _row in _rows]
+    return _records
+
+
+def merge_results(
+    paths: Iterable[Path | str],
+    output: Path | str,
+    *,
+    format: ResultFormat | None = None,
+    remove: bool = False,
+    unique: bool = False,
+) -> int:
+    """Merge partial result files into a single file, ordered by frame number.
+
+    Parameters
+    ----------
+    paths : Iterable[Path | str]
+        Partial result files, each in the format given by its file suffix.
+    output : Path | str
+        Merged result file.
+    format : ResultFormat | None, optional
+        Format of merged result file, if undefined inferred from the file
+        suffix, by default None.
+    remove : bool, optional
+        Whether partial result files are removed once merged, by default False.
+    unique : bool, optional
+        Whether to keep only the first result of each frame number, for parts
+        in which frames may have been processed more than once,
+        by default False.
+
+    Returns
+    -------
+    int
+        Number of merged results.
+    """
+    paths = [Path(_path) for _path in paths]
+    _parts = [read_results(_path) for _path in paths]
+    _records = np_concatenate(_parts) if _parts else np_empty(0, dtype=result_dtype())
+    if unique:
+        _, _first = np_unique(_records["img"], return_index=True)
+        _records = _records[_first]
+    else:
+        _records = _records[np_argsort(_records["img"], kind="stable")]
+    with ResultWriter(
+        output, format=format, buffer_size=max(1, min(len(_records), 1 << 16))
+    ) as _writer:
+        _writer.write_records(_records)
+    if remove:
+        for _path in paths:
+            if _path != Path(output):
+                os_remove(_path)
+    return len(_records)
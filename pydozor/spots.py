@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Self
+
+from h5py import File as H5File
+from numpy import (
+    concatenate as np_concatenate,
+    dtype as np_dtype,
+    empty as np_empty,
+    float32,
+    int64,
+    searchsorted as np_searchsorted,
+)
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from numpy import void
+    from numpy.typing import NDArray
+
+__all__ = ("write_adx", "SpotWriter", "read_spots")
+
+# Spot index records, frame number and range of its spots in the spot dataset
+_INDEX_DTYPE = np_dtype([("img", int64), ("offset", int64), ("count", int64)])
+
+
+def _columns(spots: NDArray[Any]) -> tuple[NDArray[Any], NDArray[Any], NDArray[Any]]:
+    """Get x, y and intensity columns of structured or `(n, 3)` spots."""
+    if spots.dtype.names is not None:
+        return spots["x"], spots["y"], spots["intensity"]
+    return spots[:, 0], spots[:, 1], spots[:, 2]
+
+
+def write_adx(path: Path | str, spots: NDArray[Any]) -> None:
+    """Write spots to an ADX file in a single write.
+
+    Parameters
+    ----------
+    path : Path | str
+        ADX file.
+    spots : NDArray[Any]
+        Spots, as returned by `Dozor.get_spot_list`.
+    """
+    _x, _y, _intensity = _columns(spots)
+    with open(path, "w") as _file:
+        _file.write(
+            "".join(
+                "%d %d %f 1 1\n" % _row
+                for _row in zip(
+                    _x.tolist(), _y.tolist(), _intensity.tolist(), strict=True
+                )
+            )
+        )
+
+
+class SpotWriter:
+    """Buffered HDF5 Spot Writer
+
+    Spots of many frames are appended to one chunked, compressed `spots`
+    dataset of `(n, 3)` float32 rows, as `x`, `y` and `intensity`, with an
+    `index` dataset holding the frame number, offset and count of the spots
+    of each frame. Spots are buffered and written in bulk.
+
+    Parameters
+    ----------
+    path : Path | str
+        Output file.
+    buffer_size : int, optional
+        Number of spots buffered between writes, also the HDF5 chunk size,
+        by default 65536.
+    compression : str | None, optional
+        HDF5 compression filter, by default "gzip".
+    """
+
+    def __init__(
+        self: Self,
+        path: Path | str,
+        *,
+        buffer_size: int = 1 << 16,
+        compression: str | None = "gzip",
+    ) -> None:
+        self._buffer_size = max(1, buffer_size)
+        self._spots: list[NDArray[float32]] = []
+        self._index: list[tuple[int, int, int]] = []
+        self._buffered = 0
+        self._written = 0
+        self._file = H5File(path, "w")
+        self._file.create_dataset(
+            "spots",
+            shape=(0, 3),
+            maxshape=(None, 3),
+            dtype=float32,
+            chunks=(self._buffer_size, 3),
+            compression=compression,
+            shuffle=compression is not None,
+        )
+        self._file.create_dataset(
+            "index",
+            shape=(0,),
+            maxshape=(None,),
+            dtype=_INDEX_DTYPE,
+            chunks=(4096,),
+            compression=compression,
+        )
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def write(self: Self, img: int, spots: NDArray[Any]) -> None:
+        """Add spots of a frame.
+
+        Parameters
+        ----------
+        img : int
+            Frame number.
+        spots : NDArray[Any]
+            Spots, as returned by `Dozor.get_spot_list`, copied into the
+            buffer.
+        """
+        _rows = np_empty((len(spots), 3), dtype=float32)
+        for _column, _values in enumerate(_columns(spots)):
+            _rows[:, _column] = _values
+        self._index.append((img, self._written + self._buffered, len(_rows)))
+        self._spots.append(_rows)
+        self._buffered += len(_rows)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def flush(self: Self) -> None:
+        """Write buffered spots."""
+        if self._spots:
+            _spots = self._file["spots"]
+            _spots.resize((self._written + self._buffered, 3))
+            _spots[slice(self._written, self._written + self._buffered)] = (
+                np_concatenate(self._spots)
+            )
+            self._written += self._buffered
+            self._buffered = 0
+            self._spots.clear()
+        if self._index:
+            _index = self._file["index"]
+            _start = len(_index)
+            _index.resize((_start + len(self._index),))
+            _records = np_empty(len(self._index), dtype=_INDEX_DTYPE)
+            _records[:] = self._index
+            _index[slice(_start, _start + len(_records))] = _records
+            self._index.clear()
+        self._file.flush()
+
+    def close(self: Self) -> None:
+        """Write buffered spots and close the output file."""
+        if self._file.id.valid:
+            self.flush()
+            self._file.close()
+
+
+def read_spots(
+    path: Path | str,
+    img: int | None = None,
+) -> NDArray[float32] | tuple[NDArray[void], NDArray[float32]]:
+    """Read spots written by `SpotWriter`.
+
+    Parameters
+    ----------
+    path : Path | str
+        Spot file.
+    img : int | None, optional
+        Frame number to read spots of, if undefined all spots are read,
+        by default None.
+
+    Returns
+    -------
+    NDArray[float32] | tuple[NDArray[void], NDArray[float32]]
+        Spots of frame `img`, as an `(n, 3)` array, or if `img` is undefined
+        the index records, with fields `img`, `offset` and `count`, and all
+        spots.
+    """
+    with H5File(path, "r") as _file:
+        _index = _file["index"][()]
+        if img is None:
+            return _index, _file["spots"][()]
+        _order = _index["img"].argsort(kind="stable")
+        _position = np_searchsorted(_index["img"], img, sorter=_order)
+        if _position == len(_index) or _index["img"][_order[_position]] != img:
+            return np_empty((0, 3), dtype=float32)
+        _record = _index[_order[_position]]
+        _offset, _count = int(_record["offset"]), int(_record["count"])
+        return _file["spots"][slice(_offset, _offset + _count)]
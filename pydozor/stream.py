@@ -0,0 +1,572 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future
+from json import dumps as json_dumps, loads as json_loads
+from os import remove as os_remove
+from os.path import exists as os_exists
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from socket import AF_INET, AF_UNIX, SOCK_STREAM, socket
+from struct import Struct
+from threading import BoundedSemaphore, Event, Thread
+from time import monotonic
+from typing import TYPE_CHECKING, Any, NamedTuple, Self
+
+from bitshuffle import compress_lz4, decompress_lz4
+from numpy import (
+    copyto as np_copyto,
+    dtype as np_dtype,
+    empty as np_empty,
+    frombuffer as np_frombuffer,
+    uint8,
+)
+
+from .mask import PixelMask
+from .pool import DozorThreadPool
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from numpy.typing import NDArray
+
+    from .schemas import DataSchema
+
+__all__ = (
+    "Address",
+    "StreamResult",
+    "FrameSource",
+    "IteratorSource",
+    "SocketSource",
+    "StreamProducer",
+    "StreamPipeline",
+)
+
+# Unix socket path, or TCP host and port
+Address = str | tuple[str, int]
+
+# Message framing, number of parts, then the byte length of each part
+_PARTS = Struct("!I")
+_LENGTH = Struct("!Q")
+
+# Header of bitshuffle LZ4 data, 8 byte uncompressed size and 4 byte block size
+_BSHUF_HEADER = 12
+
+# Bitshuffle block size used by the stand-in producer, in bytes
+_BSHUF_BLOCK = 8192
+
+
+class StreamResult(NamedTuple):
+    """Streamed Frame Result"""
+
+    index: int
+    data: DataSchema
+    hit: bool
+    latency: float
+
+
+def _connect(address: Address) -> socket:
+    """Connect to a Unix socket path or TCP address."""
+    _socket = socket(AF_UNIX if isinstance(address, str) else AF_INET, SOCK_STREAM)
+    try:
+        _socket.connect(address)
+    except BaseException:
+        _socket.close()
+        raise
+    return _socket
+
+
+def _recv_into(connection: socket, view: memoryview) -> bool:
+    """Receive exactly `len(view)` bytes, `False` if closed before any byte."""
+    _received = 0
+    while _received < len(view):
+        _count = connection.recv_into(view[_received:])
+        if not _count:
+            if _received:
+                raise ConnectionError("Stream closed in the middle of a message.")
+            return False
+        _received += _count
+    return True
+
+
+class FrameSource(ABC):
+    """Frame Source Base Class
+
+    Sources yield frame numbers and frames decoded into pooled buffers, which
+    are handed back with `release` once processed and reused for later
+    frames.
+
+    Parameters
+    ----------
+    buffers : int, optional
+        Maximum number of idle buffers kept for reuse, by default 64.
+    """
+
+    def __init__(self: Self, buffers: int = 64) -> None:
+        self._max_buffers = buffers
+        self._buffers: dict[tuple[tuple[int, ...], str], SimpleQueue[Any]] = {}
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @abstractmethod
+    def __iter__(self: Self) -> Iterator[tuple[int, NDArray[Any]]]:
+        """Iterate over frames of the source.
+
+        Yields
+        ------
+        tuple[int, NDArray[Any]]
+            Frame number and frame, in a buffer to hand back with `release`.
+        """
+
+    def _acquire(self: Self, shape: tuple[int, ...], dtype: Any) -> NDArray[Any]:
+        """Get reusable buffer of shape and DType."""
+        _queue = self._buffers.get((shape, np_dtype(dtype).str))
+        if _queue is not None:
+            try:
+                return _queue.get_nowait()
+            except Empty:
+                pass
+        return np_empty(shape, dtype=dtype)
+
+    def release(self: Self, frame: NDArray[Any]) -> None:
+        """Return frame buffer to the source for reuse.
+
+        Parameters
+        ----------
+        frame : NDArray[Any]
+            Frame yielded by the source, must no longer be used.
+        """
+        _base = frame.base if frame.base is not None else frame
+        if not getattr(_base, "flags", None) or not _base.flags.owndata:
+            return
+        _queue = self._buffers.setdefault((_base.shape, _base.dtype.str), SimpleQueue())
+        if _queue.qsize() < self._max_buffers:
+            _queue.put(_base)
+
+    def close(self: Self) -> None:
+        """Stop the source and release its resources."""
+        self._buffers.clear()
+
+
+class IteratorSource(FrameSource):
+    """Frame Source From A Python Iterable
+
+    Frames are copied into pooled buffers, so frames of the iterable are never
+    modified by processing.
+
+    Parameters
+    ----------
+    frames : Iterable[NDArray[Any]]
+        Frames, consumed lazily.
+    start : int, optional
+        Number of the first frame, by default 1.
+    buffers : int, optional
+        Maximum number of idle buffers kept for reuse, by default 64.
+    """
+
+    def __init__(
+        self: Self,
+        frames: Iterable[NDArray[Any]],
+        start: int = 1,
+        *,
+        buffers: int = 64,
+    ) -> None:
+        super().__init__(buffers)
+        self._frames = frames
+        self._start = start
+
+    def __iter__(self: Self) -> Iterator[tuple[int, NDArray[Any]]]:
+        for _index, _frame in enumerate(self._frames, start=self._start):
+            _buffer = self._acquire(_frame.shape, _frame.dtype)
+            np_copyto(_buffer, _frame)
+            yield _index, _buffer
+
+
+class SocketSource(FrameSource):
+    """Frame Source From A Stream Socket
+
+    Receives Dectris stream style messages from a Unix or TCP socket. Each
+    message is a number of parts, each prefixed by its byte length, the first
+    part is a JSON header with an `htype` of `dheader-1.0`, `dimage-1.0` or
+    `dseries_end-1.0`. Image messages carry a `dimage_d-1.0` JSON part with
+    frame `shape`, as `[nx, ny]`, `type` and `encoding`, followed by the frame
+    data, either raw little endian (`<`) or bitshuffle LZ4 (`bs<bits>-lz4<`).
+
+    Iteration ends with the first `dseries_end-1.0` message, or when the
+    producer closes the connection.
+
+    Parameters
+    ----------
+    address : Address
+        Unix socket path, or TCP host and port, of the producer.
+    buffers : int, optional
+        Maximum number of idle buffers kept for reuse, by default 64.
+    """
+
+    def __init__(self: Self, address: Address, *, buffers: int = 64) -> None:
+        super().__init__(buffers)
+        self._socket = _connect(address)
+        self._scratch = bytearray(1 << 16)
+
+    def _receive(self: Self) -> list[memoryview] | None:
+        """Receive one message, as views of its parts, `None` once closed.
+
+        Parts are only valid until the next message is received.
+        """
+        _header = bytearray(_PARTS.size)
+        if not _recv_into(self._socket, memoryview(_header)):
+            return None
+        (_count,) = _PARTS.unpack(_header)
+        _lengths = bytearray(_LENGTH.size * _count)
+        _recv_into(self._socket, memoryview(_lengths))
+        _sizes = [
+            _LENGTH.unpack_from(_lengths, _LENGTH.size * _i)[0] for _i in range(_count)
+        ]
+        if sum(_sizes) > len(self._scratch):
+            self._scratch = bytearray(sum(_sizes))
+        _view = memoryview(self._scratch)
+        _recv_into(self._socket, _view[: sum(_sizes)])
+        _parts = []
+        _offset = 0
+        for _size in _sizes:
+            _parts.append(_view[slice(_offset, _offset + _size)])
+            _offset += _size
+        return _parts
+
+    def _decode(self: Self, detail: dict[str, Any], data: memoryview) -> NDArray[Any]:
+        """Decode frame data into a buffer."""
+        _shape = (int(detail["shape"][1]), int(detail["shape"][0]))
+        _dtype = np_dtype(detail["type"]).newbyteorder("<")
+        _encoding: str = detail.get("encoding", "<")
+        if _encoding == "<":
+            _frame = self._acquire(_shape, _dtype)
+            np_copyto(_frame.reshape(-1), np_frombuffer(data, dtype=_dtype))
+            return _frame
+        if _encoding.startswith("bs") and _encoding.endswith("-lz4<"):
+            _raw = np_frombuffer(data, dtype=uint8)
+            _block_size = int.from_bytes(data[8:_BSHUF_HEADER], "big")
+            return decompress_lz4(
+                _raw[_BSHUF_HEADER:],
+                _shape,
+                _dtype,
+                _block_size // _dtype.itemsize,
+            )
+        raise ValueError(f"Unsupported stream encoding `{_encoding}`.")
+
+    def __iter__(self: Self) -> Iterator[tuple[int, NDArray[Any]]]:
+        while (_parts := self._receive()) is not None:
+            _header = json_loads(bytes(_parts[0]))
+            _htype = _header.get("htype", "")
+            if _htype.startswith("dseries_end"):
+                return
+            if not _htype.startswith("dimage-"):
+                continue
+            _detail = json_loads(bytes(_parts[1]))
+            # Dectris frame numbers start at 0
+            yield int(_header["frame"]) + 1, self._decode(_detail, _parts[2])
+
+    def close(self: Self) -> None:
+        """Close the connection to the producer."""
+        self._socket.close()
+        super().close()
+
+
+class StreamProducer:
+    """Local Stand-In For A Detector Stream
+
+    Listens on a Unix or TCP socket, and once a consumer connects sends a
+    series header, one image message per frame and a series end message,
+    in the framing read by `SocketSource`, from a background thread.
+
+    Parameters
+    ----------
+    address : Address
+        Unix socket path, or TCP host and port, to listen on, a TCP port of 0
+        picks a free port.
+    frames : Iterable[NDArray[Any]]
+        Frames to send.
+    encoding : str, optional
+        Frame data encoding, "<" or "bslz4", by default "bslz4".
+    series : int, optional
+        Series number, by default 1.
+    """
+
+    def __init__(
+        self: Self,
+        address: Address,
+        frames: Iterable[NDArray[Any]],
+        *,
+        encoding: str = "bslz4",
+        series: int = 1,
+    ) -> None:
+        if encoding not in ("<", "bslz4"):
+            raise ValueError(f"Unsupported stream encoding `{encoding}`.")
+        self._frames = frames
+        self._encoding = encoding
+        self._series = series
+        self._path = address if isinstance(address, str) else None
+        if self._path is not None and os_exists(self._path):
+            os_remove(self._path)
+        self._socket = socket(
+            AF_UNIX if isinstance(address, str) else AF_INET, SOCK_STREAM
+        )
+        self._socket.bind(address)
+        self._socket.listen(1)
+        self._thread = Thread(target=self._run, name="stream-producer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def address(self: Self) -> Address:
+        """Address consumers connect to.
+
+        Returns
+        -------
+        Address
+            Unix socket path, or TCP host and port.
+        """
+        return self._socket.getsockname()
+
+    def _message(self: Self, connection: socket, *parts: bytes) -> None:
+        """Send one message."""
+        _chunks = [_PARTS.pack(len(parts))]
+        _chunks.extend(_LENGTH.pack(len(_part)) for _part in parts)
+        _chunks.extend(parts)
+        connection.sendall(b"".join(_chunks))
+
+    def _run(self: Self) -> None:
+        """Serve the stream to the first consumer."""
+        try:
+            _connection, _ = self._socket.accept()
+        except OSError:
+            return
+        with _connection:
+            self._message(
+                _connection,
+                json_dumps({"htype": "dheader-1.0", "series": self._series}).encode(),
+            )
+            for _index, _frame in enumerate(self._frames):
+                _frame = _frame.astype(_frame.dtype.newbyteorder("<"), copy=False)
+                if self._encoding == "bslz4":
+                    _bits = 8 * _frame.dtype.itemsize
+                    _encoding = f"bs{_bits}-lz4<"
+                    _compressed = compress_lz4(
+                        _frame, _BSHUF_BLOCK // _frame.dtype.itemsize
+                    )
+                    _data = b"".join(
+                        (
+                            _frame.nbytes.to_bytes(8, "big"),
+                            _BSHUF_BLOCK.to_bytes(4, "big"),
+                            _compressed.tobytes(),
+                        )
+                    )
+                else:
+                    _encoding = "<"
+                    _data = _frame.tobytes()
+                self._message(
+                    _connection,
+                    json_dumps(
+                        {"htype": "dimage-1.0", "series": self._series, "frame": _index}
+                    ).encode(),
+                    json_dumps(
+                        {
+                            "htype": "dimage_d-1.0",
+                            "shape": [_frame.shape[1], _frame.shape[0]],
+                            "type": _frame.dtype.name,
+                            "encoding": _encoding,
+                        }
+                    ).encode(),
+                    _data,
+                )
+            self._message(
+                _connection,
+                json_dumps(
+                    {"htype": "dseries_end-1.0", "series": self._series}
+                ).encode(),
+            )
+
+    def join(self: Self, timeout: float | None = None) -> None:
+        """Wait for the stream to be sent.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Maximum time to wait, in seconds, by default None.
+        """
+        self._thread.join(timeout)
+
+    def close(self: Self) -> None:
+        """Stop listening, and remove the Unix socket file."""
+        self._socket.close()
+        if self._path is not None and os_exists(self._path):
+            os_remove(self._path)
+
+
+class StreamPipeline:
+    """Live Frame Stream Processing Pipeline
+
+    Frames are pulled from a frame source by a feeder thread as they arrive,
+    and saturated to uint16 in place and processed on a `DozorThreadPool`.
+    Results are yielded in completion order as soon as each frame is
+    processed, independently of the arrival of later frames, and frame
+    buffers are handed back to the source for reuse.
+
+    Parameters
+    ----------
+    config_file : Path
+        Dozor config file.
+    source : FrameSource
+        Frame source.
+    max_workers : int | None, optional
+        Number of worker threads, if undefined the CPU count is used,
+        by default None.
+    mask : PixelMask | None, optional
+        Pixel mask, by default None.
+    cut_off : float, optional
+        Minimum `score3` of a hit, by default 5.
+    fields : Iterable[str] | None, optional
+        Names of output fields to decode, if undefined `NofR`, `score3` and
+        `dlim09`, by default None.
+    max_in_flight : int | None, optional
+        Maximum number of frames received but not yet processed, if undefined
+        twice the number of workers, by default None.
+    """
+
+    def __init__(
+        self: Self,
+        config_file: Path,
+        source: FrameSource,
+        max_workers: int | None = None,
+        *,
+        mask: PixelMask | None = None,
+        cut_off: float = 5,
+        fields: Iterable[str] | None = None,
+        max_in_flight: int | None = None,
+    ) -> None:
+        self._source = source
+        self._cut_off = cut_off
+        self._fields = (
+            tuple(fields) if fields is not None else ("NofR", "score3", "dlim09")
+        )
+        if "score3" not in self._fields:
+            self._fields += ("score3",)
+        self._pool = DozorThreadPool(
+            config_file,
+            max_workers,
+            mask=mask,
+            max_in_flight=max_in_flight,
+            convert=True,
+        )
+        self._max_in_flight = max_in_flight or 2 * self._pool.max_workers
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(
+        self: Self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _feed(self: Self, results: SimpleQueue[Any], stop: Event) -> None:
+        """Submit frames from the source as they arrive, from a feeder thread."""
+        _slots = BoundedSemaphore(self._max_in_flight)
+        _count = 0
+        try:
+            for _index, _frame in self._source:
+                _received = monotonic()
+                _slots.acquire()
+                if stop.is_set():
+                    return
+
+                def _done(
+                    future: Future[Any],
+                    index: int = _index,
+                    frame: NDArray[Any] = _frame,
+                    received: float = _received,
+                ) -> None:
+                    _slots.release()
+                    results.put((future, index, frame, received))
+
+                self._pool.submit(_frame, fields=self._fields).add_done_callback(_done)
+                _count += 1
+            results.put((None, _count, None, None))
+        except Exception as _error:
+            results.put((None, _count, _error, None))
+
+    def __iter__(self: Self) -> Iterator[StreamResult]:
+        _results: SimpleQueue[Any] = SimpleQueue()
+        _stop = Event()
+        Thread(
+            target=self._feed,
+            args=(_results, _stop),
+            name="stream-feeder",
+            daemon=True,
+        ).start()
+        _yielded = 0
+        _total: int | None = None
+        try:
+            while _total is None or _yielded < _total:
+                _future, _index, _frame, _received = _results.get()
+                if _future is None:
+                    if _frame is not None:
+                        raise _frame
+                    _total = _index
+                    continue
+                _yielded += 1
+                self._source.release(_frame)
+                _, _data = _future.result()
+                yield StreamResult(
+                    _index,
+                    _data,
+                    _data["score3"] > self._cut_off,
+                    monotonic() - _received,
+                )
+        finally:
+            _stop.set()
+
+    def run(self: Self, callback: Callable[[StreamResult], Any]) -> int:
+        """Process the stream, calling back with each result.
+
+        Parameters
+        ----------
+        callback : Callable[[StreamResult], Any]
+            Called with the result of each frame, in completion order.
+
+        Returns
+        -------
+        int
+            Number of frames processed.
+        """
+        _count = 0
+        for _result in self:
+            callback(_result)
+            _count += 1
+        return _count
+
+    def close(self: Self) -> None:
+        """Shut down worker threads and close the frame source."""
+        self._pool.close()
+        self._source.close()
@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+from math import prod
 from pathlib import Path
-from tempfile import mkdtemp
+from threading import local
+from time import perf_counter
 from typing import TYPE_CHECKING, Any, overload
 
-from numpy import uint16, unsignedinteger, where as np_where
+from numpy import (
+    ascontiguousarray as np_ascontiguousarray,
+    bool_,
+    copyto as np_copyto,
+    empty as np_empty,
+    greater as np_greater,
+    less as np_less,
+    minimum as np_minimum,
+    ndarray,
+    uint16,
+    unsignedinteger,
+)
 from pydantic import NewPath, validate_call
 
-from .dozor import Dozor
+from . import metrics
+from .cache import DozorCache, default_cache
+from .config_store import default_store
+from .mask import PixelMask
 from .schemas import DatacolSchema, DataSchema, DozorConfig
 
 if TYPE_CHECKING:
@@ -16,35 +32,129 @@ if TYPE_CHECKING:
 __all__ = ("create_config_file", "call_dozor")
 
 
+# Pixels converted per block, keeps block temporaries small enough for cache
+_BLOCK_SIZE = 1 << 16
+
+_frame_buffers = local()
+
+
+def _frame_buffer(shape: tuple[int, ...]) -> NDArray[uint16]:
+    """Get reusable `uint16` frame buffer for the current thread.
+
+    Parameters
+    ----------
+    shape : tuple[int, ...]
+        Frame shape.
+
+    Returns
+    -------
+    NDArray[uint16]
+        Uninitialised frame buffer, reused by later calls with the same shape.
+    """
+    _buffer: NDArray[uint16] | None = getattr(_frame_buffers, "buffer", None)
+    if _buffer is None or _buffer.shape != shape:
+        _buffer = _frame_buffers.buffer = np_empty(shape, dtype=uint16)
+    return _buffer
+
+
 def _convert_to_uint16(
     array: NDArray[unsignedinteger[Any]],
     pixel_max: int,
+    *,
+    mask: NDArray[Any] | PixelMask | None = None,
+    out: NDArray[uint16] | None = None,
+    inplace: bool = False,
 ) -> NDArray[uint16]:
     """Convert array to DType `uint16`.
 
+    Counts above 65534 but not above `pixel_max` saturate to 65534, counts
+    above `pixel_max` and masked pixels are set to 65535. Conversion and
+    masking are fused into a single blockwise pass, without full size
+    temporaries.
+
     Parameters
     ----------
     array : NDArray[unsignedinteger[Any]]
         Array with any unsigned integer DType.
     pixel_max : int
         Max pixel value.
+    mask : NDArray[Any] | PixelMask | None, optional
+        Pixel mask, for arrays pixels with a negative value are masked,
+        by default None.
+    out : NDArray[uint16] | None, optional
+        Output buffer, if undefined a new array is allocated, by default None.
+    inplace : bool, optional
+        Whether to convert within the memory of `array`, destroying its
+        contents, takes precedence over `out`. Arrays narrower than `uint16`
+        can not be converted in place, by default False.
 
     Returns
     -------
     NDArray[uint16]
         Array with DType `uint16`.
     """
-    if array.dtype < uint16:
-        array = array.astype(uint16)
-    elif array.dtype > uint16:
-        # if count is over 65534 and below max_count, set to the max value for uint16
-        array[(array > 65534) & (array <= pixel_max)] = 65534
-        array[array > pixel_max] = 65535
-        array = array.astype(uint16)
-    return array
+    _metrics = metrics._active
+    if _metrics is not None:
+        _start = perf_counter()
+    array = np_ascontiguousarray(array)
+    _size = array.size
+    inplace = inplace and array.dtype.itemsize >= 2
+    if inplace:
+        # Output elements never overlap later input elements, see below
+        out = array.reshape(-1).view(uint16)[:_size].reshape(array.shape)
+    elif out is None:
+        out = np_empty(array.shape, dtype=uint16)
+    elif out.shape != array.shape or out.dtype != uint16:
+        raise ValueError("Array `out` must match frame shape, with DType `uint16`.")
+
+    _wide = array.dtype.itemsize > 2
+    _src = array.reshape(-1)
+    _dst = out.reshape(-1)
+    _mask = mask.reshape(-1) if isinstance(mask, ndarray) else None
+    _scratch = np_empty(min(_BLOCK_SIZE, _size), dtype=bool_)
+    for _offset in range(0, _size, _BLOCK_SIZE):
+        _stop = min(_offset + _BLOCK_SIZE, _size)
+        _src_block = _src[_offset:_stop]
+        _dst_block = _dst[_offset:_stop]
+        _over = _scratch[: _stop - _offset]
+        if _wide:
+            # Find overflows before writing, when converting in place the
+            # first output block overlaps the first input block
+            np_greater(_src_block, pixel_max, out=_over)
+            np_minimum(_src_block, 65534, out=_dst_block, casting="unsafe")
+            np_copyto(_dst_block, 65535, where=_over)
+        elif not inplace:
+            np_copyto(_dst_block, _src_block, casting="unsafe")
+        if _mask is not None:
+            np_less(_mask[_offset:_stop], 0, out=_over)
+            np_copyto(_dst_block, 65535, where=_over)
+    if isinstance(mask, PixelMask):
+        mask.apply(out)
+    if _metrics is not None:
+        _metrics.observe(
+            "convert",
+            perf_counter() - _start,
+            frames=prod(array.shape[:-2]),
+            nbytes=array.nbytes,
+        )
+    return out
 
 
 @validate_call
+def _create_config_file(
+    config: DozorConfig,
+    *,
+    path: NewPath | None = None,
+) -> Path:
+    """Create Dozor config file, with validated arguments."""
+    if path is None:
+        return default_store.path(config)
+
+    with open(path, "w") as _file:
+        _file.write(config.model_dump())
+    return path
+
+
 def create_config_file(
     config: DozorConfig,
     *,
@@ -57,41 +167,93 @@ def create_config_file(
     config : DozorConfig
         Dozor configuration to be written to disk.
     path : NewPath | None, optional
-        Path to create Dozor config file at, if undefined a `dozor.dat` file
-        will be created under a new temporary directory, by default None.
+        Path to create Dozor config file at, if undefined the file of the
+        config in the default `ConfigStore` is used, written only if no
+        identical config was stored before, and removed once many other
+        configs are stored after it, by default None.
 
     Returns
     -------
     Path
         File path to created Dozor config file.
     """
-    if path is None:
-        path = Path(f"{mkdtemp()}/dozor.dat")
-
-    with open(path, "w") as _file:
-        _file.write(config.model_dump())
-    return path
+    if path is None and isinstance(config, DozorConfig):
+        # Already validated, skip argument validation
+        return default_store.path(config)
+    return _create_config_file(config, path=path)
 
 
 @overload
 def call_dozor(  # noqa: E704
-    mask: NDArray[unsignedinteger[Any]],
+    mask: NDArray[Any] | PixelMask | None,
     frame: NDArray[unsignedinteger[Any]],
     config_file: Path,
+    *,
+    cache: DozorCache | None = None,
+    out: NDArray[uint16] | None = None,
+    inplace: bool = False,
 ) -> tuple[DatacolSchema, DataSchema]: ...
 
 
 def call_dozor(
-    mask: NDArray[unsignedinteger[Any]],
+    mask: NDArray[Any] | PixelMask | None,
     frame: NDArray[unsignedinteger[Any]],
     config_file: Path,
+    *,
+    cache: DozorCache | None = None,
+    out: NDArray[uint16] | None = None,
+    inplace: bool = False,
 ) -> tuple[DatacolSchema, DataSchema]:
-    """ """
-    _dozor_wrapper = Dozor(config_file)
+    """Process a frame with Dozor.
+
+    Initialized Dozor engines are reused between calls through an LRU cache
+    keyed on the contents of the config file. Calls from different threads
+    with the same config take turns on its engine.
+
+    Parameters
+    ----------
+    mask : NDArray[Any] | PixelMask | None
+        Pixel mask, either a compiled `PixelMask`, or an array in which pixels
+        with a negative value are masked.
+    frame : NDArray[unsignedinteger[Any]]
+        Frame to process.
+    config_file : Path
+        Dozor config file.
+    cache : DozorCache | None, optional
+        Engine cache to use, if undefined the module default cache is used,
+        by default None.
+    out : NDArray[uint16] | None, optional
+        Buffer to write the converted and masked frame into, if undefined a
+        reusable per-thread buffer is used, by default None.
+    inplace : bool, optional
+        Whether to convert and mask the frame within its own memory, instead
+        of a separate buffer, the original frame contents are not kept,
+        by default False.
 
-    _np_frame = _convert_to_uint16(frame.copy(), _dozor_wrapper.pixel_max)
+    Returns
+    -------
+    tuple[DatacolSchema, DataSchema]
+        Decoded output from `dozor_do_image`.
+    """
+    _metrics = metrics._active
+    if _metrics is not None:
+        _start = perf_counter()
+    if cache is None:
+        cache = default_cache
+    _dozor_wrapper, _engine_lock = cache.get_with_lock(config_file)
 
-    # _np_frame = _np_frame * mask
-    _np_frame[np_where(mask < 0)] = 65535
+    if out is None and not inplace:
+        out = _frame_buffer(frame.shape)
+    _np_frame = _convert_to_uint16(
+        frame,
+        _dozor_wrapper.pixel_max,
+        mask=mask,
+        out=out,
+        inplace=inplace,
+    )
 
-    return _dozor_wrapper.do_image(_np_frame)
+    with _engine_lock:
+        _results = _dozor_wrapper.do_image(_np_frame)
+    if _metrics is not None:
+        _metrics.observe("call_dozor", perf_counter() - _start, frames=1)
+    return _results
@@ -0,0 +1,160 @@
+"""Test fixtures, backed by the stub libdozor of the benchmarks.
+
+The stub exports the same `dozor_*` symbols as libdozor.so, and derives
+deterministic results from a strided sample of each frame, so the Python side
+of pydozor can be tested without the Fortran library. It is compiled with the
+C compiler from `$CC` before any test module imports pydozor.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import h5py
+import pytest
+from numpy import random as np_random, uint32, zeros as np_zeros
+
+ROOT = Path(__file__).resolve().parent.parent
+STUB_SOURCE = ROOT / "benchmarks" / "stub" / "libdozor_stub.c"
+
+# Frame shape of test data, as `(ny, nx)`, and count cutoff
+SHAPE = (64, 96)
+PIXEL_MAX = 64000
+
+_build_dir: str | None = None
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    global _build_dir
+    _build_dir = mkdtemp(prefix="pydozor-test-")
+    _lib = os.path.join(_build_dir, "libdozor_stub.so")
+    subprocess.run(
+        [
+            os.environ.get("CC", "cc"),
+            "-O2",
+            "-shared",
+            "-fPIC",
+            "-o",
+            _lib,
+            str(STUB_SOURCE),
+        ],
+        check=True,
+    )
+    # Inherited by worker processes, the API mode bindings link the real library
+    os.environ["LIB_DOZOR_PATH"] = _lib
+    os.environ["PYDOZOR_BACKEND"] = "abi"
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    if _build_dir is not None:
+        rmtree(_build_dir, ignore_errors=True)
+
+
+def make_frames(count: int, seed: int = 0):
+    """Generate frames with a Poisson background, peaks and overloads."""
+    _rng = np_random.default_rng(seed)
+    _frames = _rng.poisson(0.5, (count, *SHAPE)).astype(uint32)
+    for _frame in _frames:
+        _peaks = _rng.integers(0, 60)
+        _y = _rng.integers(0, SHAPE[0], _peaks)
+        _x = _rng.integers(0, SHAPE[1], _peaks)
+        _frame[_y, _x] = _rng.integers(200, 2 * PIXEL_MAX, _peaks)
+    # Module gap, as written by the detector
+    _frames[:, 31] = 2**32 - 1
+    return _frames
+
+
+def make_mask(seed: int = 0):
+    """Generate an Eiger style pixel mask, nonzero pixels are bad."""
+    _rng = np_random.default_rng(seed)
+    _mask = np_zeros(SHAPE, dtype=uint32)
+    _mask[31] = 1
+    _mask.reshape(-1)[_rng.random(_mask.size) < 0.05] = 2
+    return _mask
+
+
+def make_config(**overrides):
+    """Generate the Dozor config of test frames."""
+    from pydozor import DozorConfig
+
+    _fields = dict(
+        spot_size=3,
+        spot_level=6,
+        ix_min=0,
+        ix_max=0,
+        iy_min=0,
+        iy_max=0,
+        detector="eiger",
+        nx=SHAPE[1],
+        ny=SHAPE[0],
+        pixel=0.075,
+        fraction_polarization=0.99,
+        pixel_min=0,
+        pixel_max=PIXEL_MAX,
+        exposure=0.01,
+        detector_distance=200.0,
+        wavelength=1.0,
+        org_x=SHAPE[1] // 2,
+        org_y=SHAPE[0] // 2,
+        oscillation_range=0.1,
+        image_step=0.1,
+        starting_angle=0.0,
+    )
+    _fields.update(overrides)
+    return DozorConfig(**_fields)
+
+
+@pytest.fixture(scope="session")
+def config_file(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    from pydozor import create_config_file
+
+    return create_config_file(
+        make_config(), path=tmp_path_factory.mktemp("config") / "dozor.dat"
+    )
+
+
+@pytest.fixture(scope="session")
+def frames():
+    return make_frames(48)
+
+
+@pytest.fixture(scope="session")
+def eiger_mask():
+    return make_mask()
+
+
+def write_master(directory: Path, frames, pixel_mask, **options) -> Path:
+    """Write an Eiger dataset of frames, in data containers of 20 frames.
+
+    Data containers are chunked by 4 frames, `options` are passed on to
+    `create_dataset`, e.g. for compression.
+    """
+    _master = directory / "test_master.h5"
+    with h5py.File(_master, "w") as _file:
+        _specific = _file.create_group("/entry/instrument/detector/detectorSpecific")
+        _specific["nimages"] = len(frames)
+        _specific["ntrigger"] = 1
+        _specific["pixel_mask"] = pixel_mask
+        for _index, _first in enumerate(range(0, len(frames), 20), start=1):
+            _name = "test_data_%06d.h5" % _index
+            with h5py.File(directory / _name, "w") as _data:
+                _data.create_dataset(
+                    "/entry/data/data",
+                    data=frames[slice(_first, _first + 20)],
+                    chunks=(4, *SHAPE),
+                    **options,
+                )
+            _file["/entry/data/data_%06d" % _index] = h5py.ExternalLink(
+                _name, "/entry/data/data"
+            )
+    return _master
+
+
+@pytest.fixture(scope="session")
+def master_file(tmp_path_factory: pytest.TempPathFactory, frames, eiger_mask) -> Path:
+    """Uncompressed Eiger dataset of `frames`."""
+    return write_master(tmp_path_factory.mktemp("eiger"), frames, eiger_mask)
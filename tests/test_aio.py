@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import time
+from asyncio import gather, run
+from threading import Lock
+
+import pytest
+from numpy import allclose as np_allclose
+
+from pydozor import Dozor
+from pydozor.aio import AsyncDozor
+from pydozor.pool import DozorThreadPool
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX
+
+
+@pytest.fixture
+def stack(frames):
+    return _convert_to_uint16(frames[:10], PIXEL_MAX)
+
+
+@pytest.fixture
+def expected(config_file, stack):
+    return Dozor(config_file).do_images(stack.copy())["score3"]
+
+
+def test_do_image_and_process(config_file, stack, expected):
+    async def _images():
+        for _frame in stack:
+            yield _frame.copy()
+
+    async def _run():
+        async with AsyncDozor(config_file, 2) as _dozor:
+            _single = await _dozor.do_image(stack[0].copy(), fields=["score3"])
+            _ordered = [
+                _data["score3"]
+                async for _, _data in _dozor.process(_frame.copy() for _frame in stack)
+            ]
+            _from_async = [
+                _data["score3"] async for _, _data in _dozor.process(_images())
+            ]
+        return _single, _ordered, _from_async
+
+    _single, _ordered, _from_async = run(_run())
+    assert np_allclose(_single[1]["score3"], expected[0])
+    assert np_allclose(_ordered, expected)
+    assert np_allclose(_from_async, expected)
+
+
+def test_in_flight_bounded_across_callers(monkeypatch, config_file, stack):
+    _do_image = DozorThreadPool._do_image
+    _lock = Lock()
+    _running = [0, 0]
+
+    def _counted_do_image(self, *args):
+        with _lock:
+            _running[0] += 1
+            _running[1] = max(_running)
+        time.sleep(0.01)
+        try:
+            return _do_image(self, *args)
+        finally:
+            with _lock:
+                _running[0] -= 1
+
+    monkeypatch.setattr(DozorThreadPool, "_do_image", _counted_do_image)
+
+    async def _run():
+        async with AsyncDozor(config_file, 4, max_in_flight=2) as _dozor:
+            assert _dozor.max_in_flight == 2
+            await gather(*(_dozor.do_image(_frame.copy()) for _frame in stack))
+
+    run(_run())
+    assert _running[1] == 2
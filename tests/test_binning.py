@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import pytest
+from numpy import (
+    array_equal as np_array_equal,
+    empty as np_empty,
+    uint16,
+    zeros as np_zeros,
+)
+
+from pydozor import Dozor, PixelMask, binning
+from pydozor.binning import FrameBinner, ScreeningDozor, bin_config
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX, SHAPE, make_config, make_mask
+
+
+def _reference(frame, factor, limit, good=None):
+    """Bin a frame one block at a time."""
+    _rows, _columns = SHAPE[0] // factor, SHAPE[1] // factor
+    _out = np_empty((_rows, _columns), dtype=uint16)
+    for _row in range(_rows):
+        for _column in range(_columns):
+            _block = (
+                slice(_row * factor, (_row + 1) * factor),
+                slice(_column * factor, (_column + 1) * factor),
+            )
+            _values = frame[_block].astype(int).ravel()
+            if good is not None:
+                _values = _values[good[_block].ravel()]
+            if not _values.size or (_values > limit).any():
+                _out[_row, _column] = 65535
+                continue
+            _count = _values.size
+            _sum = (int(_values.sum()) * factor**2 + _count // 2) // _count
+            _out[_row, _column] = min(_sum, 65534)
+    return _out
+
+
+@pytest.mark.parametrize("factor", [1, 2, 3, 4])
+@pytest.mark.parametrize("masked", [False, True])
+def test_bin_matches_reference(monkeypatch, frames, factor, masked):
+    # Small bands, so frames are binned over several
+    monkeypatch.setattr(binning, "_BLOCK_SIZE", 1 << 10)
+    _mask = PixelMask.from_eiger(make_mask()) if masked else None
+    _good = ~_mask.to_bool().reshape(SHAPE) if masked else None
+    _binner = FrameBinner(SHAPE, factor, PIXEL_MAX, mask=_mask)
+    assert _binner.shape == (SHAPE[0] // factor, SHAPE[1] // factor)
+    assert _binner.unbinned_shape == SHAPE
+    for _frame in frames[:3]:
+        _binned = _binner.bin(_frame)
+        assert np_array_equal(_binned, _reference(_frame, factor, PIXEL_MAX, _good))
+        _converted = _convert_to_uint16(_frame[None], PIXEL_MAX)[0]
+        assert np_array_equal(
+            _binner.bin(_converted),
+            _reference(_converted, factor, PIXEL_MAX, _good),
+        )
+
+
+def test_bin_saturates_and_reuses_out():
+    _binner = FrameBinner(SHAPE, 2, PIXEL_MAX)
+    _frame = np_zeros(SHAPE, dtype=uint16)
+    _frame[:2, :2] = PIXEL_MAX
+    _frame[2:4, :2] = PIXEL_MAX + 1
+    _out = np_empty(_binner.shape, dtype=uint16)
+    assert _binner.bin(_frame, out=_out) is _out
+    assert _out[0, 0] == 65534
+    assert _out[1, 0] == 65535
+    assert not _out[2:].any()
+
+
+def test_binner_rejects_invalid_input():
+    for _factor in (0, SHAPE[0] + 1):
+        with pytest.raises(ValueError):
+            FrameBinner(SHAPE, _factor, PIXEL_MAX)
+    with pytest.raises(ValueError):
+        FrameBinner(
+            (SHAPE[0], SHAPE[1] + 1),
+            2,
+            PIXEL_MAX,
+            mask=PixelMask.from_eiger(make_mask()),
+        )
+    _binner = FrameBinner(SHAPE, 2, PIXEL_MAX)
+    with pytest.raises(ValueError):
+        _binner.bin(np_zeros((SHAPE[1], SHAPE[0]), dtype=uint16))
+    with pytest.raises(ValueError):
+        _binner.bin(np_zeros(SHAPE, dtype=uint16), out=np_zeros(SHAPE, dtype=uint16))
+
+
+def test_bin_config():
+    _config = bin_config(make_config(ix_max=90, iy_max=60), 2)
+    assert (_config.nx, _config.ny) == (SHAPE[1] // 2, SHAPE[0] // 2)
+    assert (_config.org_x, _config.org_y) == (SHAPE[1] // 4, SHAPE[0] // 4)
+    assert (_config.ix_max, _config.iy_max) == (45, 30)
+    assert _config.pixel == pytest.approx(0.15)
+    assert _config.spot_size == 1
+    assert _config.pixel_max == 65534
+    with pytest.raises(ValueError):
+        bin_config(make_config(), 0)
+
+
+def test_screening_matches_binned_engine(frames):
+    _config = make_config()
+    _mask = PixelMask.from_eiger(make_mask())
+    _screening = ScreeningDozor(_config, 2, mask=_mask)
+    _engine = Dozor.from_config(bin_config(_config, 2))
+    _binner = FrameBinner(SHAPE, 2, PIXEL_MAX, mask=_mask)
+    _expected = [_engine.do_image(_binner.bin(_frame))[1] for _frame in frames[:4]]
+    _results = _screening.do_images(frames[:4])
+    assert np_array_equal(_results["NofR"], [_data["NofR"] for _data in _expected])
+    assert _screening.do_image(frames[0])[1]["NofR"] == _expected[0]["NofR"]
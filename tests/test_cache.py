@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+import shutil
+
+import pytest
+
+from pydozor import create_config_file
+from pydozor.cache import DozorCache
+
+from .conftest import make_config
+
+
+@pytest.fixture
+def config_path(tmp_path, config_file):
+    return shutil.copy(config_file, tmp_path / "dozor.dat")
+
+
+def test_hits_and_misses(config_path):
+    _cache = DozorCache()
+    _engine, _lock = _cache.get_with_lock(config_path)
+    assert _engine.reuse_buffers
+    assert _cache.get(str(config_path)) is _engine
+    assert _cache.get_with_lock(config_path)[1] is _lock
+    _config_engine = _cache.get(make_config())
+    assert _cache.get(make_config()) is _config_engine
+    assert _config_engine is not _engine
+    assert (_cache.hits, _cache.misses, len(_cache)) == (3, 2, 2)
+    _cache.clear()
+    assert (_cache.hits, _cache.misses, len(_cache)) == (0, 0, 0)
+
+
+def test_modified_file_is_reloaded(config_path):
+    _cache = DozorCache()
+    _engine = _cache.get(config_path)
+    _stat = os.stat(config_path)
+    os.utime(config_path, ns=(_stat.st_atime_ns, _stat.st_mtime_ns + 10**9))
+    assert _cache.get(config_path) is not _engine
+    assert (_cache.hits, _cache.misses, len(_cache)) == (0, 2, 2)
+    # Stale engines of the same path are dropped with the current one
+    assert _cache.invalidate(config_path)
+    assert len(_cache) == 0
+    assert not _cache.invalidate(config_path)
+
+
+def test_invalidate_config():
+    _cache = DozorCache()
+    _engine = _cache.get(make_config())
+    assert not _cache.invalidate(make_config(spot_size=4))
+    assert _cache.invalidate(make_config())
+    assert _cache.get(make_config()) is not _engine
+    assert _cache.misses == 2
+
+
+def test_lru_eviction(tmp_path):
+    _cache = DozorCache(maxsize=2)
+    _paths = [
+        create_config_file(
+            make_config(spot_size=_size), path=tmp_path / f"dozor{_size}.dat"
+        )
+        for _size in (1, 2, 3)
+    ]
+    _first = _cache.get(_paths[0])
+    _cache.get(_paths[1])
+    assert _cache.get(_paths[0]) is _first
+    _cache.get(_paths[2])
+    assert len(_cache) == _cache.maxsize == 2
+    assert _cache.get(_paths[0]) is _first
+    _misses = _cache.misses
+    _cache.get(_paths[1])
+    assert _cache.misses == _misses + 1
+    with pytest.raises(ValueError):
+        DozorCache(maxsize=0)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+
+from pydozor import ConfigStore
+from pydozor.config_store import config_digest
+
+from .conftest import make_config
+
+
+@pytest.fixture
+def configs():
+    return [make_config(spot_level=_level) for _level in (4, 5, 6)]
+
+
+def test_path_is_content_addressed(tmp_path, configs):
+    _store = ConfigStore(tmp_path)
+    _path = _store.path(configs[0])
+    assert _path == tmp_path / f"{config_digest(configs[0])}.dat"
+    assert _path.read_text() == configs[0].model_dump()
+    assert _store.path(make_config(spot_level=4)) == _path
+    assert len(_store) == 1
+    # Files already in the directory are reused by a new store
+    assert ConfigStore(tmp_path).path(configs[0]) == _path
+
+
+def test_least_recently_used_evicted(tmp_path, configs):
+    _store = ConfigStore(tmp_path, maxsize=2)
+    _first, _second = _store.path(configs[0]), _store.path(configs[1])
+    _store.path(configs[0])
+    _store.path(configs[2])
+    assert _first.exists() and not _second.exists()
+    assert len(_store) == 2
+    with pytest.raises(ValueError):
+        ConfigStore(tmp_path, maxsize=0)
+
+
+def test_pinned_paths_kept(tmp_path, configs):
+    _store = ConfigStore(tmp_path, maxsize=1)
+    _pinned = _store.path(configs[0], pin=True)
+    with _store.pinned(configs[1]) as _path:
+        _store.path(configs[2])
+        assert _pinned.exists() and _path.exists()
+        assert len(_store) == 3
+    # Released files are evicted once the store is over its size
+    assert not _path.exists()
+    _store.clear()
+    assert _pinned.exists()
+    _store.release(_pinned)
+    with pytest.raises(ValueError):
+        _store.release(_pinned)
+    _store.clear()
+    assert not _pinned.exists() and not len(_store)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import pytest
+from numpy import (
+    allclose as np_allclose,
+    array_equal as np_array_equal,
+    shares_memory as np_shares_memory,
+)
+
+from pydozor import Dozor, PixelMask
+from pydozor._compat.dozor import ffi
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX, make_config
+
+
+@pytest.fixture
+def stack(frames):
+    return _convert_to_uint16(frames[:8], PIXEL_MAX)
+
+
+def _assert_record_matches(record, data):
+    for _key in record.dtype.names:
+        assert np_allclose(record[_key], data[_key]), _key
+
+
+@pytest.mark.parametrize("reuse_buffers", [False, True])
+def test_do_images_matches_do_image(config_file, stack, reuse_buffers):
+    _engine = Dozor(config_file, reuse_buffers=reuse_buffers)
+    _expected = [_engine.do_image(_frame.copy())[1] for _frame in stack]
+    _results = _engine.do_images(stack.copy())
+    assert len(_results) == len(stack)
+    for _record, _data in zip(_results, _expected, strict=True):
+        _assert_record_matches(_record, _data)
+
+
+def test_do_images_iterable_and_mask(config_file, stack, eiger_mask):
+    _engine = Dozor(config_file)
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _expected = [
+        _engine.do_image(_frame.copy(), mask=_mask)[1]["score3"] for _frame in stack
+    ]
+    _results = _engine.do_images((_frame.copy() for _frame in stack), mask=_mask)
+    assert np_allclose(_results["score3"], _expected)
+
+
+def test_do_images_fields(config_file, stack):
+    _engine = Dozor(config_file)
+    _results = _engine.do_images(stack.copy(), fields=["score3", "NofR"])
+    assert _results.dtype.names == ("score3", "NofR")
+    assert np_array_equal(_results["NofR"], _engine.do_images(stack.copy())["NofR"])
+    with pytest.raises(ValueError):
+        _engine.do_images(stack.copy(), fields=["unknown"])
+
+
+@pytest.mark.parametrize("reuse_buffers", [False, True])
+def test_do_image_as_numpy_results_stay_valid(config_file, stack, reuse_buffers):
+    _engine = Dozor(config_file, reuse_buffers=reuse_buffers)
+    _datacol, _data = _engine.do_image(stack[0].copy(), as_numpy=True)
+    _backpol = _data["backpol2D"].copy()
+    _engine.do_image(stack[1].copy(), as_numpy=True)
+    _next_datacol, _next_data = _engine.do_image(stack[2].copy(), as_numpy=True)
+    assert not np_shares_memory(_data["backpol2D"], _next_data["backpol2D"])
+    assert not np_shares_memory(_datacol["backpol"], _next_datacol["backpol"])
+    assert np_array_equal(_data["backpol2D"], _backpol)
+
+
+def test_lazy_to_dict_copies_reused_buffers(config_file, stack):
+    _engine = Dozor(config_file, reuse_buffers=True)
+    _, _view = _engine.do_image(stack[0].copy(), lazy=True)
+    _data = _view.to_dict()
+    _backpol = _data["backpol2D"].copy()
+    _next = _engine.do_image(stack[1].copy(), lazy=True)[1].to_dict()
+    assert not np_shares_memory(_data["backpol2D"], _next["backpol2D"])
+    assert np_array_equal(_data["backpol2D"], _backpol)
+
+
+@pytest.mark.parametrize("reuse_buffers", [None, False, True])
+def test_clone_matches_engine(config_file, stack, reuse_buffers):
+    _engine = Dozor(config_file)
+    _clone = _engine.clone(reuse_buffers=reuse_buffers)
+    assert _clone.reuse_buffers is bool(reuse_buffers)
+    assert _clone.shape == _engine.shape
+    assert _clone.pixel_max == _engine.pixel_max
+    _expected = Dozor(config_file).do_images(stack.copy())
+    # Interleave frames to check the engines share no per-frame state
+    _results = [
+        (_clone if _index % 2 else _engine).do_image(_frame.copy())[1]
+        for _index, _frame in enumerate(stack)
+    ]
+    for _record, _data in zip(_expected, _results, strict=True):
+        _assert_record_matches(_record, _data)
+
+
+def test_clone_owns_its_structs(config_file):
+    _engine = Dozor(config_file)
+    _clone = _engine.clone()
+    for _name in ("_detector", "_data_input", "_local", "_psi_im", "_kl_im"):
+        assert ffi.cast("uintptr_t", getattr(_clone, _name)) != ffi.cast(
+            "uintptr_t", getattr(_engine, _name)
+        ), _name
+    _clone._detector.ix = 0
+    assert _engine._detector.ix == _engine.shape[1]
+
+
+def test_from_config_matches_config_file(config_file, stack):
+    _expected = Dozor(config_file).do_images(stack.copy())
+    _config = make_config()
+    _first = Dozor.from_config(_config)
+    _second = Dozor.from_config(make_config(), reuse_buffers=True)
+    assert _second.reuse_buffers
+    assert ffi.cast("uintptr_t", _first._detector) != ffi.cast(
+        "uintptr_t", _second._detector
+    )
+    for _engine in (_first, _second):
+        assert _engine.shape == _first.shape
+        _assert_record_matches(_expected, _engine.do_images(stack.copy()))
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+import signal
+from multiprocessing import get_start_method
+
+import pytest
+from numpy import array_equal as np_array_equal
+
+from pydozor import ConfigStore, Dozor, PixelMask
+from pydozor.jobs import DatasetJob, run_jobs
+from pydozor.results import read_results
+
+from .conftest import make_config
+
+# Workers inherit patches of the test process only when forked
+fork_only = pytest.mark.skipif(
+    get_start_method() != "fork", reason="requires the fork start method"
+)
+
+
+def _jobs(master_file, config_file, output_dir, mask):
+    return [
+        DatasetJob(master_file, config_file, output_dir / "full", mask),
+        DatasetJob(
+            master_file, config_file, output_dir / "part", mask, start=9, end=16
+        ),
+    ]
+
+
+def test_jobs_match_single_engine(tmp_path, master_file, config_file, eiger_mask):
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _results = list(
+        run_jobs(
+            _jobs(master_file, config_file, tmp_path, _mask),
+            nproc=2,
+            min_task_frames=4,
+            output_format="npz",
+        )
+    )
+    assert sorted(_result.frames for _result in _results) == [8, 48]
+    assert all(_result.error is None for _result in _results)
+
+    _full = read_results(tmp_path / "full" / "dozor_res.npz")
+    _part = read_results(tmp_path / "part" / "dozor_res.npz")
+    assert np_array_equal(_part, _full[8:16])
+
+
+def test_jobs_keep_stored_configs(tmp_path, monkeypatch, master_file, eiger_mask):
+    # Every config but the last stored would be evicted before workers read it
+    _store = ConfigStore(tmp_path / "configs", maxsize=1)
+    monkeypatch.setattr("pydozor.jobs.default_store", _store)
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _jobs = [
+        DatasetJob(master_file, make_config(spot_level=_level), tmp_path / _name, _mask)
+        for _level, _name in ((4, "a"), (5, "b"), (6, "c"))
+    ]
+    _results = list(run_jobs(_jobs, nproc=2, min_task_frames=4))
+    assert [_result.error for _result in _results] == [None, None, None]
+    assert len(list((tmp_path / "configs").glob("*.dat"))) == 1
+
+
+@fork_only
+def test_jobs_dead_worker_raises(
+    tmp_path, monkeypatch, master_file, config_file, eiger_mask
+):
+    def _killed_do_images(self, *args, **kwargs):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    monkeypatch.setattr(Dozor, "do_images", _killed_do_images)
+    _mask = PixelMask.from_eiger(eiger_mask)
+    with pytest.raises(RuntimeError, match="exited with code -9"):
+        list(run_jobs(_jobs(master_file, config_file, tmp_path, _mask), nproc=2))
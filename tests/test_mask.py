@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+from numpy import (
+    array_equal as np_array_equal,
+    int32,
+    random as np_random,
+    uint16,
+    where as np_where,
+)
+
+from pydozor import PixelMask
+
+from .conftest import make_mask
+
+
+@pytest.fixture(params=[0.01, 0.5], ids=["sparse", "dense"])
+def bad(request):
+    # Spans several unpacking blocks of packed masks
+    return np_random.default_rng(1).random((300, 500)) < request.param
+
+
+def test_representation_by_density(bad):
+    _mask = PixelMask(bad)
+    assert _mask.packed == (bad.mean() > 0.1)
+    assert _mask.count == bad.sum()
+    assert _mask.shape == bad.shape
+    assert np_array_equal(_mask.to_bool(), bad)
+
+
+def test_apply_matches_where(bad):
+    _frame = np_random.default_rng(2).integers(0, 1000, bad.shape).astype(uint16)
+    _expected = np_where(bad, 65535, _frame)
+    assert np_array_equal(PixelMask(bad).apply(_frame.copy()), _expected)
+    assert np_array_equal(
+        PixelMask(bad).apply(_frame.copy(), 7), np_where(bad, 7, _frame)
+    )
+
+
+def test_compact_round_trip(bad):
+    _mask = PixelMask(bad)
+    _kind, _data = _mask._compact()
+    _rebuilt = PixelMask._from_compact(bad.shape, _mask.count, _kind, _data)
+    assert np_array_equal(_rebuilt.to_bool(), bad)
+
+
+def test_from_eiger_and_conventions():
+    _eiger = make_mask(3)
+    _mask = PixelMask.from_eiger(_eiger)
+    assert np_array_equal(_mask.to_bool(), _eiger != 0)
+    # Compiled masks are cached by content
+    assert PixelMask.from_eiger(_eiger.copy()) is _mask
+    _negative = np_where(_eiger != 0, -1, 0).astype(int32)
+    _from_negative = PixelMask.from_array(_negative, bad="negative")
+    assert np_array_equal(_from_negative.to_bool(), _eiger != 0)
+    with pytest.raises(ValueError):
+        PixelMask.from_array(_eiger, bad="positive")
+
+
+def test_apply_checks_frame():
+    _mask = PixelMask.from_eiger(make_mask())
+    _frame = _mask.to_bool().astype(uint16)
+    with pytest.raises(ValueError):
+        _mask.apply(_frame[:10])
+    with pytest.raises(ValueError):
+        _mask.apply(_frame.T)
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from time import perf_counter
+
+from pydozor import metrics
+from pydozor.wrapper import _BLOCK_SIZE, _convert_to_uint16
+
+from .conftest import PIXEL_MAX
+
+
+def test_convert_latency_is_elapsed_time(frames):
+    # Several blocks per call, each must not disturb the stage timer
+    _stack = frames[: 2 * _BLOCK_SIZE // frames[0].size + 1]
+    _metrics = metrics.enable(metrics.Metrics())
+    try:
+        _start = perf_counter()
+        _convert_to_uint16(_stack, PIXEL_MAX)
+        _elapsed = perf_counter() - _start
+    finally:
+        metrics.disable()
+    _convert = _metrics.snapshot()["convert"]
+    assert _convert["count"] == 1
+    assert _convert["frames"] == len(_stack)
+    assert 0 <= _convert["sum"] <= _elapsed
+
+
+def test_prometheus_bucket_labels():
+    _metrics = metrics.Metrics()
+    _metrics.observe("native", 0.003, frames=1)
+    _labels = [
+        _line.split('le="')[1].split('"')[0]
+        for _line in _metrics.to_prometheus().splitlines()
+        if "_bucket{" in _line
+    ]
+    assert _labels[:4] == ["1e-05", "2.5e-05", "5e-05", "0.0001"]
+    assert _labels[-4:] == ["2.5", "5.0", "10.0", "+Inf"]
+    assert all(float(_label) in (*metrics._BUCKETS, float("inf")) for _label in _labels)
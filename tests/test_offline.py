@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+import time
+from multiprocessing import get_start_method
+
+import pytest
+from numpy import arange as np_arange, array_equal as np_array_equal
+
+from pydozor import Dozor, PixelMask
+from pydozor.offline import _CHECKPOINT_FILE, run_offline
+from pydozor.prefilter import BlankFilter
+from pydozor.reader import EigerReader
+from pydozor.results import ResultWriter, read_results
+
+from .conftest import PIXEL_MAX
+
+# Workers inherit patches of the test process only when forked
+fork_only = pytest.mark.skipif(
+    get_start_method() != "fork", reason="requires the fork start method"
+)
+
+
+@pytest.fixture(scope="module")
+def clean_run(tmp_path_factory, master_file, config_file, eiger_mask):
+    _output = tmp_path_factory.mktemp("clean")
+    _summary = run_offline(
+        master_file,
+        config_file,
+        _output,
+        nproc=2,
+        mask=PixelMask.from_eiger(eiger_mask),
+        min_task_frames=4,
+        output_format="npz",
+    )
+    return _summary, read_results(_output / "dozor_res.npz")
+
+
+def test_offline_results(clean_run, frames):
+    _summary, _results = clean_run
+    assert _summary.frames == len(frames)
+    assert np_array_equal(_results["img"], np_arange(1, len(frames) + 1))
+    assert _summary.hits == int((_results["score3"] > 5).sum())
+
+
+@fork_only
+def test_resume_merges_without_duplicates(
+    tmp_path, monkeypatch, clean_run, master_file, config_file, eiger_mask
+):
+    _flush = ResultWriter.flush
+
+    def _interrupted_flush(self):
+        # Results of the third task reach disk, but it is never reported done
+        _flush(self)
+        if len(self) >= 12:
+            raise RuntimeError("interrupted")
+
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _arguments = dict(nproc=1, mask=_mask, min_task_frames=4, output_format="npz")
+    monkeypatch.setattr(ResultWriter, "flush", _interrupted_flush)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        run_offline(master_file, config_file, tmp_path, **_arguments)
+    monkeypatch.setattr(ResultWriter, "flush", _flush)
+
+    with open(tmp_path / _CHECKPOINT_FILE) as _file:
+        _state = json.load(_file)
+    assert len(_state["done"]) == 2
+    assert "merged" not in _state
+    # Frames of the unreported task are processed again when resuming
+    assert sum(len(read_results(_part)) for _part in _state["parts"]) == 12
+
+    _summary = run_offline(
+        master_file, config_file, tmp_path, resume=True, **_arguments
+    )
+    _results = read_results(tmp_path / "dozor_res.npz")
+    _clean_summary, _clean_results = clean_run
+    assert _summary == _clean_summary
+    assert np_array_equal(_results, _clean_results)
+    assert not list(tmp_path.glob("*.rec"))
+
+    # A completed run is not processed again
+    _again = run_offline(master_file, config_file, tmp_path, resume=True, **_arguments)
+    assert _again == _summary
+
+
+@fork_only
+def test_dead_worker_raises_and_resumes(
+    tmp_path, monkeypatch, clean_run, master_file, config_file, eiger_mask
+):
+    _do_images = Dozor.do_images
+    _calls = []
+
+    def _killed_do_images(self, *args, **kwargs):
+        # Counted in the worker process, killed while running its fourth task
+        _calls.append(None)
+        if len(_calls) == 4:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return _do_images(self, *args, **kwargs)
+
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _arguments = dict(nproc=1, mask=_mask, min_task_frames=4, output_format="npz")
+    monkeypatch.setattr(Dozor, "do_images", _killed_do_images)
+    with pytest.raises(RuntimeError, match="exited with code -9"):
+        run_offline(master_file, config_file, tmp_path, **_arguments)
+    monkeypatch.setattr(Dozor, "do_images", _do_images)
+
+    with open(tmp_path / _CHECKPOINT_FILE) as _file:
+        assert len(json.load(_file)["done"]) == 3
+
+    _summary = run_offline(
+        master_file, config_file, tmp_path, resume=True, **_arguments
+    )
+    _clean_summary, _clean_results = clean_run
+    assert _summary == _clean_summary
+    assert np_array_equal(read_results(tmp_path / "dozor_res.npz"), _clean_results)
+
+
+def test_prefilter_flags_skipped_frames(
+    tmp_path, clean_run, master_file, config_file, eiger_mask
+):
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _summary = run_offline(
+        master_file,
+        config_file,
+        tmp_path,
+        nproc=2,
+        mask=_mask,
+        min_task_frames=4,
+        output_format="npz",
+        prefilter=BlankFilter(PIXEL_MAX, mask=_mask, min_peaks=5),
+    )
+    _results = read_results(tmp_path / "dozor_res.npz")
+    _skipped = _results["skipped"]
+    assert 0 < _summary.skipped == _skipped.sum() < len(_results)
+    assert not _results["nof_r"][_skipped].any()
+    _, _clean_results = clean_run
+    assert not _clean_results["skipped"].any()
+    assert np_array_equal(_results[~_skipped], _clean_results[~_skipped])
+
+
+@fork_only
+def test_worker_reads_next_task_while_processing(
+    tmp_path, monkeypatch, clean_run, master_file, config_file, eiger_mask
+):
+    _read = EigerReader.read
+    _do_images = Dozor.do_images
+
+    def _slow_read(self, first, last):
+        time.sleep(0.05)
+        return _read(self, first, last)
+
+    def _slow_do_images(self, *args, **kwargs):
+        time.sleep(0.05)
+        return _do_images(self, *args, **kwargs)
+
+    monkeypatch.setattr(EigerReader, "read", _slow_read)
+    monkeypatch.setattr(Dozor, "do_images", _slow_do_images)
+    _start = time.monotonic()
+    _summary = run_offline(
+        master_file,
+        config_file,
+        tmp_path,
+        nproc=1,
+        mask=PixelMask.from_eiger(eiger_mask),
+        min_task_frames=4,
+        output_format="npz",
+    )
+    _elapsed = time.monotonic() - _start
+    # Reading all 12 tasks, then processing them, takes 1.2 s
+    assert _elapsed < 1
+    _clean_summary, _clean_results = clean_run
+    assert _summary == _clean_summary
+    assert np_array_equal(read_results(tmp_path / "dozor_res.npz"), _clean_results)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pytest
+from numpy import allclose as np_allclose, array_equal as np_array_equal
+
+from pydozor import Dozor, DozorThreadPool, PixelMask
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX
+
+
+@pytest.fixture
+def stack(frames):
+    return _convert_to_uint16(frames[:12], PIXEL_MAX)
+
+
+@pytest.fixture
+def expected(config_file, stack, eiger_mask):
+    return Dozor(config_file).do_images(
+        stack.copy(), mask=PixelMask.from_eiger(eiger_mask)
+    )
+
+
+def test_do_images_matches_engine(config_file, stack, eiger_mask, expected):
+    _mask = PixelMask.from_eiger(eiger_mask)
+    with DozorThreadPool(config_file, 3, mask=_mask) as _pool:
+        assert _pool.max_workers == 3
+        _results = _pool.do_images(stack.copy())
+        _fields = _pool.do_images(stack[:2].copy(), fields=["score3", "NofR"])
+    assert np_array_equal(_results, expected)
+    assert _fields.dtype.names == ("score3", "NofR")
+
+
+def test_map_and_imap_match_engine(config_file, stack, eiger_mask, expected):
+    _mask = PixelMask.from_eiger(eiger_mask)
+    with DozorThreadPool(config_file, 3, mask=_mask, max_in_flight=2) as _pool:
+        _mapped = [
+            _data["score3"] for _, _data in _pool.map(stack.copy(), fields=["score3"])
+        ]
+        _unordered = {
+            _index: _data["score3"] for _index, (_, _data) in _pool.imap(stack.copy())
+        }
+    assert np_allclose(_mapped, expected["score3"])
+    assert np_allclose([_unordered[_index] for _index in range(len(stack))], _mapped)
+
+
+def test_convert(config_file, frames, eiger_mask, expected):
+    _mask = PixelMask.from_eiger(eiger_mask)
+    with DozorThreadPool(config_file, 3, mask=_mask, convert=True) as _pool:
+        _single = _pool.submit(frames[0].copy()).result()[1]
+        _stack = _pool.do_images(frames[:12].copy())
+    assert np_allclose(_single["score3"], expected["score3"][0])
+    assert np_array_equal(_stack, expected)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import pytest
+from numpy import allclose as np_allclose, uint16, zeros as np_zeros
+
+from pydozor import Dozor
+from pydozor.prefilter import BlankFilter, PrefilteredDozor
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX, SHAPE
+
+
+@pytest.fixture
+def prefiltered(config_file):
+    return PrefilteredDozor(Dozor(config_file), BlankFilter(PIXEL_MAX, min_peaks=1))
+
+
+@pytest.fixture
+def frame(frames):
+    return _convert_to_uint16(frames[0], PIXEL_MAX)
+
+
+def test_do_image_flags_skipped_frames(prefiltered, frame):
+    _datacol, _data, _skipped = prefiltered.do_image(np_zeros(SHAPE, dtype=uint16))
+    assert _skipped
+    assert _data["score3"] == 0 and _data["NofR"] == 0
+    assert not any(_datacol["RList"])
+
+    _expected = prefiltered.engine.do_image(frame.copy())[1]
+    _, _data, _skipped = prefiltered.do_image(frame.copy())
+    assert not _skipped
+    assert np_allclose(_data["score3"], _expected["score3"])
+
+
+def test_do_image_skipped_output_is_not_shared(prefiltered):
+    _blank = np_zeros(SHAPE, dtype=uint16)
+    _, _data, _ = prefiltered.do_image(_blank.copy(), fields=["score3", "backpol2D"])
+    assert set(_data) == {"score3", "backpol2D"}
+    _data["backpol2D"][0] = 1.0
+    _, _again, _ = prefiltered.do_image(_blank.copy(), fields=["score3", "backpol2D"])
+    assert not any(_again["backpol2D"])
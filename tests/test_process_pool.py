@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+import signal
+from multiprocessing import get_start_method
+
+import pytest
+from numpy import allclose as np_allclose
+
+from pydozor import Dozor, DozorProcessPool, PixelMask
+from pydozor.process_pool import DozorSpec
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX, SHAPE
+
+# Workers inherit patches of the test process only when forked
+fork_only = pytest.mark.skipif(
+    get_start_method() != "fork", reason="requires the fork start method"
+)
+
+
+@pytest.fixture
+def stack(frames):
+    return _convert_to_uint16(frames[:12], PIXEL_MAX)
+
+
+def test_pool_matches_engine(config_file, stack, eiger_mask):
+    _mask = PixelMask.from_eiger(eiger_mask)
+    _expected = Dozor(config_file).do_images(stack.copy(), mask=_mask)
+    with DozorProcessPool(config_file, SHAPE, 2, mask=_mask) as _pool:
+        _results = _pool.do_images(stack)
+    for _key in ("score3", "NofR", "SumTotal2D"):
+        assert np_allclose(_results[_key], _expected[_key])
+
+
+def test_pool_rejects_unconverted_frames(config_file, frames, stack):
+    with DozorProcessPool(config_file, SHAPE, 2) as _pool:
+        with pytest.raises(TypeError, match="uint16"):
+            _pool.do_images(frames[:4])
+        with pytest.raises(ValueError, match="shape"):
+            _pool.do_images([stack[0][:1]])
+        # Slots of rejected stacks are free again
+        _results = _pool.do_images(stack)
+    _expected = Dozor(config_file).do_images(stack.copy())
+    assert np_allclose(_results["score3"], _expected["score3"])
+
+
+def test_pool_killed_workers_raise(config_file, stack):
+    with DozorProcessPool(config_file, SHAPE, 2) as _pool:
+        _pool.do_images(stack[:2])
+        for _worker in _pool._workers:
+            _worker.kill()
+            _worker.join()
+        with pytest.raises(RuntimeError, match="exited with code"):
+            _pool.do_images(stack)
+
+
+@fork_only
+def test_pool_worker_startup_failure_raises(monkeypatch, config_file, stack):
+    def _build(self):
+        raise OSError("libdozor failed to load")
+
+    monkeypatch.setattr(DozorSpec, "build", _build)
+    with DozorProcessPool(config_file, SHAPE, 2) as _pool:
+        with pytest.raises(RuntimeError, match="exited with code 1"):
+            _pool.do_images(stack)
+
+
+@fork_only
+def test_pool_worker_crash_raises(monkeypatch, config_file, stack):
+    def _crash(self, *args, **kwargs):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    monkeypatch.setattr(Dozor, "do_images", _crash)
+    with DozorProcessPool(config_file, SHAPE, 2) as _pool:
+        with pytest.raises(RuntimeError, match="exited with code -9"):
+            _pool.do_images(stack)
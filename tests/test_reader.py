@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pytest
+from bitshuffle.h5 import H5_COMPRESS_LZ4, H5FILTER
+from numpy import array_equal as np_array_equal
+
+from pydozor.reader import EigerReader
+
+from .conftest import write_master
+
+
+@pytest.fixture(scope="module")
+def bitshuffle_master(tmp_path_factory, frames, eiger_mask):
+    return write_master(
+        tmp_path_factory.mktemp("bitshuffle"),
+        frames,
+        eiger_mask,
+        compression=H5FILTER,
+        compression_opts=(0, H5_COMPRESS_LZ4),
+    )
+
+
+@pytest.fixture(params=["uncompressed", "bitshuffle"])
+def reader(request, master_file, bitshuffle_master):
+    _path = bitshuffle_master if request.param == "bitshuffle" else master_file
+    with EigerReader(_path, workers=2) as _reader:
+        yield _reader
+
+
+def test_layout(reader, frames):
+    assert len(reader) == len(frames)
+    assert reader.shape == frames.shape[1:]
+    assert reader.dtype == frames.dtype
+
+
+def test_raw_chunks_only_for_bitshuffle(master_file, bitshuffle_master):
+    with EigerReader(bitshuffle_master) as _reader:
+        assert all(_container.bitshuffle for _container in _reader._containers)
+    with EigerReader(master_file) as _reader:
+        assert not any(_container.bitshuffle for _container in _reader._containers)
+
+
+def test_chunks(reader):
+    assert reader.chunks(3, 10) == [(3, 4), (5, 8), (9, 10)]
+    # Ranges are merged within a container, never across containers
+    assert reader.chunks(13, 28, min_frames=6) == [(13, 20), (21, 28)]
+    assert reader.chunks(45)[-1] == (45, 48)
+
+
+@pytest.mark.parametrize("first, last", [(1, 4), (2, 3), (3, 26), (41, 48)])
+def test_read(reader, frames, first, last):
+    _block = reader.read(first, last)
+    assert np_array_equal(_block, frames[slice(first - 1, last)])
+    reader.release(_block)
+
+
+def test_iter_chunks_and_frames(reader, frames):
+    _blocks = [(_first, _block.copy()) for _first, _block in reader.iter_chunks(6, 30)]
+    assert [_first for _first, _ in _blocks] == [6, 9, 13, 17, 21, 25, 29]
+    for _first, _block in _blocks:
+        assert np_array_equal(
+            _block, frames[slice(_first - 1, _first - 1 + len(_block))]
+        )
+    _numbers = []
+    for _number, _frame in reader.frames(18, 23):
+        assert np_array_equal(_frame, frames[_number - 1])
+        _numbers.append(_number)
+    assert _numbers == list(range(18, 24))
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import pytest
+from numpy import array_equal as np_array_equal
+
+from pydozor import Dozor
+from pydozor.results import ResultWriter, read_results
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX
+
+
+@pytest.fixture(scope="module")
+def records(config_file, frames):
+    return Dozor(config_file).do_images(_convert_to_uint16(frames[:6], PIXEL_MAX))
+
+
+@pytest.mark.parametrize("suffix", [".h5", ".npz", ".rec"])
+def test_write_skipped_round_trip(tmp_path, records, suffix):
+    with ResultWriter(tmp_path / ("dozor_res" + suffix), buffer_size=4) as _writer:
+        _writer.write(10, records[:3], [1])
+        _writer.write(13, records[3:], [0, 2])
+    _results = read_results(_writer.path)
+    assert _results["img"].tolist() == list(range(10, 16))
+    assert _results["skipped"].tolist() == [False, True, False, True, False, True]
+    assert np_array_equal(_results["nof_r"], records["NofR"])
+
+
+def test_text_lines_are_legacy(tmp_path, records):
+    with ResultWriter(tmp_path / "dozor_res.txt") as _writer:
+        _writer.write(1, records[:2], [1])
+    _lines = _writer.path.read_text().splitlines()
+    assert [_line.split()[:2] for _line in _lines] == [["img", "1"], ["img", "2"]]
+    assert all(len(_line.split()) == 5 for _line in _lines)
+    _results = read_results(_writer.path)
+    assert np_array_equal(_results["nof_r"], records["NofR"][:2])
+    assert not _results["skipped"].any()
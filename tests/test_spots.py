@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import pytest
+from numpy import array_equal as np_array_equal, float32, zeros as np_zeros
+
+from pydozor import Dozor
+from pydozor.spots import SpotWriter, read_spots, write_adx
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX
+
+
+@pytest.fixture
+def stack(frames):
+    return _convert_to_uint16(frames[:6], PIXEL_MAX)
+
+
+def _spots(engine, frame, **kwargs):
+    engine.do_image(frame)
+    return engine.get_spot_list(frame, **kwargs)
+
+
+def test_get_spot_list(config_file, stack):
+    _engine = Dozor(config_file)
+    with pytest.raises(RuntimeError):
+        _engine.get_spot_list(stack[0])
+    _frame = stack[0].copy()
+    _nof_r = _engine.do_image(_frame)[1]["NofR"]
+    _spots = _engine.get_spot_list(_frame, copy=True)
+    assert _spots.shape == (_nof_r, 3) and _spots.dtype == float32
+    _x, _y = _spots[:, 0].astype(int), _spots[:, 1].astype(int)
+    assert np_array_equal(_spots[:, 2], _frame[_y, _x])
+    _records = _engine.get_spot_list(_frame, structured=True)
+    assert _records.dtype.names == ("x", "y", "intensity")
+    assert np_array_equal(_records["x"], _spots[:, 0])
+
+
+def test_spot_list_views_engine_buffer(config_file, stack):
+    _engine = Dozor(config_file)
+    _view = _spots(_engine, stack[0].copy())
+    _copy = _view.copy()
+    _kept = _spots(_engine, stack[0].copy(), copy=True)
+    _spots(_engine, stack[1].copy())
+    assert np_array_equal(_kept, _copy)
+    assert not np_array_equal(_view, _copy)
+
+
+def test_spot_writer_round_trip(tmp_path, config_file, stack):
+    _engine = Dozor(config_file)
+    _written = {
+        _img: _spots(_engine, _frame.copy(), copy=True)
+        for _img, _frame in enumerate(stack, start=1)
+    }
+    _written[7] = np_zeros((0, 3), dtype=float32)
+    _path = tmp_path / "spots.h5"
+    with SpotWriter(_path, buffer_size=16) as _writer:
+        for _img, _frame_spots in _written.items():
+            _writer.write(_img, _frame_spots)
+    for _img, _frame_spots in _written.items():
+        assert np_array_equal(read_spots(_path, _img), _frame_spots)
+    assert read_spots(_path, 8).shape == (0, 3)
+    _index, _all = read_spots(_path)
+    assert _index["img"].tolist() == list(_written)
+    assert _index["count"].tolist() == [len(_value) for _value in _written.values()]
+    assert len(_all) == _index["count"].sum()
+
+
+def test_write_adx(tmp_path, config_file, stack):
+    _spots_array = _spots(Dozor(config_file), stack[0].copy())
+    write_adx(tmp_path / "spots.adx", _spots_array)
+    _rows = [
+        _line.split() for _line in (tmp_path / "spots.adx").read_text().splitlines()
+    ]
+    assert len(_rows) == len(_spots_array)
+    assert all(_row[3:] == ["1", "1"] for _row in _rows)
+    assert [float(_row[2]) for _row in _rows] == _spots_array[:, 2].tolist()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import pytest
+from numpy import allclose as np_allclose, array_equal as np_array_equal
+
+from pydozor import Dozor
+from pydozor.stream import (
+    FrameSource,
+    IteratorSource,
+    SocketSource,
+    StreamPipeline,
+    StreamProducer,
+)
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX, make_frames
+
+
+def test_frame_source_is_abstract():
+    with pytest.raises(TypeError):
+        FrameSource()
+
+
+def test_iterator_source_copies_and_reuses(frames):
+    _source = IteratorSource(frames[:4], start=5)
+    _seen = []
+    for _number, _frame in _source:
+        assert np_array_equal(_frame, frames[_number - 5])
+        _seen.append((_number, id(_frame)))
+        _source.release(_frame)
+    assert [_number for _number, _ in _seen] == [5, 6, 7, 8]
+    # Released buffers are handed out again
+    assert len({_id for _, _id in _seen}) == 1
+
+
+@pytest.mark.parametrize("encoding", ["<", "bslz4"])
+@pytest.mark.parametrize("transport", ["unix", "tcp"])
+def test_socket_source_receives_producer_frames(tmp_path, frames, encoding, transport):
+    _address = (
+        str(tmp_path / "stream.sock") if transport == "unix" else ("127.0.0.1", 0)
+    )
+    with StreamProducer(_address, frames[:6], encoding=encoding) as _producer:
+        with SocketSource(_producer.address) as _source:
+            _received = [(_number, _frame.copy()) for _number, _frame in _source]
+        _producer.join(5)
+    assert [_number for _number, _ in _received] == list(range(1, 7))
+    for _number, _frame in _received:
+        assert _frame.dtype == frames.dtype
+        assert np_array_equal(_frame, frames[_number - 1])
+
+
+def test_pipeline_results(tmp_path, config_file, frames):
+    _expected = Dozor(config_file).do_images(
+        _convert_to_uint16(frames[:12], PIXEL_MAX)
+    )["score3"]
+    _address = str(tmp_path / "stream.sock")
+    with StreamProducer(_address, frames[:12]) as _producer:
+        _source = SocketSource(_producer.address)
+        with StreamPipeline(config_file, _source, 3, max_in_flight=4) as _pipeline:
+            _results = list(_pipeline)
+    assert sorted(_result.index for _result in _results) == list(range(1, 13))
+    for _result in _results:
+        assert np_allclose(_result.data["score3"], _expected[_result.index - 1])
+        assert _result.hit == (_result.data["score3"] > 5)
+        assert _result.latency >= 0
+    assert set(_results[0].data) == {"NofR", "score3", "dlim09"}
+
+
+def test_pipeline_run_callback(config_file, frames):
+    _source = IteratorSource(frames[:5])
+    _hits = []
+    with StreamPipeline(config_file, _source, 2, fields=["NofR"]) as _pipeline:
+        _count = _pipeline.run(lambda _result: _hits.append(_result.hit))
+    assert _count == len(_hits) == 5
+    # Frames are converted in the buffers of the source, not in place
+    assert np_array_equal(frames[:5], make_frames(48)[:5])
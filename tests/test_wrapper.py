@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from numpy import (
+    array_equal as np_array_equal,
+    int32,
+    uint8,
+    uint16,
+    uint32,
+    uint64,
+    where as np_where,
+)
+
+from pydozor import Dozor, DozorCache, PixelMask, call_dozor
+from pydozor.wrapper import _convert_to_uint16
+
+from .conftest import PIXEL_MAX
+
+
+def _baseline_convert(array, pixel_max, mask=None):
+    """Conversion and masking of the original `call_dozor`."""
+    array = array.copy()
+    if array.dtype < uint16:
+        array = array.astype(uint16)
+    elif array.dtype > uint16:
+        array[(array > 65534) & (array <= pixel_max)] = 65534
+        array[array > pixel_max] = 65535
+        array = array.astype(uint16)
+    if mask is not None:
+        array[np_where(mask < 0)] = 65535
+    return array
+
+
+@pytest.fixture(scope="module")
+def negative_mask(eiger_mask):
+    return np_where(eiger_mask != 0, -1, 0).astype(int32)
+
+
+@pytest.mark.parametrize("dtype", [uint8, uint16, uint32, uint64])
+@pytest.mark.parametrize("pixel_max", [PIXEL_MAX, 65534, 1000])
+def test_convert_matches_baseline(frames, dtype, pixel_max):
+    _frame = frames[0].astype(dtype)
+    _expected = _baseline_convert(_frame, pixel_max)
+    _converted = _convert_to_uint16(_frame.copy(), pixel_max)
+    assert _converted.dtype == uint16
+    assert np_array_equal(_converted, _expected)
+
+
+@pytest.mark.parametrize("dtype", [uint16, uint32])
+def test_convert_in_place_matches_baseline(frames, dtype):
+    _stack = frames[:4].astype(dtype)
+    _expected = _baseline_convert(_stack, PIXEL_MAX)
+    assert np_array_equal(
+        _convert_to_uint16(_stack, PIXEL_MAX, inplace=True), _expected
+    )
+
+
+def test_convert_masked_matches_baseline(frames, negative_mask):
+    _expected = _baseline_convert(frames[1], PIXEL_MAX, negative_mask)
+    _out = _convert_to_uint16(frames[1], PIXEL_MAX, mask=negative_mask)
+    assert np_array_equal(_out, _expected)
+    _compiled = PixelMask.from_array(negative_mask, bad="negative")
+    _out = _convert_to_uint16(frames[1], PIXEL_MAX, mask=_compiled)
+    assert np_array_equal(_out, _expected)
+
+
+def test_convert_out_shape_checked(frames):
+    with pytest.raises(ValueError):
+        _convert_to_uint16(frames[0], PIXEL_MAX, out=frames[0][:10].astype(uint16))
+
+
+def test_call_dozor_matches_baseline(config_file, frames, negative_mask):
+    _engine = Dozor(config_file)
+    for _frame in frames[:4]:
+        _expected = _engine.do_image(
+            _baseline_convert(_frame, _engine.pixel_max, negative_mask)
+        )
+        assert call_dozor(negative_mask, _frame, config_file) == _expected
+
+
+def test_call_dozor_concurrent_calls(config_file, frames, negative_mask):
+    _cache = DozorCache()
+    _expected = [
+        call_dozor(negative_mask, _frame, config_file, cache=_cache)[1]["NofR"]
+        for _frame in frames
+    ]
+
+    def _run(_index):
+        _frame = frames[_index % len(frames)]
+        return call_dozor(negative_mask, _frame, config_file, cache=_cache)[1]["NofR"]
+
+    _calls = range(8 * len(frames))
+    with ThreadPoolExecutor(8) as _executor:
+        _results = list(_executor.map(_run, _calls))
+    assert _results == [_expected[_index % len(frames)] for _index in _calls]
+    assert len(_cache) == 1